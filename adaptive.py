@@ -0,0 +1,81 @@
+import time
+import math
+
+
+class AdaptiveSampler:
+    """Plans model-building waves and decides when the score distribution has converged.
+
+    Scores are "lower is better" (DOPE or molpdf). Sampling stops when the
+    best score has improved by less than `min_improvement` (relative) for
+    `patience` consecutive waves, when `max_models` have been built, or when
+    the next wave would not fit in `max_seconds`.
+    """
+
+    def __init__(self, start_model=1, max_models=100, wave_size=4, patience=2,
+                 min_improvement=0.005, max_seconds=None, score_key='dope', top_k=3):
+        self.start_model = start_model
+        self.max_models = max_models
+        self.wave_size = max(1, wave_size)
+        self.patience = max(1, patience)
+        self.min_improvement = min_improvement
+        self.max_seconds = max_seconds
+        self.score_key = score_key
+        self.top_k = top_k
+
+        self.next_model = start_model
+        self.scores = []
+        self.best_history = []
+        self.stale_waves = 0
+        self.stop_reason = None
+        self.started = time.time()
+        self.wave_times = []
+        self._wave_started = None
+
+    def next_wave(self):
+        """Return the (first, last) model indices of the next wave, or None to stop."""
+        if self.stop_reason:
+            return None
+        last_allowed = self.start_model + self.max_models - 1
+        if self.next_model > last_allowed:
+            self.stop_reason = f"model budget of {self.max_models} reached"
+            return None
+        if self.max_seconds and self.wave_times:
+            elapsed = time.time() - self.started
+            expected = sum(self.wave_times) / len(self.wave_times)
+            if elapsed + expected > self.max_seconds:
+                self.stop_reason = f"time budget of {self.max_seconds / 60:.0f} min would be exceeded"
+                return None
+        first = self.next_model
+        last = min(first + self.wave_size - 1, last_allowed)
+        self.next_model = last + 1
+        self._wave_started = time.time()
+        return first, last
+
+    def record(self, models):
+        """Register the models of a finished wave; returns the stop reason or None."""
+        if self._wave_started is not None:
+            self.wave_times.append(time.time() - self._wave_started)
+        new = [m.get(self.score_key) for m in models]
+        self.scores.extend(s for s in new if isinstance(s, float) and math.isfinite(s))
+        if not self.scores:
+            return None
+
+        best = min(self.scores)
+        if self.best_history:
+            previous = self.best_history[-1]
+            gain = (previous - best) / max(abs(previous), 1e-9)
+            self.stale_waves = self.stale_waves + 1 if gain < self.min_improvement else 0
+        self.best_history.append(best)
+        if self.stale_waves >= self.patience:
+            self.stop_reason = (f"best {self.score_key} improved less than {self.min_improvement:.1%} "
+                                f"for {self.patience} waves")
+        return self.stop_reason
+
+    def report(self):
+        if not self.scores:
+            return f"Wave {len(self.best_history)}: no scored models yet"
+        ordered = sorted(self.scores)
+        top = ordered[:self.top_k]
+        median = ordered[len(ordered) // 2]
+        return (f"Wave {len(self.best_history)}: {len(self.scores)} models, best {self.score_key} "
+                f"{ordered[0]:.2f}, top-{len(top)} mean {sum(top) / len(top):.2f}, median {median:.2f}")
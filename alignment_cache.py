@@ -0,0 +1,64 @@
+import os
+import json
+import time
+
+from cache_utils import cache_path, file_digest, text_digest, read_json, write_json
+from pir_index import PirIndex, is_pir_file
+from fasta_pir import iter_fasta
+
+
+def read_target_records(path):
+    """Return [(code, sequence), ...] from a FASTA or PIR target file."""
+    if is_pir_file(path):
+        return PirIndex(path).records()
+    with open(path, 'r', encoding='utf-8') as fh:
+        return [(header.strip(), seq) for header, seq, _ in iter_fasta(fh)]
+
+
+class AlignmentCache:
+    """Content-addressed store of alignment outputs.
+
+    The key covers the target records, the ordered template list (code,
+    chain and PDB file hash) and the alignment parameters, and each key owns
+    its own directory, so unchanged inputs return instantly and different
+    projects never overwrite each other's Alignment.ali / Alignment.pap.
+    """
+
+    META_FILE = "meta.json"
+
+    def __init__(self, root=None):
+        self.root = root or cache_path("alignments")
+        os.makedirs(self.root, exist_ok=True)
+
+    def key(self, target_path, templates, params):
+        """templates: ordered [(pdb_id, chain, pdbfile), ...]; params: dict of alignment options."""
+        target = "\n".join(f"{code}:{seq}" for code, seq in read_target_records(target_path))
+        parts = {
+            'target': text_digest(target),
+            'templates': [[code, chain, file_digest(pdbfile)] for code, chain, pdbfile in templates],
+            'params': params,
+        }
+        return text_digest(json.dumps(parts, sort_keys=True))
+
+    def directory(self, key):
+        path = os.path.join(self.root, key)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def lookup(self, key):
+        """Return the metadata of a finished entry, or None."""
+        meta = read_json(os.path.join(self.root, key, self.META_FILE))
+        if meta and os.path.exists(os.path.join(self.root, key, meta.get('alignment', 'Alignment.ali'))):
+            return meta
+        return None
+
+    def finalize(self, key, **meta):
+        """Mark an entry complete; written last so interrupted runs are never reported as hits."""
+        meta.setdefault('alignment', 'Alignment.ali')
+        meta.setdefault('pap', 'Alignment.pap')
+        meta['created'] = time.time()
+        write_json(os.path.join(self.directory(key), self.META_FILE), meta)
+        return meta
+
+    def file(self, key, name):
+        return os.path.join(self.root, key, name)
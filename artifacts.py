@@ -0,0 +1,241 @@
+import os
+import io
+import re
+import sys
+import glob
+import gzip
+import shutil
+import argparse
+
+try:
+    import zstandard
+except ImportError:  # optional; gzip is always available
+    zstandard = None
+
+
+# Compressed artifacts keep their original name plus one of these suffixes
+SUFFIXES = ('.zst', '.gz')
+CHUNK_SIZE = 1024 * 1024
+
+# Per-model outputs of an AutoModel run, keyed by artifact kind
+MODEL_PATTERNS = {
+    'model': r"\.B9999(\d{4})\.pdb",
+    'trace': r"\.D0000(\d{4})",
+    'violations': r"\.V9999(\d{4})",
+}
+# Per-run intermediates (restraints, initial model, optimization schedule)
+RUN_SUFFIXES = ('.rsr', '.ini', '.sch')
+
+
+def default_codec():
+    return 'zst' if zstandard is not None else 'gz'
+
+
+def strip_suffix(path):
+    for suffix in SUFFIXES:
+        if path.endswith(suffix):
+            return path[:-len(suffix)]
+    return path
+
+
+def resolve(path):
+    """Return the on-disk file for a logical artifact path (plain or compressed), or None."""
+    if os.path.exists(path):
+        return path
+    for suffix in SUFFIXES:
+        if os.path.exists(path + suffix):
+            return path + suffix
+    return None
+
+
+def exists(path):
+    return resolve(path) is not None
+
+
+def open_artifact(path, mode='rt', encoding='utf-8', errors='replace'):
+    """Open a plain or compressed artifact for reading, decompressing as a stream."""
+    real = resolve(path) or path
+    binary = 'b' in mode
+    if real.endswith('.gz'):
+        return gzip.open(real, 'rb' if binary else 'rt', encoding=None if binary else encoding,
+                         errors=None if binary else errors)
+    if real.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f"{real} is zstd-compressed; install the 'zstandard' package to read it")
+        stream = zstandard.ZstdDecompressor().stream_reader(open(real, 'rb'), closefd=True)
+        return stream if binary else io.TextIOWrapper(stream, encoding=encoding, errors=errors)
+    return open(real, 'rb' if binary else 'r', **({} if binary else {'encoding': encoding, 'errors': errors}))
+
+
+def compress_file(path, codec=None, level=None):
+    """Stream-compress a file next to itself, then remove the original; returns the new path."""
+    codec = codec or default_codec()
+    target = f"{path}.{codec}"
+    tmp = target + ".tmp"
+    stat = os.stat(path)
+    with open(path, 'rb') as src:
+        if codec == 'zst':
+            if zstandard is None:
+                raise RuntimeError("zstd compression needs the 'zstandard' package")
+            with open(tmp, 'wb') as dst:
+                zstandard.ZstdCompressor(level=level or 10).copy_stream(src, dst)
+        else:
+            with gzip.open(tmp, 'wb', compresslevel=level or 6) as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+    os.utime(tmp, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    os.replace(tmp, target)
+    os.remove(path)
+    return target
+
+
+def decompress_file(path):
+    """Restore the plain file of a compressed artifact (e.g. before Modeller reads it)."""
+    real = resolve(path)
+    if real is None or real == strip_suffix(real):
+        return real
+    plain = strip_suffix(real)
+    with open_artifact(real, 'rb') as src, open(plain + ".tmp", 'wb') as dst:
+        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+    os.replace(plain + ".tmp", plain)
+    os.remove(real)
+    return plain
+
+
+def glob_artifacts(pattern):
+    """Logical paths of plain and compressed files matching a glob pattern."""
+    found = set(glob.glob(pattern))
+    for suffix in SUFFIXES:
+        found.update(p[:-len(suffix)] for p in glob.glob(pattern + suffix))
+    return sorted(found)
+
+
+class RetentionPolicy:
+    """What to keep after a run.
+
+    The best `keep_top` models (by `score_key`, lower is better) stay as
+    plain PDB files; the other models, traces, violation profiles and run
+    intermediates are either compressed ('compress'), deleted ('delete') or
+    left alone ('keep').
+    """
+
+    def __init__(self, keep_top=5, score_key='dope', other_models='compress', traces='compress',
+                 violations='compress', intermediates='compress', codec=None):
+        self.keep_top = keep_top
+        self.score_key = score_key
+        self.other_models = other_models
+        self.traces = traces
+        self.violations = violations
+        self.intermediates = intermediates
+        self.codec = codec or default_codec()
+
+
+class ArtifactManager:
+    """Applies a RetentionPolicy to the outputs of one sequence in one directory."""
+
+    def __init__(self, directory, sequence, policy=None):
+        self.directory = directory
+        self.sequence = sequence
+        self.policy = policy or RetentionPolicy()
+        self.stats = {'files': 0, 'before': 0, 'after': 0, 'deleted': 0}
+
+    def model_files(self):
+        """{kind: {model number: logical path}} for every per-model artifact on disk."""
+        files = {kind: {} for kind in MODEL_PATTERNS}
+        prefix = re.escape(self.sequence)
+        for path in glob_artifacts(os.path.join(self.directory, f"{self.sequence}.*")):
+            name = os.path.basename(path)
+            for kind, pattern in MODEL_PATTERNS.items():
+                match = re.fullmatch(prefix + pattern, name)
+                if match:
+                    files[kind][int(match.group(1))] = path
+        return files
+
+    def _handle(self, path, action):
+        real = resolve(path)
+        if real is None or action == 'keep':
+            return
+        size = os.path.getsize(real)
+        if action == 'delete':
+            os.remove(real)
+            self.stats['deleted'] += 1
+            self.stats['before'] += size
+        elif action == 'compress' and real == path:
+            new = compress_file(real, self.policy.codec)
+            self.stats['files'] += 1
+            self.stats['before'] += size
+            self.stats['after'] += os.path.getsize(new)
+
+    def compress_finished(self, models):
+        """Compress the trace and violation profile of models that are already written (mid-run)."""
+        numbers = {model_number(m['filename']) for m in models if m.get('filename')}
+        files = self.model_files()
+        for kind, action in (('trace', self.policy.traces), ('violations', self.policy.violations)):
+            for number, path in files[kind].items():
+                if number in numbers and action == 'compress':
+                    self._handle(path, action)
+        return self.stats
+
+    def apply(self, models):
+        """Apply the full policy once the run is over; returns size statistics."""
+        policy = self.policy
+        scored = [m for m in models if isinstance(m.get(policy.score_key), float)]
+        if not scored:
+            scored = [m for m in models if isinstance(m.get('molpdf'), float)]
+            key = 'molpdf'
+        else:
+            key = policy.score_key
+        best = sorted(scored, key=lambda m: m[key])[:policy.keep_top]
+        keep = {model_number(m['filename']) for m in best}
+
+        files = self.model_files()
+        # Without scores there is no ranking, so model files are left untouched
+        for number, path in (files['model'].items() if scored else ()):
+            if number in keep:
+                decompress_file(path)
+            else:
+                self._handle(path, policy.other_models)
+        for number, path in files['trace'].items():
+            self._handle(path, policy.traces)
+        for number, path in files['violations'].items():
+            self._handle(path, policy.violations)
+        for suffix in RUN_SUFFIXES:
+            self._handle(os.path.join(self.directory, self.sequence + suffix), policy.intermediates)
+        return self.stats
+
+
+def model_number(filename):
+    match = re.search(r"\.B9999(\d{4})\.pdb", os.path.basename(filename or ''))
+    return int(match.group(1)) if match else None
+
+
+def format_stats(stats):
+    saved = stats['before'] - stats['after']
+    return (f"{stats['files']} files compressed, {stats['deleted']} deleted, "
+            f"{saved / 1024 / 1024:.1f} MB freed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compress or prune the outputs of a Modeller run.")
+    parser.add_argument("directory")
+    parser.add_argument("sequence", help="target code, e.g. INS")
+    parser.add_argument("--keep-top", type=int, default=5, help="best models kept as plain PDB files")
+    parser.add_argument("--score", default='dope', choices=('dope', 'molpdf'))
+    parser.add_argument("--others", default='compress', choices=('compress', 'delete', 'keep'))
+    parser.add_argument("--traces", default='compress', choices=('compress', 'delete', 'keep'))
+    parser.add_argument("--codec", choices=('zst', 'gz'), default=None)
+    args = parser.parse_args()
+
+    from assistant_context import read_summary
+    models = read_summary(args.directory, args.sequence)
+    if not models:
+        print(f"No score table for {args.sequence} in {args.directory}; only intermediates are compressed",
+              file=sys.stderr)
+    policy = RetentionPolicy(keep_top=args.keep_top, score_key=args.score, other_models=args.others,
+                             traces=args.traces, codec=args.codec)
+    stats = ArtifactManager(args.directory, args.sequence, policy).apply(models)
+    print(format_stats(stats))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,196 @@
+import os
+import re
+import sys
+import shutil
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from modeller import Environ, Selection
+from modeller.scripts import complete_pdb
+
+from cache_utils import cache_path, file_digest, read_json, write_json
+from artifacts import resolve, open_artifact, glob_artifacts
+from assistant_context import read_summary, write_summary, format_models
+
+
+# Scores that can be (re)computed for existing models: model key -> label
+METHODS = {
+    'dope': "DOPE",
+    'dopehr': "DOPE-HR",
+    'normalized_dope': "z-DOPE",
+    'ga341': "GA341",
+}
+
+_HEADER_VALUES = {
+    'molpdf': re.compile(r"MODELLER OBJECTIVE FUNCTION:\s*(\S+)"),
+    'seq_id': re.compile(r"MODELLER BEST TEMPLATE % SEQ ID:\s*(\S+)"),
+}
+
+_env = None
+
+
+def read_model_header(path):
+    """molpdf and best-template sequence identity from the REMARK 6 lines Modeller writes."""
+    values = {}
+    with open_artifact(path) as fh:
+        for line in fh:
+            if line.startswith(('ATOM', 'HETATM', 'MODEL')):
+                break
+            for key, pattern in _HEADER_VALUES.items():
+                match = pattern.search(line)
+                if match:
+                    try:
+                        values[key] = float(match.group(1))
+                    except ValueError:
+                        pass
+    return values
+
+
+def _environ():
+    global _env
+    if _env is None:
+        _env = Environ()
+        _env.libs.topology.read(file='$(LIB)/top_heav.lib')
+        _env.libs.parameters.read(file='$(LIB)/par.lib')
+    return _env
+
+
+def score_task(task):
+    """Worker: compute the requested scores of one model file; returns (path, {key: score})."""
+    path, methods = task
+    real = resolve(path)
+    scratch = None
+    if real != path:
+        # Compressed artifact: Modeller reads a temporary plain copy
+        scratch = tempfile.mkdtemp(prefix="assess-")
+        plain = os.path.join(scratch, os.path.basename(path))
+        with open_artifact(real, 'rb') as src, open(plain, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        real = plain
+    try:
+        mdl = complete_pdb(_environ(), real)
+        selection = Selection(mdl)
+        scores = {}
+        if 'dope' in methods:
+            scores['dope'] = float(selection.assess_dope())
+        if 'dopehr' in methods:
+            scores['dopehr'] = float(selection.assess_dopehr())
+        if 'normalized_dope' in methods:
+            scores['normalized_dope'] = float(mdl.assess_normalized_dope())
+        if 'ga341' in methods:
+            # GA341 needs the target-template identity, which only Modeller's own models record
+            seq_id = read_model_header(path).get('seq_id')
+            if seq_id is not None:
+                mdl.seq_id = seq_id
+                scores['ga341'] = float(mdl.assess_ga341()[0])
+        return path, scores
+    finally:
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+
+class ScoreCache:
+    """Scores per model file content hash, so unchanged models are never re-scored."""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(cache_path("assessment"), "scores.json")
+        self.entries = read_json(self.path, {})
+
+    def key(self, path):
+        return file_digest(resolve(path))
+
+    def get(self, key, methods):
+        entry = self.entries.get(key, {})
+        return {m: entry[m] for m in methods if m in entry}
+
+    def put(self, key, scores):
+        self.entries.setdefault(key, {}).update(scores)
+
+    def save(self):
+        write_json(self.path, self.entries)
+
+
+def assess_models(paths, methods, processes=None, log=print):
+    """Scores for each model file as {path: {key: score}}; only uncached scores are computed."""
+    methods = [m for m in methods if m in METHODS]
+    cache = ScoreCache()
+    results, keys, tasks = {}, {}, []
+    for path in paths:
+        keys[path] = cache.key(path)
+        results[path] = cache.get(keys[path], methods)
+        missing = [m for m in methods if m not in results[path]]
+        if missing:
+            tasks.append((path, missing))
+    log(f"{len(paths) - len(tasks)} of {len(paths)} models fully cached")
+    if tasks:
+        workers = processes or min(os.cpu_count() or 1, len(tasks))
+        log(f"Scoring {len(tasks)} models on {workers} processes...")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(score_task, task): task[0] for task in tasks}
+            for done, future in enumerate(as_completed(futures), 1):
+                path = futures[future]
+                try:
+                    _, scores = future.result()
+                except Exception as e:
+                    log(f"{os.path.basename(path)}: assessment failed ({e})")
+                    continue
+                results[path].update(scores)
+                cache.put(keys[path], scores)
+                if done % 10 == 0 or done == len(tasks):
+                    log(f"Scored {done}/{len(tasks)}")
+        cache.save()
+    return results
+
+
+def model_paths(directory, sequence=None):
+    """Logical paths of the AutoModel outputs in a folder (plain or compressed)."""
+    pattern = os.path.join(directory, f"{sequence or '*'}.B9999????.pdb")
+    return glob_artifacts(pattern)
+
+
+def assess_directory(directory, sequence=None, methods=('dope', 'ga341'), processes=None, log=print):
+    """Score every model in a folder; returns model dicts for the Models table, in file order.
+
+    Values already known for a model (from the run's score table or the PDB
+    header) are kept and the newly computed scores are added to them.
+    """
+    paths = model_paths(directory, sequence)
+    if not paths:
+        raise FileNotFoundError(f"No models matching {sequence or '*'}.B9999????.pdb in {directory}")
+    known = {}
+    for seq in sorted({os.path.basename(p).split('.B9999')[0] for p in paths}):
+        known.update((m['filename'], m) for m in read_summary(directory, seq))
+    scores = assess_models(paths, methods, processes, log)
+    models = []
+    for path in paths:
+        name = os.path.basename(path)
+        model = dict(known.get(name, {'filename': name}))
+        if 'molpdf' not in model:
+            header = read_model_header(path)
+            if 'molpdf' in header:
+                model['molpdf'] = header['molpdf']
+        model.update(scores[path])
+        models.append(model)
+    return models
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score existing Modeller models in parallel.")
+    parser.add_argument("directory")
+    parser.add_argument("--sequence", default=None, help="target code; default: every *.B9999*.pdb")
+    parser.add_argument("--methods", default="dope,ga341", help=f"comma-separated: {', '.join(METHODS)}")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--write-summary", action="store_true",
+                        help="update <sequence>.summary.tsv with the new scores")
+    args = parser.parse_args()
+    models = assess_directory(args.directory, args.sequence, [m.strip() for m in args.methods.split(',')],
+                              args.processes, log=lambda text: print(text, file=sys.stderr))
+    if args.write_summary and args.sequence:
+        write_summary(args.directory, args.sequence, models)
+    print(format_models(models), end="")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,243 @@
+import os
+import re
+import math
+import time
+from collections import OrderedDict, Counter
+
+from cache_utils import cache_path, text_digest, read_json, write_json
+
+
+# Built-in reference snippets; indexed together with the README and the current run
+DOCS = {
+    "GA341": "GA341 is a fold-reliability score between 0 and 1 derived from a statistical potential, "
+             "sequence identity and compactness. Models above about 0.7 usually have the correct fold; "
+             "it says little about local accuracy, so compare models with DOPE instead.",
+    "DOPE": "DOPE (Discrete Optimized Protein Energy) is a statistical potential; lower (more negative) "
+            "is better. Use it to rank models of the same sequence. The per-residue DOPE profile "
+            "highlights poorly modelled regions such as loops.",
+    "molpdf": "molpdf is Modeller's objective function: the sum of restraint violations. Lower is better, "
+              "but values are only comparable between models built from the same alignment.",
+    "normalized DOPE": "Normalized DOPE (z-DOPE) compares the DOPE of a model with the score expected for "
+                       "a native structure of the same length; below -1 is good, above 0 is poor.",
+    "align2d": "align2d aligns the target sequence to template structures using structure-dependent gap "
+               "penalties, placing gaps in loops rather than in secondary structure elements.",
+    "build failure": "Common build failures: the target code or template codes do not match the .ali "
+                     "headers; a template PDB file is missing from the atom files directory; residue "
+                     "ranges in the structureX header do not match the PDB; sequence mismatch between "
+                     "the alignment and the template file; an alignment entry is missing its '*' terminator.",
+    "loop refinement": "LoopModel / DOPELoopModel rebuild short regions (usually under 15 residues) "
+                       "that no template covers or that have high DOPE energy, keeping the rest fixed.",
+    "restraint violations": "The .V profile lists per-residue restraint violations by type. Clusters of "
+                            "high violations point to alignment errors or regions without template support.",
+}
+
+# Log chunks are this many lines long
+CHUNK_LINES = 25
+# Only the tail of very long logs is indexed; errors and summaries are at the end
+MAX_LOG_LINES = 20000
+# Numeric model columns of the score table written next to each run
+SCORE_KEYS = ('molpdf', 'dope', 'dopehr', 'normalized_dope', 'ga341')
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Question words mapped to the terms Modeller actually prints
+EXPANSIONS = {
+    'fail': 'error traceback exception failed', 'failed': 'error traceback exception',
+    'failure': 'error traceback exception', 'crash': 'error traceback exception',
+    'error': 'traceback exception', 'best': 'dope molpdf ga341', 'score': 'dope molpdf ga341',
+    'scores': 'dope molpdf ga341', 'model': 'filename', 'models': 'filename',
+}
+
+_TOKEN = re.compile(r"[a-z0-9_]+(?:\.[0-9]+)?")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does did for from how i if in is it me my of on or so "
+    "that the this to was what when where which why with you your".split())
+
+
+def tokenize(text):
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def normalize_prompt(text):
+    """Case, punctuation and whitespace insensitive form of a question, used as the cache key.
+
+    Unlike `tokenize` no words are dropped: "why", "which" or "not" change what is asked.
+    """
+    return " ".join(_TOKEN.findall(text.lower()))
+
+
+class ResponseCache:
+    """LRU cache of assistant answers with a time-to-live, persisted between sessions."""
+
+    def __init__(self, max_entries=256, ttl=7 * 24 * 3600, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path or os.path.join(cache_path("assistant"), "responses.json")
+        self.entries = OrderedDict()
+        now = time.time()
+        for key, (stamp, answer) in read_json(self.path, {}).items():
+            if now - stamp < self.ttl:
+                self.entries[key] = (stamp, answer)
+
+    def key(self, prompt, context="", history=()):
+        """`history` is the prior turns sent with the prompt, so follow-ups like "why?" only
+        match within the same conversation."""
+        turns = "\x00".join(f"{m['role']}:{m['content']}" for m in history)
+        return text_digest(normalize_prompt(prompt) + "\x00" + context + "\x00" + turns)
+
+    def get(self, key):
+        item = self.entries.get(key)
+        if item is None:
+            return None
+        if time.time() - item[0] >= self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return item[1]
+
+    def put(self, key, answer):
+        self.entries[key] = (time.time(), answer)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        try:
+            write_json(self.path, dict(self.entries))
+        except OSError:
+            pass
+
+
+class RetrievalIndex:
+    """BM25 keyword index over small text chunks (docs, logs, score tables)."""
+
+    def __init__(self):
+        self.chunks = []          # (source, text)
+        self.lengths = []
+        self.postings = {}        # token -> [(chunk id, term frequency)]
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def add(self, source, text):
+        tokens = tokenize(text)
+        if not tokens:
+            return
+        chunk_id = len(self.chunks)
+        self.chunks.append((source, text.strip()))
+        self.lengths.append(len(tokens))
+        for token, tf in Counter(tokens).items():
+            self.postings.setdefault(token, []).append((chunk_id, tf))
+
+    def add_lines(self, source, lines, chunk_lines=CHUNK_LINES):
+        lines = [l.rstrip() for l in lines if l.strip()]
+        for start in range(0, len(lines), chunk_lines):
+            self.add(f"{source}:{start + 1}", "\n".join(lines[start:start + chunk_lines]))
+
+    def add_file(self, path, source=None, max_lines=MAX_LOG_LINES):
+        with open(path, 'r', encoding='utf-8', errors='replace') as fh:
+            lines = fh.readlines()
+        self.add_lines(source or os.path.basename(path), lines[-max_lines:])
+
+    def search(self, query, k=4, max_chars=2000):
+        """Best chunks for the query as [(source, text)], trimmed to max_chars in total."""
+        if not self.chunks:
+            return []
+        n = len(self.chunks)
+        avg_len = sum(self.lengths) / n
+        scores = {}
+        terms = tokenize(query)
+        terms += [t for term in terms for t in tokenize(EXPANSIONS.get(term, ''))]
+        for token in set(terms):
+            postings = self.postings.get(token)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, tf in postings:
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[chunk_id] / avg_len)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+        results, used = [], 0
+        for chunk_id in sorted(scores, key=scores.get, reverse=True)[:k]:
+            source, text = self.chunks[chunk_id]
+            text = text[:max(0, max_chars - used)]
+            if not text:
+                break
+            results.append((source, text))
+            used += len(text)
+        return results
+
+
+# --- Current run ---
+def current_run_file():
+    return os.path.join(cache_path("assistant"), "current_run.json")
+
+
+def register_run(directory, sequence, log_text="", models=None):
+    """Record a finished build so the assistant can answer questions about it.
+
+    Writes the build log and a score table next to the models and marks the
+    run as current; the assistant re-indexes it on the next question.
+    """
+    os.makedirs(directory, exist_ok=True)
+    log_path = os.path.join(directory, f"{sequence}.build.log")
+    with open(log_path, 'w', encoding='utf-8') as fh:
+        fh.write(log_text or "")
+    summary_path = write_summary(directory, sequence, models or [])
+    write_json(current_run_file(), {'directory': os.path.abspath(directory), 'sequence': sequence,
+                                    'log': log_path, 'summary': summary_path, 'time': time.time()})
+
+
+def write_summary(directory, sequence, models):
+    path = os.path.join(directory, f"{sequence}.summary.tsv")
+    with open(path, 'w', encoding='utf-8') as fh:
+        fh.write(format_models(models))
+    return path
+
+
+def format_models(models):
+    if not models:
+        return ""
+    keys = [k for k in ('filename', 'parent') + SCORE_KEYS if any(k in m for m in models)]
+    lines = ["\t".join(keys)]
+    for m in models:
+        lines.append("\t".join(f"{m[k]:.3f}" if isinstance(m.get(k), float) else str(m.get(k, '')) for k in keys))
+    return "\n".join(lines) + "\n"
+
+
+def read_summary(directory, sequence):
+    """Model dicts from the score table written by register_run ([] if there is none)."""
+    path = os.path.join(directory, f"{sequence}.summary.tsv")
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as fh:
+        lines = [l.rstrip('\n') for l in fh if l.strip()]
+    if not lines:
+        return []
+    keys = lines[0].split('\t')
+    models = []
+    for line in lines[1:]:
+        model = dict(zip(keys, line.split('\t')))
+        for key in SCORE_KEYS:
+            try:
+                model[key] = float(model[key])
+            except (KeyError, ValueError):
+                model.pop(key, None)
+        models.append(model)
+    return models
+
+
+def build_index(readme=None):
+    """Index of the built-in docs, the README and the current run (log + score table)."""
+    index = RetrievalIndex()
+    for topic, text in DOCS.items():
+        index.add(f"docs:{topic}", text)
+    readme = readme or os.path.join(os.path.dirname(os.path.abspath(__file__)), "README.md")
+    if os.path.exists(readme):
+        with open(readme, 'r', encoding='utf-8', errors='replace') as fh:
+            paragraphs = [p for p in fh.read().split("\n\n") if p.strip()]
+        for i, paragraph in enumerate(paragraphs):
+            index.add(f"README:{i + 1}", paragraph)
+    run = read_json(current_run_file())
+    if run:
+        for key in ('summary', 'log'):
+            if os.path.exists(run.get(key, '')):
+                index.add_file(run[key], source=f"run:{os.path.basename(run[key])}")
+    return index, run
@@ -0,0 +1,93 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+from job_runner import JobProcess
+from pir_index import PirIndex
+from build_presets import PRESETS
+from validation import validate_models
+
+
+# Bundled examples: each folder holds alignment.ali and the template structures it references
+EXAMPLES = ('Insulin-example', 'Yeast-example')
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def example_inputs(directory):
+    alnfile = os.path.join(directory, 'alignment.ali')
+    index = PirIndex(alnfile)
+    return alnfile, index.templates(), index.target()
+
+
+def run_preset(directory, preset, n_models, log=print):
+    """Build `n_models` models of one example with a preset in a scratch folder; returns a result row."""
+    alnfile, knowns, sequence = example_inputs(directory)
+    scratch = tempfile.mkdtemp(prefix=f"bench-{preset}-")
+    try:
+        job = JobProcess('modeller_jobs.build_models', cwd=scratch, alnfile=alnfile, knowns=knowns,
+                         sequence=sequence, start_model=1, end_model=n_models, assess_methods=['DOPE'],
+                         atom_dirs=[directory], preset=preset)
+        started = time.perf_counter()
+        models = job.run(lambda kind, payload: log(payload) if kind == 'message' else None) or []
+        seconds = time.perf_counter() - started
+        checks = validate_models([os.path.join(scratch, m['filename']) for m in models], processes=1)
+        checks = [c for c in checks.values() if 'error' not in c]
+        dopes = [m['dope'] for m in models if isinstance(m.get('dope'), float)]
+        return {
+            'example': os.path.basename(directory), 'preset': preset, 'models': len(models),
+            'seconds': round(seconds, 1), 'seconds_per_model': round(seconds / max(len(models), 1), 1),
+            'best_dope': min(dopes) if dopes else None,
+            'mean_clashes': sum(c['clashes'] for c in checks) / len(checks) if checks else None,
+            'mean_rama_outliers': sum(c['rama_outliers'] for c in checks) / len(checks) if checks else None,
+        }
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def format_rows(rows):
+    """Plain-text table; `relative` is the time per model against 'standard' on the same example."""
+    standard = {r['example']: r['seconds_per_model'] for r in rows if r['preset'] == 'standard'}
+    lines = ["example\tpreset\tmodels\tseconds\ts/model\trelative\tbest DOPE\tclashes\trama outliers"]
+    for r in rows:
+        base = standard.get(r['example'])
+        relative = f"{r['seconds_per_model'] / base:.2f}" if base else ''
+        values = [r['example'], r['preset'], r['models'], r['seconds'], r['seconds_per_model'], relative,
+                  f"{r['best_dope']:.1f}" if r['best_dope'] is not None else '',
+                  f"{r['mean_clashes']:.1f}" if r['mean_clashes'] is not None else '',
+                  f"{r['mean_rama_outliers']:.1f}" if r['mean_rama_outliers'] is not None else '']
+        lines.append("\t".join(str(v) for v in values))
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the build speed presets on the bundled examples "
+                                                 "(requires Modeller).")
+    parser.add_argument("--examples", nargs='+', default=list(EXAMPLES))
+    parser.add_argument("--presets", default=",".join(PRESETS), help="comma-separated preset names")
+    parser.add_argument("--models", type=int, default=2, help="models built per example and preset")
+    parser.add_argument("--json", default=None, help="also write the result rows to this file")
+    args = parser.parse_args()
+
+    rows = []
+    for example in args.examples:
+        directory = example if os.path.isabs(example) else os.path.join(HERE, example)
+        for preset in [p.strip() for p in args.presets.split(',') if p.strip()]:
+            print(f"{os.path.basename(directory)}: {preset}...", file=sys.stderr)
+            try:
+                rows.append(run_preset(directory, preset, args.models,
+                                       log=lambda text: print(f"  {text}", file=sys.stderr)))
+            except Exception as e:
+                print(f"  failed: {str(e).splitlines()[0] if str(e) else e}", file=sys.stderr)
+    print(format_rows(rows), end="")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as fh:
+            json.dump(rows, fh, indent=1)
+    return 0 if rows else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
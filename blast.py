@@ -1,30 +1,39 @@
 
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QLabel, QVBoxLayout, QHBoxLayout, QPushButton, 
-                             QTextEdit, QApplication, QTableWidget, QTableWidgetItem, QCheckBox, QHeaderView, 
-                             QFileDialog, QMessageBox, QProgressBar, QFrame, QSizePolicy, QTabWidget, QSplitter, QLineEdit)
+                             QTextEdit, QApplication, QTableView, QAbstractItemView, QHeaderView, 
+                             QFileDialog, QMessageBox, QProgressBar, QFrame, QSizePolicy, QTabWidget, QSplitter, QLineEdit,
+                             QDoubleSpinBox)
 from PyQt5.QtGui import QFont, QPalette, QColor, QLinearGradient, QBrush, QIcon, QTextCursor
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtCore import Qt, QThread, pyqtSignal, QAbstractTableModel, QModelIndex
+import os
 import sys
-from Bio import SeqIO
-from io import StringIO, BytesIO
+import numpy as np
 import requests
 import json
-import zipfile
-import time
 import hashlib
+import threading
 from dynamic_align import DynamicAlign
 from chatmodel import Chatbot
+from blast_results import HIT_COLUMNS, NUMERIC_COLUMNS, format_value, parse_blast_json
+from template_index import TemplateIndex
+from pdb_store import PdbStore, Cancelled
+from blast_client import run_blast
+from eta import format_eta
+
+# Templates downloaded in the background while the results are reviewed
+PREFETCH_TOP_K = 5
 
 class BlastWorker(QThread):
     finished = pyqtSignal(str)
     progress = pyqtSignal(int)
+    # Seconds left, or None when the search is taking longer than estimated
+    eta = pyqtSignal(object)
 
     def __init__(self, fasta_sequence, cache):
         super().__init__()
         self.fasta_sequence = fasta_sequence
         self.cache = cache
         self.query_hash = hashlib.md5(fasta_sequence.encode()).hexdigest()
-        self.base_url = "https://blast.ncbi.nlm.nih.gov/Blast.cgi"
 
     def run(self):
         if self.query_hash in self.cache:
@@ -33,133 +42,209 @@ class BlastWorker(QThread):
             return
 
         try:
-            # Validate FASTA sequence
-            try:
-                record = SeqIO.read(StringIO(self.fasta_sequence), "fasta")
-            except Exception as e:
-                self.finished.emit(f"Error: Invalid FASTA format: {str(e)}")
-                self.progress.emit(100)
-                return
-
-            # Step 1: Submit the BLAST search (CMD=Put)
-            self.progress.emit(10)
-            submit_params = {
-                "CMD": "Put",
-                "PROGRAM": "blastp",
-                "DATABASE": "pdb",
-                "QUERY": self.fasta_sequence, 
-                "FORMAT_TYPE": "JSON2_S",
-                "EXPECT": "1e-5",
-                "HITLIST_SIZE": "50"
-            }
-            submit_response = requests.get(self.base_url, params=submit_params, timeout=30)
-            submit_response.raise_for_status()
-
-            # Log raw response for debugging
-            print("Submit Response:", submit_response.text[:500]) 
-
-            # Parse RID and RTOE
-            rid, rtoe = self.parse_rid_rtoe(submit_response.text)
-            if not rid:
-                raise ValueError("Failed to parse RID from submission response")
-
-            self.progress.emit(20)
-
-            # Wait initial estimated time
-            time.sleep(int(rtoe) if rtoe else 10)
-
-            # Step 2: Poll for status
-            while True:
-                status_params = {
-                    "CMD": "Get",
-                    "FORMAT_OBJECT": "SearchInfo",
-                    "RID": rid
-                }
-                status_response = requests.get(self.base_url, params=status_params, timeout=30)
-                status_response.raise_for_status()
-
-                # Log status response
-                print("Status Response:", status_response.text[:500])
-
-                status = self.parse_status(status_response.text)
-                if status == "READY":
-                    self.progress.emit(90)
-                    break
-                elif status in ["FAILED", "UNKNOWN"]:
-                    raise ValueError(f"BLAST search failed with status: {status}")
-
-                self.progress.emit(min(self.progress_bar_value() + 10, 80))
-                time.sleep(5)  
-
-            # Step 3: Fetch results
-            results_params = {
-                "CMD": "Get",
-                "FORMAT_TYPE": "JSON2_S",
-                "RID": rid
-            }
-            results_response = requests.get(self.base_url, params=results_params, timeout=30)
-            results_response.raise_for_status()
-
-        
-            print("Results Response (first 500 chars):", results_response.text[:500])
-
-            
-            try:
-                json_content = results_response.text
-                json.loads(json_content)  
-            except json.JSONDecodeError:
-                
-                try:
-                    zip_buffer = BytesIO(results_response.content)
-                    with zipfile.ZipFile(zip_buffer) as myzip:
-                        file_list = myzip.namelist()
-                        json_content = None
-                        for fname in file_list:
-                            if fname.endswith('_1.json'):
-                                with myzip.open(fname) as stream:
-                                    json_content = stream.read().decode('utf-8')
-                        
-                        
-                                break
-                        if not json_content:
-                            raise ValueError("No JSON file found in the zip archive")
-                except zipfile.BadZipFile:
-                    raise ValueError("Response is not a valid ZIP archive")
-
+            json_content = run_blast(self.fasta_sequence, progress=self.progress.emit, log=print,
+                                     eta=self.eta.emit)
             # Cache and emit result
             self.cache[self.query_hash] = json_content
             self.finished.emit(json_content)
-            self.progress.emit(100)
-
         except requests.exceptions.RequestException as e:
             self.finished.emit(f"Error: Network issue during BLAST: {str(e)}")
-            self.progress.emit(100)
         except Exception as e:
             self.finished.emit(f"Error during BLAST: {str(e)}")
-            self.progress.emit(100)
+        self.progress.emit(100)
+
+
+class TemplateQualityWorker(QThread):
+    finished = pyqtSignal(object)
+
+    def __init__(self, index, pdb_ids):
+        super().__init__()
+        self.index = index
+        self.pdb_ids = pdb_ids
+
+    def run(self):
+        try:
+            failed = self.index.fetch(self.pdb_ids)
+            self.index.save()
+        except Exception as e:
+            failed = [str(e)]
+        self.finished.emit(failed)
+
+
+class PrefetchWorker(QThread):
+    """Downloads likely templates into the PdbStore one at a time, at low thread priority.
+
+    The wanted set can be changed while running: queued entries that are no
+    longer wanted are dropped and an in-flight download of one is abandoned.
+    """
+    fetched = pyqtSignal(str)
+    finished = pyqtSignal(object)
+
+    def __init__(self, store, pdb_ids):
+        super().__init__()
+        self.store = store
+        self.queue = list(dict.fromkeys(pdb_ids))
+        self.wanted = set(self.queue)
+        self.stopped = False
+        self.done = False
+        self.lock = threading.Lock()
+
+    def retarget(self, pdb_ids):
+        """Replace the wanted set; returns False if the worker already stopped taking work."""
+        with self.lock:
+            if self.done:
+                return False
+            self.wanted = set(pdb_ids)
+            self.queue = [p for p in dict.fromkeys(pdb_ids) if p not in self.store]
+            return True
+
+    def cancel(self):
+        self.stopped = True
+
+    def run(self):
+        result = {'fetched': [], 'failed': [], 'cancelled': []}
+        while True:
+            with self.lock:
+                if self.stopped or not self.queue:
+                    self.done = True
+                    break
+                pdb_id = self.queue.pop(0)
+            if pdb_id in self.store:
+                continue
+            try:
+                self.store.fetch(pdb_id, cancelled=lambda: self.stopped or pdb_id not in self.wanted)
+                result['fetched'].append(pdb_id)
+                self.fetched.emit(pdb_id)
+            except Cancelled:
+                result['cancelled'].append(pdb_id)
+            except (OSError, requests.exceptions.RequestException):
+                result['failed'].append(pdb_id)
+        self.finished.emit(result)
+
+
+class BlastHitModel(QAbstractTableModel):
+    """Table model over a columnar HitTable; sorting, filtering and check state live here."""
+
+    def __init__(self, hit_table, parent=None):
+        super().__init__(parent)
+        self.hits = hit_table
+        self.headers = ["Select"] + HIT_COLUMNS
+        self.checked = np.zeros(len(hit_table), dtype=bool)
+        self.order = np.arange(len(hit_table))
+        self.view = self.order
+        # Current sort, re-applied by refresh(); None keeps the BLAST order
+        self.sort_column = None
+        self.sort_order = Qt.AscendingOrder
+        self.max_evalue = None
+        self.min_identity = None
+        self.max_resolution = None
+        self.min_completeness = None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.view)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.headers[section]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        if index.column() == 0:
+            return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsUserCheckable
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.view[index.row()]
+        col = index.column()
+        if col == 0:
+            if role == Qt.CheckStateRole:
+                return Qt.Checked if self.checked[row] else Qt.Unchecked
+            return None
+        name = self.headers[col]
+        if role == Qt.DisplayRole:
+            value = self.hits[name][row]
+            return format_value(name, value) if name in NUMERIC_COLUMNS else value
+        if role == Qt.TextAlignmentRole and name in NUMERIC_COLUMNS:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if index.isValid() and index.column() == 0 and role == Qt.CheckStateRole:
+            self.checked[self.view[index.row()]] = (value == Qt.Checked)
+            self.dataChanged.emit(index, index, [role])
+            return True
+        return False
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sort_column, self.sort_order = column, order
+        self.layoutAboutToBeChanged.emit()
+        self.order = self.sorted_order()
+        self.view = self.order[self.filter_mask()[self.order]]
+        self.layoutChanged.emit()
+
+    def sorted_order(self):
+        column, order = self.sort_column, self.sort_order
+        if column is None:
+            return self.order
+        if column == 0:
+            keys = self.checked.astype(int)
+        else:
+            keys = self.hits[self.headers[column]]
+            if not isinstance(keys, np.ndarray):
+                keys = np.array(keys, dtype=object)
+        idx = np.argsort(keys, kind='stable')
+        if order == Qt.DescendingOrder:
+            idx = idx[::-1]
+        return idx
+
+    def set_filter(self, max_evalue=None, min_identity=None, max_resolution=None, min_completeness=None):
+        self.beginResetModel()
+        self.max_evalue = max_evalue
+        self.min_identity = min_identity
+        self.max_resolution = max_resolution
+        self.min_completeness = min_completeness
+        self.view = self.order[self.filter_mask()[self.order]]
+        self.endResetModel()
+
+    def filter_mask(self):
+        # Comparisons against NaN are False, so hits without metadata are never filtered out
+        mask = np.ones(len(self.hits), dtype=bool)
+        if self.max_evalue is not None:
+            mask &= ~(self.hits["E_Value"] > self.max_evalue)
+        if self.min_identity is not None:
+            mask &= ~(self.hits["Identity_%"] < self.min_identity)
+        if self.max_resolution is not None:
+            mask &= ~(self.hits["Resolution"] > self.max_resolution)
+        if self.min_completeness is not None:
+            mask &= ~(self.hits["Completeness_%"] < self.min_completeness)
+        return mask
+
+    def refresh(self):
+        """Re-apply sorting and filters after the underlying columns changed."""
+        self.beginResetModel()
+        self.order = self.sorted_order()
+        self.view = self.order[self.filter_mask()[self.order]]
+        self.endResetModel()
+
+    def set_checked_rows(self, rows):
+        self.checked[:] = False
+        self.checked[rows] = True
+        if len(self.view):
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self.view) - 1, 0), [Qt.CheckStateRole])
+
+    def selected_rows(self):
+        return np.flatnonzero(self.checked)
+
+    def selected_templates(self):
+        return self.hits.rows(self.selected_rows())
 
-    def parse_rid_rtoe(self, text):
-        rid = None
-        rtoe = None
-        lines = text.splitlines()
-        for line in lines:
-            line = line.strip()
-            if line.startswith("RID ="):
-                rid = line.split("=")[1].strip()
-            elif line.startswith("RTOE ="):
-                rtoe = line.split("=")[1].strip()
-        return rid, rtoe
-
-    def parse_status(self, text):
-        lines = text.splitlines()
-        for line in lines:
-            line = line.strip()
-            if line.startswith("Status="):
-                return line.split("=")[1].strip()
-        return "UNKNOWN"
-
-    def progress_bar_value(self):
-        return 20
 
 class BlastWindow(QMainWindow):
     def __init__(self, fasta_sequence=""):
@@ -171,6 +256,9 @@ class BlastWindow(QMainWindow):
         self.cache = {} 
         self.chatbot = Chatbot() 
         self.tableWidget = None 
+        self.hit_model = None
+        self.pdb_store = PdbStore()
+        self.prefetcher = None
         self.initGUI()
 
     def initGUI(self):
@@ -250,6 +338,41 @@ class BlastWindow(QMainWindow):
         button_layout.addWidget(proceed_btn)
 
         left_layout.addLayout(button_layout)
+
+        # Hit filters
+        filter_label = QLabel('Filter Hits')
+        filter_label.setFont(QFont("Segoe UI", 11, QFont.Medium))
+        left_layout.addWidget(filter_label)
+
+        left_layout.addWidget(QLabel('Max E-value'))
+        self.evalue_edit = QLineEdit()
+        self.evalue_edit.setPlaceholderText("e.g. 1e-10")
+        self.evalue_edit.editingFinished.connect(self.apply_hit_filter)
+        left_layout.addWidget(self.evalue_edit)
+
+        left_layout.addWidget(QLabel('Min Identity %'))
+        self.identity_spin = QDoubleSpinBox()
+        self.identity_spin.setRange(0, 100)
+        self.identity_spin.setDecimals(1)
+        self.identity_spin.valueChanged.connect(self.apply_hit_filter)
+        left_layout.addWidget(self.identity_spin)
+
+        left_layout.addWidget(QLabel('Max Resolution (Å)'))
+        self.resolution_spin = QDoubleSpinBox()
+        self.resolution_spin.setRange(0, 20)
+        self.resolution_spin.setDecimals(1)
+        self.resolution_spin.setSingleStep(0.5)
+        self.resolution_spin.setSpecialValueText("Any")
+        self.resolution_spin.valueChanged.connect(self.apply_hit_filter)
+        left_layout.addWidget(self.resolution_spin)
+
+        left_layout.addWidget(QLabel('Min Completeness %'))
+        self.completeness_spin = QDoubleSpinBox()
+        self.completeness_spin.setRange(0, 100)
+        self.completeness_spin.setDecimals(0)
+        self.completeness_spin.valueChanged.connect(self.apply_hit_filter)
+        left_layout.addWidget(self.completeness_spin)
+
         left_layout.addStretch()
         splitter.addWidget(left_frame)
 
@@ -365,9 +488,11 @@ class BlastWindow(QMainWindow):
         self.status_display.setPlainText("Running BLAST, please wait... (This may take a while due to remote server query)")
         self.progress_bar.setVisible(True)
         self.progress_bar.setValue(0)
+        self.progress_bar.setFormat("%p%")
         self.worker = BlastWorker(self.fasta_sequence, self.cache)
         self.worker.finished.connect(self.HandleResult)
         self.worker.progress.connect(self.update_progress)
+        self.worker.eta.connect(self.update_eta)
         self.worker.start()
 
     def update_progress(self, value):
@@ -375,11 +500,16 @@ class BlastWindow(QMainWindow):
         if value == 100:
             self.progress_bar.setVisible(False)
 
+    def update_eta(self, seconds):
+        self.progress_bar.setFormat(f"%p% ({format_eta(seconds)})")
+
     def HandleResult(self, result):
+        self.stop_prefetch()
         if self.tableWidget:
             self.output_layout.removeWidget(self.tableWidget)
             self.tableWidget.deleteLater()
             self.tableWidget = None
+            self.hit_model = None
         try:
             data = json.loads(result)
             self.status_display.setPlainText('BLAST Finished, Preparing Result Table...')
@@ -393,79 +523,132 @@ class BlastWindow(QMainWindow):
 
     def show_blast_table(self, data):
      try:
-        blast_output = data['BlastOutput2']
-        hits = blast_output[0]['report']['results']['search']['hits'] if isinstance(blast_output, list) else blast_output['report']['results']['search']['hits']
-        if not hits:
+        hits = parse_blast_json(data)
+        if not len(hits):
             self.status_display.setPlainText("No hits found in the BLAST results.")
             return
      except KeyError as e:
         self.status_display.setPlainText(f"Error processing BLAST results: {str(e)}")
         return
 
-    # Updated headers to include Chain
-     headers = ["Select", "PDB_ID", "Chain", "Accession", "Scientific_Name", "Score", "E_Value", "Identity", "Positive", "Gaps"]
-     self.tableWidget = QTableWidget(len(hits), len(headers))
-     self.tableWidget.setHorizontalHeaderLabels(headers)
+     # Structure quality from PDB files already on disk; missing headers are fetched below
+     self.template_index = TemplateIndex()
+     self.template_index.scan([os.getcwd()])
+     self.template_index.save()
+     hits.annotate(self.template_index)
+
+     self.hit_model = BlastHitModel(hits, self)
+     self.apply_hit_filter()
+
+     # Pre-tick a non-redundant template set that covers the target
+     preselected = hits.preselect()
+     self.hit_model.set_checked_rows(preselected)
+     self.preselected = preselected
+     covered = hits.coverage[preselected].any(axis=0).mean() * 100 if len(preselected) else 0.0
+
+     self.tableWidget = QTableView()
+     self.tableWidget.setModel(self.hit_model)
+     self.tableWidget.setSortingEnabled(True)
+     self.tableWidget.sortByColumn(self.hit_model.headers.index("Rank_Score"), Qt.DescendingOrder)
+     self.tableWidget.setSelectionBehavior(QAbstractItemView.SelectRows)
      self.tableWidget.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-
-     for row_idx, hit in enumerate(hits):
-        desc = hit['description'][0]
-        pdb_id = desc.get('id', '').split('|')[1] if 'id' in desc and '|' in desc.get('id', '') else ''
-        # Extract chain from description (PDB format: |PDB|id|chain|...)
-        chain = desc.get('id', '').split('|')[2] if 'id' in desc and '|' in desc.get('id', '') and len(desc.get('id', '').split('|')) > 2 else 'A'
-        accession = desc.get('accession', '')
-        sciname = desc.get('sciname', '')
-        hsps = hit['hsps'][0]
-        score = hsps.get('score', '')
-        evalue = hsps.get('evalue', '')
-        identity = hsps.get('identity', '')
-        positive = hsps.get('positive', '')
-        gaps = hsps.get('gaps', '')
-
-        checkbox_widget = QWidget()
-        checkbox_layout = QHBoxLayout(checkbox_widget)
-        checkbox = QCheckBox()
-        checkbox_layout.addWidget(checkbox, alignment=Qt.AlignCenter)
-        checkbox_widget.setLayout(checkbox_layout)
-        self.tableWidget.setCellWidget(row_idx, 0, checkbox_widget)
-
-        # Updated to include Chain column
-        self.tableWidget.setItem(row_idx, 1, QTableWidgetItem(str(pdb_id)))
-        self.tableWidget.setItem(row_idx, 2, QTableWidgetItem(str(chain)))  # New Chain column
-        self.tableWidget.setItem(row_idx, 3, QTableWidgetItem(str(accession)))
-        self.tableWidget.setItem(row_idx, 4, QTableWidgetItem(str(sciname)))
-        self.tableWidget.setItem(row_idx, 5, QTableWidgetItem(str(score)))
-        self.tableWidget.setItem(row_idx, 6, QTableWidgetItem(str(evalue)))
-        self.tableWidget.setItem(row_idx, 7, QTableWidgetItem(str(identity)))
-        self.tableWidget.setItem(row_idx, 8, QTableWidgetItem(str(positive)))
-        self.tableWidget.setItem(row_idx, 9, QTableWidgetItem(str(gaps))) 
-     
+     # Fixed row heights let the view skip per-row size hints when scrolling
+     self.tableWidget.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+     self.tableWidget.verticalHeader().setDefaultSectionSize(24)
 
      self.output_layout.addWidget(self.tableWidget)
-     self.status_display.setPlainText('Blast Results are ready. Select templates and proceed')
+     self.status_display.setPlainText(
+         f'Blast Results are ready ({len(hits)} hits). '
+         f'Preselected {len(preselected)} templates covering {covered:.0f}% of the query; adjust and proceed')
+
+     # Start downloading the likely templates while the user is still reviewing the table
+     self.hit_model.dataChanged.connect(self.update_prefetch)
+     self.update_prefetch()
+
+     missing = [p for p in dict.fromkeys(hits["PDB_ID"]) if p and p not in self.template_index]
+     if missing:
+         self.quality_worker = TemplateQualityWorker(self.template_index, missing)
+         self.quality_worker.finished.connect(self.on_quality_ready)
+         self.quality_worker.start()
+
+    def on_quality_ready(self, failed):
+        if self.hit_model is None:
+            return
+        hits = self.hit_model.hits
+        known = hits.annotate(self.template_index)
+        self.hit_model.refresh()
+        # Redo the preselection with quality-aware scores unless the user already changed it
+        if np.array_equal(np.sort(self.hit_model.selected_rows()), np.sort(self.preselected)):
+            self.preselected = hits.preselect()
+            self.hit_model.set_checked_rows(self.preselected)
+        note = f" ({len(failed)} headers unavailable)" if failed else ""
+        self.status_display.append(f"Template quality known for {known} of {len(hits)} hits{note}.")
+
+    # --- Template prefetch ---
+    def prefetch_targets(self):
+        """Checked templates in rank order, topped up to PREFETCH_TOP_K while the preselection is untouched."""
+        hits = self.hit_model.hits
+        checked = set(self.hit_model.selected_rows().tolist())
+        ranked = [int(i) for i in hits.ranking()]
+        rows = [i for i in ranked if i in checked]
+        if checked == set(np.asarray(self.preselected).tolist()):
+            rows += [i for i in ranked if i not in checked][:max(PREFETCH_TOP_K - len(rows), 0)]
+        return [p for p in dict.fromkeys(hits["PDB_ID"][i] for i in rows) if p]
+
+    def update_prefetch(self, *args):
+        if self.hit_model is None:
+            return
+        targets = self.prefetch_targets()
+        if self.prefetcher and self.prefetcher.retarget(targets):
+            return
+        pending = [p for p in targets if p not in self.pdb_store]
+        if not pending:
+            return
+        self.prefetcher = PrefetchWorker(self.pdb_store, pending)
+        self.prefetcher.finished.connect(self.on_prefetch_done)
+        self.prefetcher.start(QThread.LowestPriority)
 
+    def on_prefetch_done(self, result):
+        if self.sender() is not self.prefetcher:
+            return
+        self.prefetcher = None
+        if result['fetched'] or result['failed']:
+            note = f"; {len(result['failed'])} failed" if result['failed'] else ""
+            self.status_display.append(f"Prefetched {len(result['fetched'])} template PDBs{note}.")
+        # The selection may have changed after the worker stopped taking work
+        self.update_prefetch()
+
+    def stop_prefetch(self):
+        if self.prefetcher:
+            self.prefetcher.cancel()
+            self.prefetcher.finished.disconnect(self.on_prefetch_done)
+            self.prefetcher.wait()
+            self.prefetcher = None
+
+    def closeEvent(self, event):
+        self.stop_prefetch()
+        super().closeEvent(event)
+
+    def apply_hit_filter(self):
+        if self.hit_model is None:
+            return
+        max_evalue = None
+        text = self.evalue_edit.text().strip()
+        if text:
+            try:
+                max_evalue = float(text)
+            except ValueError:
+                self.status_display.setPlainText(f"Invalid E-value cutoff: {text}")
+                return
+        min_identity = self.identity_spin.value() or None
+        self.hit_model.set_filter(max_evalue, min_identity,
+                                  self.resolution_spin.value() or None,
+                                  self.completeness_spin.value() or None)
 
     def get_selected_templates(self):
-     selected = []
-     if self.tableWidget:
-        for row in range(self.tableWidget.rowCount()):
-            widget = self.tableWidget.cellWidget(row, 0)
-            if widget:
-                checkbox = widget.findChild(QCheckBox)
-                if checkbox and checkbox.isChecked():
-                    template = {
-                        'PDB_ID': self.tableWidget.item(row, 1).text(),
-                        'Chain': self.tableWidget.item(row, 2).text(),
-                        'Accession': self.tableWidget.item(row, 3).text(),
-                        'Scientific_Name': self.tableWidget.item(row, 4).text(),
-                        'Score': self.tableWidget.item(row, 5).text(),
-                        'E_Value': self.tableWidget.item(row, 6).text(),
-                        'Identity': self.tableWidget.item(row, 7).text(),
-                        'Positive': self.tableWidget.item(row, 8).text(),
-                        'Gaps': self.tableWidget.item(row, 9).text()
-                    }
-                    selected.append(template)
-     return selected
+     if self.hit_model is None:
+        return []
+     return self.hit_model.selected_templates()
 
     def download_selected_pdbs(self):
         selected = self.get_selected_templates()
@@ -477,30 +660,14 @@ class BlastWindow(QMainWindow):
         if not folder:
             return
 
-        import os
-        import requests
-        from requests.adapters import HTTPAdapter
-        from urllib3.util.retry import Retry
-
-        # session with retries/backoff
-        session = requests.Session()
-        retries = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
-        session.mount("https://", HTTPAdapter(max_retries=retries))
-
+        self.stop_prefetch()
+        # Templates prefetched in the background are copied from the local store
         failed = []
         for t in selected:
             pdb_id = t['PDB_ID']
-            url = f"https://files.rcsb.org/download/{pdb_id}.pdb"
             try:
-                # increase timeout and stream to avoid large-memory usage
-                with session.get(url, timeout=30, stream=True) as response:
-                    response.raise_for_status()
-                    out_path = os.path.join(folder, f"{pdb_id}.pdb")
-                    with open(out_path, 'wb') as fh:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            if chunk:
-                                fh.write(chunk)
-            except requests.exceptions.RequestException as e:
+                self.pdb_store.copy_to(pdb_id, folder)
+            except (OSError, requests.exceptions.RequestException) as e:
                 failed.append(f"{pdb_id}: {e}")
 
         if failed:
@@ -515,6 +682,8 @@ class BlastWindow(QMainWindow):
         QMessageBox.warning(self, "No Selection", "Please select at least one template.")
         return
      fasta_text = self.seq_view.toPlainText()
+     # The alignment window copies the same templates; finished downloads stay in the store
+     self.stop_prefetch()
      self.align_window = DynamicAlign(selected_templates)
      self.align_window.show()
 
@@ -0,0 +1,130 @@
+import json
+import time
+import zipfile
+from io import StringIO, BytesIO
+
+import requests
+from Bio import SeqIO
+
+from eta import StageTimer
+
+
+BLAST_URL = "https://blast.ncbi.nlm.nih.gov/Blast.cgi"
+# Number of hits requested from NCBI; the model-backed table copes with thousands
+HITLIST_SIZE = 50
+POLL_SECONDS = 5
+
+
+def parse_rid_rtoe(text):
+    rid = None
+    rtoe = None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("RID ="):
+            rid = line.split("=")[1].strip()
+        elif line.startswith("RTOE ="):
+            rtoe = line.split("=")[1].strip()
+    return rid, rtoe
+
+
+def parse_status(text):
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("Status="):
+            return line.split("=")[1].strip()
+    return "UNKNOWN"
+
+
+def extract_json(response):
+    """JSON2_S results come back either as plain JSON or zipped; return the JSON text."""
+    try:
+        json.loads(response.text)
+        return response.text
+    except json.JSONDecodeError:
+        pass
+    try:
+        with zipfile.ZipFile(BytesIO(response.content)) as archive:
+            for name in archive.namelist():
+                if name.endswith('_1.json'):
+                    with archive.open(name) as stream:
+                        return stream.read().decode('utf-8')
+    except zipfile.BadZipFile:
+        raise ValueError("Response is not a valid ZIP archive")
+    raise ValueError("No JSON file found in the zip archive")
+
+
+def run_blast(fasta_sequence, progress=None, log=None, session=None, hitlist_size=HITLIST_SIZE,
+              poll_seconds=POLL_SECONDS, cancelled=None, eta=None):
+    """Submit a blastp search against PDB, wait for it and return the JSON2_S result text.
+
+    `progress(percent)`, `eta(seconds_left or None)` and `log(text)` are
+    optional callbacks; progress is estimated from past searches of similar
+    length and NCBI's queue estimate (see eta.py). `cancelled()` is polled
+    while waiting on the NCBI queue. Raises ValueError for invalid input or
+    failed searches and requests exceptions for network errors.
+    """
+    progress = progress or (lambda value: None)
+    eta = eta or (lambda seconds: None)
+    log = log or (lambda text: None)
+    http = session or requests
+    try:
+        record = SeqIO.read(StringIO(fasta_sequence), "fasta")
+    except Exception as e:
+        raise ValueError(f"Invalid FASTA format: {e}")
+    timer = StageTimer('blast', {'sequence_length': len(record.seq)}).start()
+
+    def report():
+        percent, left = timer.status()
+        progress(percent)
+        eta(left)
+
+    # Step 1: Submit the BLAST search (CMD=Put)
+    report()
+    submit_params = {
+        "CMD": "Put",
+        "PROGRAM": "blastp",
+        "DATABASE": "pdb",
+        "QUERY": fasta_sequence,
+        "FORMAT_TYPE": "JSON2_S",
+        "EXPECT": "1e-5",
+        "HITLIST_SIZE": str(hitlist_size)
+    }
+    response = http.get(BLAST_URL, params=submit_params, timeout=30)
+    response.raise_for_status()
+    log(f"Submit Response: {response.text[:500]}")
+    rid, rtoe = parse_rid_rtoe(response.text)
+    if not rid:
+        raise ValueError("Failed to parse RID from submission response")
+    if rtoe:
+        timer.update(queue_seconds=int(rtoe))
+    report()
+
+    # Step 2: Wait the estimated time, then poll for status
+    wait = int(rtoe) if rtoe else 10
+    while True:
+        deadline = time.time() + wait
+        while time.time() < deadline:
+            if cancelled is not None and cancelled():
+                raise RuntimeError("BLAST search cancelled")
+            time.sleep(min(1.0, max(deadline - time.time(), 0)))
+            report()
+        response = http.get(BLAST_URL, params={"CMD": "Get", "FORMAT_OBJECT": "SearchInfo", "RID": rid},
+                            timeout=30)
+        response.raise_for_status()
+        log(f"Status Response: {response.text[:500]}")
+        status = parse_status(response.text)
+        if status == "READY":
+            break
+        if status in ("FAILED", "UNKNOWN"):
+            raise ValueError(f"BLAST search failed with status: {status}")
+        wait = poll_seconds
+
+    # Step 3: Fetch results
+    response = http.get(BLAST_URL, params={"CMD": "Get", "FORMAT_TYPE": "JSON2_S", "RID": rid}, timeout=30)
+    response.raise_for_status()
+    log(f"Results Response (first 500 chars): {response.text[:500]}")
+    result = extract_json(response)
+    timer.finish()
+    progress(100)
+    eta(0)
+    return result
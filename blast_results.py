@@ -0,0 +1,243 @@
+import hashlib
+import numpy as np
+
+from template_index import quality_score
+
+
+# Columns shown in the BLAST results table, in display order
+HIT_COLUMNS = ["PDB_ID", "Chain", "Accession", "Scientific_Name",
+               "Score", "E_Value", "Identity", "Positive", "Gaps",
+               "Align_Len", "Identity_%", "Coverage_%", "Rank_Score",
+               "Resolution", "Method", "Completeness_%", "Quality", "Alternates"]
+NUMERIC_COLUMNS = ("Score", "E_Value", "Identity", "Positive", "Gaps",
+                   "Align_Len", "Identity_%", "Coverage_%", "Rank_Score",
+                   "Resolution", "Completeness_%", "Quality")
+
+# Weights of the combined template ranking score (identity, coverage, significance)
+RANK_WEIGHTS = (0.5, 0.35, 0.15)
+# -log10(E-value) at which the significance term saturates
+EVALUE_SATURATION = 50.0
+# Share of the rank score taken over by template quality once it is known
+QUALITY_RANK_WEIGHT = 0.25
+
+
+def split_pdb_id(seq_id):
+    """Split a BLAST subject id such as 'pdb|6B3Q|A' into (pdb_id, chain)."""
+    parts = seq_id.split('|') if seq_id else []
+    pdb_id = parts[1] if len(parts) > 1 else ''
+    chain = parts[2] if len(parts) > 2 and parts[2] else 'A'
+    return pdb_id, chain
+
+
+def get_search(data):
+    """Return the 'search' block of a JSON2_S BLAST report."""
+    blast_output = data['BlastOutput2']
+    report = blast_output[0]['report'] if isinstance(blast_output, list) else blast_output['report']
+    return report['results']['search']
+
+
+class HitTable:
+    """Columnar view of a BLAST hit list: one array/list per column, one entry per hit.
+
+    `coverage` is a (hits x query_len) boolean matrix marking the query
+    residues covered by any HSP of each hit.
+    """
+
+    def __init__(self, columns=None, coverage=None, query_len=0):
+        columns = columns or {}
+        self.columns = {}
+        for name in HIT_COLUMNS:
+            values = columns.get(name, [])
+            if name in NUMERIC_COLUMNS:
+                self.columns[name] = np.asarray(values, dtype=float) if len(values) else np.full(len(columns.get("PDB_ID", [])), np.nan)
+            else:
+                self.columns[name] = list(values) if len(values) else [''] * len(columns.get("PDB_ID", []))
+        # Sequence-only rank score, kept so quality annotations can be re-applied
+        self.base_rank = self.columns["Rank_Score"].copy()
+        self.query_len = query_len
+        if coverage is None:
+            coverage = np.zeros((len(self), query_len), dtype=bool)
+        self.coverage = coverage
+
+    def __len__(self):
+        return len(self.columns["PDB_ID"])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def row(self, index):
+        """Return one hit as the dict shape used by the rest of the GUI."""
+        record = {}
+        for name in HIT_COLUMNS:
+            value = self.columns[name][index]
+            if name in NUMERIC_COLUMNS:
+                value = format_value(name, value)
+            record[name] = value
+        return record
+
+    def rows(self, indices):
+        return [self.row(i) for i in indices]
+
+    def coverage_intervals(self, index):
+        """Return the covered query segments of one hit as 1-based (start, end) pairs."""
+        covered = np.concatenate(([False], self.coverage[index], [False])).astype(np.int8)
+        edges = np.flatnonzero(np.diff(covered))
+        return [(int(s) + 1, int(e)) for s, e in zip(edges[::2], edges[1::2])]
+
+    def ranking(self):
+        """Hit indices ordered from best to worst combined score."""
+        return np.argsort(-self.columns["Rank_Score"], kind='stable')
+
+    def annotate(self, index):
+        """Fill the structure-quality columns from a TemplateIndex and fold quality into Rank_Score."""
+        quality = index.quality(self.columns["PDB_ID"], self.columns["Chain"])
+        for name in ("Resolution", "Completeness_%", "Method"):
+            self.columns[name] = quality[name]
+        score = quality_score(quality["Resolution"], quality["Completeness_%"], quality["Method"])
+        known = np.array([bool(m) for m in quality["Method"]], dtype=bool)
+        self.columns["Quality"] = np.where(known, score, np.nan)
+        self.columns["Rank_Score"] = np.where(
+            known, self.base_rank * (1.0 - QUALITY_RANK_WEIGHT + QUALITY_RANK_WEIGHT * score), self.base_rank)
+        return int(known.sum())
+
+    def preselect(self, max_templates=5, target_coverage=0.95, min_gain=0.05):
+        """Greedily pick a non-redundant set of hits that covers the query.
+
+        Each step takes the hit with the best rank score weighted by the
+        fraction of still-uncovered query residues it adds; hits adding less
+        than `min_gain` of the query are considered redundant.
+        """
+        selected = []
+        if not len(self) or not self.query_len:
+            return np.array(selected, dtype=int)
+        covered = np.zeros(self.query_len, dtype=bool)
+        score = self.columns["Rank_Score"]
+        available = np.ones(len(self), dtype=bool)
+        while len(selected) < max_templates and covered.mean() < target_coverage:
+            gain = (self.coverage & ~covered).sum(axis=1) / self.query_len
+            candidates = available & (gain >= min_gain)
+            if not candidates.any():
+                break
+            best = int(np.argmax(np.where(candidates, score * gain, -1.0)))
+            selected.append(best)
+            available[best] = False
+            covered |= self.coverage[best]
+        return np.array(selected, dtype=int)
+
+    @classmethod
+    def from_hits(cls, hits, query_len=None):
+        """Build the table from every description and HSP of the JSON hit list."""
+        # Fold hits whose aligned subject sequences are identical into one entry
+        hits = merge_identical_hits(hits)
+        n = len(hits)
+
+        pdb_ids, chains, accessions, scinames, alternates = [], [], [], [], []
+        top = {name: np.full(n, np.nan) for name in ("Score", "E_Value", "Identity", "Positive", "Gaps")}
+        keys = {"Score": 'score', "E_Value": 'evalue', "Identity": 'identity',
+                "Positive": 'positive', "Gaps": 'gaps'}
+
+        # Flat HSP arrays; hsp_hit maps every HSP back to its hit row
+        hsp_hit, hsp_from, hsp_to, hsp_ident, hsp_len, hsp_evalue = [], [], [], [], [], []
+
+        for i, hit in enumerate(hits):
+            descriptions = hit.get('description') or [{}]
+            ids = [split_pdb_id(d.get('id', '')) for d in descriptions]
+            pdb_ids.append(ids[0][0])
+            chains.append(ids[0][1])
+            accessions.append(descriptions[0].get('accession', ''))
+            scinames.append(descriptions[0].get('sciname', ''))
+            alternates.append(", ".join(f"{p}_{c}" for p, c in ids[1:] if p))
+
+            hsps = hit.get('hsps') or []
+            if hsps:
+                for name, key in keys.items():
+                    value = hsps[0].get(key)
+                    if value is not None:
+                        top[name][i] = value
+            for hsp in hsps:
+                q_from, q_to = hsp.get('query_from'), hsp.get('query_to')
+                if q_from is None or q_to is None:
+                    continue
+                hsp_hit.append(i)
+                hsp_from.append(min(q_from, q_to))
+                hsp_to.append(max(q_from, q_to))
+                hsp_ident.append(hsp.get('identity', 0))
+                hsp_len.append(hsp.get('align_len', abs(q_to - q_from) + 1))
+                hsp_evalue.append(hsp.get('evalue', np.inf))
+
+        hsp_hit = np.asarray(hsp_hit, dtype=int)
+        hsp_from = np.asarray(hsp_from, dtype=int)
+        hsp_to = np.asarray(hsp_to, dtype=int)
+        hsp_ident = np.asarray(hsp_ident, dtype=float)
+        hsp_len = np.asarray(hsp_len, dtype=float)
+        hsp_evalue = np.asarray(hsp_evalue, dtype=float)
+
+        if query_len is None:
+            query_len = int(hsp_to.max()) if len(hsp_to) else 0
+
+        # Per-hit sums over all HSPs
+        ident_sum = np.bincount(hsp_hit, weights=hsp_ident, minlength=n)
+        len_sum = np.bincount(hsp_hit, weights=hsp_len, minlength=n)
+        best_evalue = np.full(n, np.inf)
+        np.minimum.at(best_evalue, hsp_hit, hsp_evalue)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            pct_identity = np.where(len_sum > 0, 100.0 * ident_sum / len_sum, 0.0)
+
+        # Coverage matrix via a difference array over query positions
+        diff = np.zeros((n, query_len + 1), dtype=np.int32)
+        if len(hsp_hit):
+            start = np.clip(hsp_from - 1, 0, query_len)
+            stop = np.clip(hsp_to, 0, query_len)
+            np.add.at(diff, (hsp_hit, start), 1)
+            np.add.at(diff, (hsp_hit, stop), -1)
+        coverage = np.cumsum(diff, axis=1)[:, :query_len] > 0
+        pct_coverage = 100.0 * coverage.sum(axis=1) / query_len if query_len else np.zeros(n)
+
+        with np.errstate(divide='ignore'):
+            significance = np.clip(-np.log10(np.maximum(best_evalue, 1e-300)) / EVALUE_SATURATION, 0.0, 1.0)
+        w_id, w_cov, w_sig = RANK_WEIGHTS
+        rank_score = w_id * pct_identity / 100.0 + w_cov * pct_coverage / 100.0 + w_sig * significance
+
+        columns = {"PDB_ID": pdb_ids, "Chain": chains, "Accession": accessions,
+                   "Scientific_Name": scinames, "Alternates": alternates,
+                   "Align_Len": len_sum, "Identity_%": pct_identity,
+                   "Coverage_%": pct_coverage, "Rank_Score": rank_score}
+        columns.update(top)
+        return cls(columns, coverage=coverage, query_len=query_len)
+
+
+def merge_identical_hits(hits):
+    """Merge hits whose HSP subject sequences are identical (same chain deposited in several entries)."""
+    merged, seen = [], {}
+    for hit in hits:
+        hsps = hit.get('hsps') or []
+        hseqs = [h.get('hseq') for h in hsps]
+        if not hsps or None in hseqs:
+            merged.append(hit)
+            continue
+        key = hashlib.md5("|".join(f"{h.get('query_from')}:{s}" for h, s in zip(hsps, hseqs)).encode()).hexdigest()
+        if key in seen:
+            target = seen[key]
+            target['description'] = list(target.get('description', [])) + list(hit.get('description', []))
+            continue
+        hit = dict(hit)
+        seen[key] = hit
+        merged.append(hit)
+    return merged
+
+
+def format_value(name, value):
+    """Render a numeric cell the way BLAST reports it."""
+    if np.isnan(value):
+        return ''
+    if name == "E_Value":
+        return f"{value:.3g}"
+    if float(value).is_integer():
+        return str(int(value))
+    return f"{value:.2f}"
+
+
+def parse_blast_json(data):
+    """Parse a JSON2_S BLAST report into a HitTable."""
+    search = get_search(data)
+    return HitTable.from_hits(search.get('hits', []), search.get('query_len'))
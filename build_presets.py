@@ -0,0 +1,43 @@
+# Speed presets for AutoModel builds. Schedule and refinement values are the
+# names of modeller.automodel.autosched / refine members, resolved in the
+# build process, so this module can be imported without Modeller.
+PRESETS = {
+    'draft': {
+        'description': "Quick feasibility check: shortest optimization schedule, no MD refinement",
+        'library_schedule': 'fastest',
+        'max_var_iterations': 50,
+        'md_level': None,
+        'repeat_optimization': 1,
+        # Approximate build time relative to 'standard' (see benchmark_presets.py)
+        'relative_cost': 0.2,
+    },
+    'standard': {
+        'description': "AutoModel defaults",
+        'library_schedule': 'normal',
+        'max_var_iterations': 200,
+        'md_level': 'very_fast',
+        'repeat_optimization': 1,
+        'relative_cost': 1.0,
+    },
+    'thorough': {
+        'description': "Production models: slow schedule, repeated optimization and slow MD refinement",
+        'library_schedule': 'slow',
+        'max_var_iterations': 300,
+        'md_level': 'slow',
+        'repeat_optimization': 2,
+        'relative_cost': 4.0,
+    },
+}
+DEFAULT_PRESET = 'standard'
+
+
+def preset_settings(name):
+    """Settings of a preset by name (None means the default); raises ValueError for unknown names."""
+    name = name or DEFAULT_PRESET
+    if name not in PRESETS:
+        raise ValueError(f"Unknown build preset '{name}'; choose from {', '.join(PRESETS)}")
+    return PRESETS[name]
+
+
+def relative_cost(name):
+    return preset_settings(name)['relative_cost']
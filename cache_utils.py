@@ -0,0 +1,51 @@
+import os
+import json
+import hashlib
+
+
+# Root of every on-disk cache; override with the VASUKI_CACHE environment variable
+CACHE_ROOT = os.environ.get("VASUKI_CACHE", os.path.join(os.path.expanduser("~"), ".vasuki", "cache"))
+
+_digest_memo = {}
+
+
+def cache_path(*parts):
+    """Return (and create) a directory below the cache root."""
+    path = os.path.join(CACHE_ROOT, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def file_digest(path, algorithm="sha1"):
+    """Content hash of a file, memoized on (path, size, mtime) so large PDBs are hashed once."""
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns, algorithm)
+    if memo_key in _digest_memo:
+        return _digest_memo[memo_key]
+    h = hashlib.new(algorithm)
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b''):
+            h.update(chunk)
+    digest = h.hexdigest()
+    _digest_memo[memo_key] = digest
+    return digest
+
+
+def text_digest(text, algorithm="sha1"):
+    return hashlib.new(algorithm, text.encode('utf-8')).hexdigest()
+
+
+def read_json(path, default=None):
+    try:
+        with open(path, 'r', encoding='utf-8') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return default
+
+
+def write_json(path, data):
+    """Write JSON atomically so concurrent readers never see a partial file."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as fh:
+        json.dump(data, fh, indent=1)
+    os.replace(tmp_path, path)
@@ -2,12 +2,25 @@
 import os
 from huggingface_hub import InferenceClient
 
+from assistant_context import ResponseCache, build_index, current_run_file
+from cache_utils import read_json
+
+
+SYSTEM_PROMPT = ("You are Modssitant, an assistant for homology modelling with Modeller. "
+                 "Answer from the provided context when it is relevant and say so when it is not.")
+# Previous user/assistant messages sent along with each question
+HISTORY_MESSAGES = 6
+MAX_TOKENS = 512
+
 
 class Chatbot:
     def __init__(self):
         self.model_name = "meta-llama/Llama-3.2-1B-Instruct"
         self.client = None
         self.messages = [] 
+        self.cache = ResponseCache()
+        self.index = None
+        self.indexed_run = None
         self.setup_client()
     
     def setup_client(self):
@@ -21,7 +34,7 @@ class Chatbot:
             
             # Initialize with system message
             self.messages = [
-                {"role": "system", "content": "You are a helpful assistant."}
+                {"role": "system", "content": SYSTEM_PROMPT}
             ]
             
             print("Chatbot ready! Type 'quit' to exit.\n")
@@ -31,26 +44,40 @@ class Chatbot:
             print("Tip: Set HUGGINGFACEHUB_API_TOKEN env var with your HF token.")
             raise
     
+    def retrieve(self, user_msg):
+        """Relevant snippets from the docs and the current run, re-indexing when the run changed."""
+        run = read_json(current_run_file())
+        if self.index is None or run != self.indexed_run:
+            self.index, self.indexed_run = build_index()
+        return self.index.search(user_msg)
+
     def generate_response(self, user_msg):
         """Generate a response using chat_completion."""
-        # Add user message to history
+        snippets = self.retrieve(user_msg)
+        context = "\n\n".join(f"[{source}]\n{text}" for source, text in snippets)
+        history = self.messages[1:][-HISTORY_MESSAGES:]
+        key = self.cache.key(user_msg, context, history)
+
+        # Repeated questions over unchanged context and conversation are answered from the cache
+        new_response = self.cache.get(key)
+        if new_response is None:
+            prompt = f"Context:\n{context}\n\nQuestion: {user_msg}" if context else user_msg
+            response = self.client.chat_completion(
+                messages=[self.messages[0]] + history + [{"role": "user", "content": prompt}],
+                model=self.model_name,
+                max_tokens=MAX_TOKENS,
+                temperature=0.7,
+                stream=False  
+            )
+
+            # Extract content
+            new_response = response.choices[0].message.content.strip()
+            self.cache.put(key, new_response)
+
+        # History keeps the plain question; context is re-retrieved per question
         self.messages.append({"role": "user", "content": user_msg})
-        
-        # Generate response
-        response = self.client.chat_completion(
-            messages=self.messages,
-            model=self.model_name,
-            max_tokens=00,
-            temperature=0.7,
-            stream=False  
-        )
-        
-        # Extract content
-        new_response = response.choices[0].message.content.strip()
-        
-        # Append assistant response to history
         self.messages.append({"role": "assistant", "content": new_response})
-        
+
         return new_response
 
 def main():
@@ -1,4 +1,3 @@
-from modeller import Environ, Model, Alignment
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QLabel, QHBoxLayout, QVBoxLayout, QPushButton,
     QFileDialog, QTextEdit, QWidget, QMessageBox, QGroupBox, QProgressBar,
@@ -6,8 +5,64 @@ from PyQt5.QtWidgets import (
     QToolBar, QAction, QSplitter, QSizePolicy, QFrame
 )
 from PyQt5.QtGui import QFont, QIcon, QPalette, QLinearGradient, QColor, QBrush
-from PyQt5.QtCore import Qt, QSize
-import sys, os, requests
+from PyQt5.QtCore import Qt, QSize, QThread, pyqtSignal
+import sys, os
+from itertools import islice
+
+from alignment_cache import AlignmentCache
+from job_runner import JobProcess
+from eta import StageTimer, format_eta, sequence_length
+from pir_index import PirIndex, is_pir_file
+from pdb_store import PdbStore
+
+ALIGN_MAX_GAP_LENGTH = 50
+PREVIEW_LINES = 400
+
+
+class AlignWorker(QThread):
+    message = pyqtSignal(str)
+    progress = pyqtSignal(int)
+    # Seconds left, or None when the alignment is taking longer than estimated
+    eta = pyqtSignal(object)
+    finished = pyqtSignal(str, list, dict, object, str)
+
+    def __init__(self, key, templates, params, target_path, out_dir):
+        super().__init__()
+        self.key = key
+        self.templates = templates
+        self.params = params
+        self.target_path = os.path.abspath(target_path)
+        self.out_dir = out_dir
+
+    def run(self):
+        target = 'modeller_jobs.progressive' if self.params['method'] == 'salign_progressive' else 'modeller_jobs.align2d'
+        job = JobProcess(target, cwd=self.out_dir,
+                         target_file=self.target_path,
+                         target_format='PIR' if self.target_path.endswith('.ali') else 'FASTA',
+                         templates=self.templates,
+                         max_gap_length=self.params['max_gap_length'],
+                         timer=self.timer())
+
+        def relay(kind, payload):
+            if kind == 'progress':
+                self.progress.emit(payload[0])
+                self.eta.emit(payload[1])
+            else:
+                self.message.emit(payload)
+
+        summary, error = None, ''
+        try:
+            summary = job.run(relay)
+        except Exception as e:
+            error = str(e)
+        self.finished.emit(self.key, self.templates, self.params, summary, error)
+
+    def timer(self):
+        try:
+            return StageTimer('align', {'target_length': sequence_length(self.target_path),
+                                        'templates': len(self.templates)})
+        except (OSError, ValueError, StopIteration):
+            return None
 
 
 class DynamicAlign(QMainWindow):
@@ -19,6 +74,10 @@ class DynamicAlign(QMainWindow):
         self.selected_templates = selected_templates or []
         self.uploaded_file = None
         self.upload_path = None
+        self.alignment_cache = AlignmentCache()
+        self.alignment_path = None
+        self.align_worker = None
+        self.pdb_store = PdbStore()
         self.initUI()
 
 
@@ -95,6 +154,11 @@ class DynamicAlign(QMainWindow):
 
         button_layout.addSpacing(20)
 
+        self.chk_progressive = QCheckBox("Progressive multi-template (salign)")
+        self.chk_progressive.setFont(QFont("Segoe UI", 10))
+        self.chk_progressive.setToolTip("Structurally pre-align templates in parallel, then add the target")
+        button_layout.addWidget(self.chk_progressive)
+
         self.align_btn = styled_button("Run Alignment", "#2e7d32", "#1b5e20")
         self.align_btn.clicked.connect(self.do_align)
         self.align_btn.setEnabled(False)
@@ -225,9 +289,16 @@ class DynamicAlign(QMainWindow):
         path, _ = QFileDialog.getOpenFileName(self, "Open FASTA or .ali", "", "FASTA/ALI Files (*.fasta *.fa *.ali *.pir);;All Files (*)")
         if not path: return
         self.upload_path = path
-        with open(path, 'r', encoding='utf-8') as f:
-            self.uploaded_file = f.read()
-        self.preview_edit.setPlainText("\n".join(self.uploaded_file.splitlines()[:400]))
+        if is_pir_file(path):
+            index = PirIndex(path)
+            self.uploaded_file = index.preview(PREVIEW_LINES)
+            target = index.target()
+            self.msg_edit.append(f"{len(index)} PIR entries; templates: {', '.join(index.templates()) or 'none'}; "
+                                 f"target: {target or 'none'}")
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.uploaded_file = "".join(islice(f, PREVIEW_LINES))
+        self.preview_edit.setPlainText(self.uploaded_file)
         self.status_display.setText(f"Loaded: {os.path.basename(path)}")
         self.align_btn.setEnabled(True)
         self.download_btn.setEnabled(False)
@@ -280,7 +351,7 @@ class DynamicAlign(QMainWindow):
 
     def open_nextpage(self):
         from modelbuilding import ModelBuild
-        self.modelwindow = ModelBuild()
+        self.modelwindow = ModelBuild(self.alignment_path)
         self.modelwindow.show()
         self.close()
 
@@ -301,24 +372,23 @@ class DynamicAlign(QMainWindow):
     def auto_download_pdbs(self):
         if not self.selected_templates:
             return
-        downloaded = []
+        downloaded, failed = [], []
         for tpl in self.selected_templates:
             pdb_id = tpl['PDB_ID']
-            pdb_path = f"{pdb_id}.pdb"
-            if os.path.exists(pdb_path):
+            if os.path.exists(f"{pdb_id}.pdb"):
                 continue
-            url = f"https://files.rcsb.org/download/{pdb_id}.pdb"
             try:
-                r = requests.get(url, timeout=10)
-                if r.status_code == 200:
-                    with open(pdb_path, 'wb') as f:
-                        f.write(r.content)
-                    downloaded.append(pdb_id)
-            except Exception:
-                pass
+                # Usually already prefetched by the BLAST window, so this is a local copy
+                self.pdb_store.copy_to(pdb_id, '.', timeout=10)
+                downloaded.append(pdb_id)
+            except Exception as e:
+                failed.append(f"{pdb_id} ({e})")
         if downloaded:
             self.msg_edit.append(f"Auto-downloaded PDBs: {', '.join(downloaded)}")
             self.status_display.setText("Template PDBs ready ✅")
+        if failed:
+            self.msg_edit.append(f"❌ Could not get template PDBs: {', '.join(failed)}")
+            self.status_display.setText("Some template PDBs are missing")
 
 
     def do_align(self):
@@ -328,53 +398,82 @@ class DynamicAlign(QMainWindow):
 
         self.msg_edit.clear()
         self.msg_edit.append("Running Modeller alignment...")
-        self.progress.setValue(20)
-        QApplication.processEvents()
+        self.progress.setValue(0)
+        self.progress.setFormat("%p%")
+        self.progress.setVisible(True)
 
         try:
-            env = Environ()
-            aln = Alignment(env)
-
+            templates = []
             for tpl in self.selected_templates:
                 code = tpl['PDB_ID']
-                pdbfile = f"{code}.pdb"
-                align_code = f"{code}{tpl.get('Chain','A')}"
+                pdbfile = os.path.abspath(f"{code}.pdb")
                 if not os.path.exists(pdbfile):
                     raise FileNotFoundError(f"PDB file not found: {pdbfile}")
-                mdl = Model(env, file=code)
-                aln.append_model(mdl, align_codes=align_code, atom_files=pdbfile)
-                self.msg_edit.append(f"Template added: {code}")
-
-            aln.append(file=self.upload_path, alignment_format='PIR' if self.upload_path.endswith('.ali') else 'FASTA')
-            aln.align2d(max_gap_length=50)
-            aln.write(file='Alignment.ali', alignment_format='PIR')
-            aln.write(file='Alignment.pap', alignment_format='PAP')
-
-            if os.path.exists('Alignment.pap'):
-                with open('Alignment.pap', 'r', encoding='utf-8') as f:
-                    pap = f.read()
-                self.msg_edit.append("\n=== Alignment (.pap) Preview ===\n")
-                self.msg_edit.append(pap[:5000])
-            else:
-                self.msg_edit.append("⚠️ PAP file not generated.")
-
-            self.progress.setValue(100)
-            self.status_display.setText("Alignment complete ✅")
-            self.download_btn.setEnabled(True)
+                templates.append((code, tpl.get('Chain') or 'A', pdbfile))
+
+            progressive = self.chk_progressive.isChecked() and len(templates) > 1
+            params = {'method': 'salign_progressive' if progressive else 'align2d',
+                      'max_gap_length': ALIGN_MAX_GAP_LENGTH}
+            key = self.alignment_cache.key(self.upload_path, templates, params)
+            meta = self.alignment_cache.lookup(key)
+            if meta:
+                self.msg_edit.append("Identical target, templates and parameters: using cached alignment.")
+                self.show_alignment(key, meta)
+                return
+
+            # Cache miss: align in a separate process whose cwd is the key's own directory
+            self.align_btn.setEnabled(False)
+            self.align_worker = AlignWorker(key, templates, params, self.upload_path,
+                                            self.alignment_cache.directory(key))
+            self.align_worker.message.connect(self.msg_edit.append)
+            self.align_worker.progress.connect(self.progress.setValue)
+            self.align_worker.eta.connect(lambda seconds: self.progress.setFormat(f"%p% ({format_eta(seconds)})"))
+            self.align_worker.finished.connect(self.on_align_finished)
+            self.align_worker.start()
 
         except Exception as e:
-            self.msg_edit.append(f"❌ Error: {str(e)}")
-            self.status_display.setText("Alignment failed")
-            self.progress.setValue(0)
+            self.align_failed(str(e))
 
+    def on_align_finished(self, key, templates, params, summary, error):
+        self.align_btn.setEnabled(True)
+        if error:
+            self.align_failed(error)
+            return
+        meta = {'target': os.path.abspath(self.upload_path),
+                'templates': [[code, chain] for code, chain, _ in templates], 'params': params}
+        if summary:
+            meta['progressive'] = summary
+        self.show_alignment(key, self.alignment_cache.finalize(key, **meta))
+
+    def show_alignment(self, key, meta):
+        self.alignment_path = self.alignment_cache.file(key, meta['alignment'])
+        pap_path = self.alignment_cache.file(key, meta['pap'])
+        if os.path.exists(pap_path):
+            with open(pap_path, 'r', encoding='utf-8') as f:
+                pap = f.read()
+            self.msg_edit.append("\n=== Alignment (.pap) Preview ===\n")
+            self.msg_edit.append(pap[:5000])
+        else:
+            self.msg_edit.append("⚠️ PAP file not generated.")
+
+        self.progress.setValue(100)
+        self.progress.setFormat("%p%")
+        self.status_display.setText(f"Alignment complete ✅ ({self.alignment_path})")
+        self.download_btn.setEnabled(True)
+
+    def align_failed(self, error):
+        self.msg_edit.append(f"❌ Error: {error}")
+        self.status_display.setText("Alignment failed")
+        self.progress.setValue(0)
+        self.progress.setFormat("%p%")
 
     def download_ali(self):
-        if not os.path.exists('Alignment.ali'):
+        if not self.alignment_path or not os.path.exists(self.alignment_path):
             QMessageBox.warning(self, "Not Found", "No .ali file generated yet.")
             return
         path, _ = QFileDialog.getSaveFileName(self, "Save Alignment", "alignment.ali", "PIR/ALI Files (*.ali);;All Files (*)")
         if not path: return
-        with open('Alignment.ali', 'r', encoding='utf-8') as src:
+        with open(self.alignment_path, 'r', encoding='utf-8') as src:
             content = src.read()
         with open(path, 'w', encoding='utf-8') as dest:
             dest.write(content)
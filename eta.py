@@ -0,0 +1,171 @@
+import os
+import math
+import time
+import threading
+
+import numpy as np
+from Bio import SeqIO
+
+from cache_utils import cache_path, read_json, write_json
+
+
+# Features each pipeline stage's duration is learned from
+FEATURES = {
+    # queue_seconds: NCBI's own queue estimate (RTOE) returned on submission
+    'blast': ('sequence_length', 'queue_seconds'),
+    'align': ('target_length', 'templates'),
+    # effort: the build preset's relative cost (build_presets.py)
+    'build': ('target_length', 'templates', 'alignment_length', 'models', 'cores', 'effort'),
+}
+# Multiplicative factors where 1 is the baseline: used as log(value), and missing means 1
+SCALE_FEATURES = {'effort'}
+# Prior: log(seconds) = c0 + sum(c_i * log(1 + feature_i)) (log(feature_i) for scale features)
+DEFAULT_COEFFICIENTS = {
+    'blast': (1.5, 0.2, 0.6),
+    'align': (-2.0, 0.6, 0.8),
+    'build': (-2.5, 1.0, 0.3, 0.0, 1.0, -0.5, 1.0),
+}
+# How many runs' worth of evidence the prior counts for (ridge penalty towards it)
+PRIOR_WEIGHT = 2.0
+MAX_SAMPLES = 200
+
+
+def sequence_length(path):
+    """Residues of the first sequence in a FASTA or PIR file."""
+    fmt = 'pir' if path.lower().endswith(('.ali', '.pir')) else 'fasta'
+    record = next(SeqIO.parse(path, fmt))
+    return sum(1 for c in str(record.seq) if c not in '-/.*')
+
+
+def available_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "taking longer than usual"
+    if seconds < 60:
+        return f"~{max(seconds, 1):.0f} s left"
+    if seconds < 3600:
+        return f"~{seconds / 60:.0f} min left"
+    return f"~{seconds / 3600:.1f} h left"
+
+
+# --- Learning ---
+class TimingModel:
+    """Duration history per pipeline stage and a log-linear fit learned from it.
+
+    The fit is a ridge regression pulled towards DEFAULT_COEFFICIENTS, so the
+    first few recorded runs refine the prior instead of replacing it.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(cache_path("timing"), "history.json")
+        self.history = read_json(self.path, {})
+
+    @staticmethod
+    def design(stage, features):
+        row = [1.0]
+        for name in FEATURES[stage]:
+            value = float(features.get(name) or 0)
+            if name in SCALE_FEATURES:
+                row.append(math.log(value if value > 0 else 1.0))
+            else:
+                row.append(math.log1p(max(value, 0.0)))
+        return np.array(row)
+
+    def coefficients(self, stage):
+        prior = np.array(DEFAULT_COEFFICIENTS[stage])
+        samples = self.history.get(stage, [])
+        if not samples:
+            return prior
+        X = np.array([self.design(stage, s['features']) for s in samples])
+        y = np.log(np.array([max(s['seconds'], 0.1) for s in samples]))
+        penalty = PRIOR_WEIGHT * np.eye(len(prior))
+        return np.linalg.solve(X.T @ X + penalty, X.T @ y + penalty @ prior)
+
+    def estimate(self, stage, features):
+        """Expected duration of a stage in seconds."""
+        return float(np.exp(self.design(stage, features) @ self.coefficients(stage)))
+
+    def record(self, stage, features, seconds):
+        self.history = read_json(self.path, {})
+        samples = self.history.setdefault(stage, [])
+        samples.append({'features': {name: features.get(name, 0) for name in FEATURES[stage]},
+                        'seconds': round(float(seconds), 2)})
+        del samples[:-MAX_SAMPLES]
+        try:
+            write_json(self.path, self.history)
+        except OSError:
+            pass
+
+
+# --- Tracking one run ---
+class StageTimer:
+    """Percent complete and time left of one running stage; pass it to JobProcess(timer=...).
+
+    Without other information progress follows elapsed time against the
+    learned estimate. When the caller reports the measured fraction done
+    (`observe`), the remaining time blends the rate-based projection with
+    the estimate, trusting the measurement more as the stage advances.
+    """
+
+    def __init__(self, stage, features, model=None):
+        self.stage = stage
+        self.features = dict(features)
+        self.model = model or TimingModel()
+        self.estimate_s = self.model.estimate(stage, self.features)
+        # Feature values that turned out different from the plan, used when recording
+        self.actual = {}
+        self.fraction = None
+        self.started = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.started = time.monotonic()
+        return self
+
+    def update(self, **features):
+        """New feature values known mid-stage (e.g. NCBI's queue estimate); re-estimates."""
+        with self.lock:
+            self.features.update(features)
+            self.estimate_s = self.model.estimate(self.stage, self.features)
+
+    def observe(self, fraction):
+        self.fraction = min(max(float(fraction), 0.0), 1.0)
+
+    def elapsed(self):
+        return time.monotonic() - self.started if self.started is not None else 0.0
+
+    def remaining(self):
+        """Seconds left, or None once the stage has overrun its estimate with nothing measured."""
+        elapsed = self.elapsed()
+        with self.lock:
+            planned = self.estimate_s - elapsed
+        fraction = self.fraction
+        if fraction:
+            measured = elapsed * (1 - fraction) / fraction
+            if planned <= 0:
+                return measured
+            return fraction * measured + (1 - fraction) * planned
+        return planned if planned > 0 else None
+
+    def status(self):
+        """(percent, seconds left or None)."""
+        left = self.remaining()
+        if left is None:
+            return 99, None
+        elapsed = self.elapsed()
+        total = elapsed + left
+        percent = 100 * elapsed / total if total > 0 else 0
+        return int(min(percent, 99)), round(left, 1)
+
+    def finish(self, record=True):
+        if record and self.started is not None:
+            self.model.record(self.stage, dict(self.features, **self.actual), self.elapsed())
+
+    def report(self):
+        return f"{self.stage} took {self.elapsed():.0f} s (estimated {self.estimate_s:.0f} s)"
@@ -0,0 +1,112 @@
+import re
+import sys
+import time
+import argparse
+from collections import defaultdict
+
+
+# One-letter residue codes accepted in a target sequence (20 standard + ambiguity/rare codes)
+VALID_RESIDUES = frozenset("ACDEFGHIKLMNPQRSTVWYBZXUOJ-")
+_INVALID = re.compile(r"[^ACDEFGHIKLMNPQRSTVWYBZXUOJ\-]")
+
+
+def make_short_code(header):
+    token = header.split("|")[-1].split()[0]
+    token = token.split("_")[0]
+    code = re.sub(r"[^A-Za-z0-9_]", "_", token.upper() or "SEQ")
+    return code
+
+
+def iter_fasta(handle):
+    """Yield (header, sequence, line_number) per FASTA record, holding one record in memory."""
+    header, chunks, start_line = None, [], 0
+    for line_no, line in enumerate(handle, 1):
+        line = line.strip()
+        if line.startswith(">"):
+            if header is not None:
+                yield header, "".join(chunks), start_line
+            header, chunks, start_line = line[1:], [], line_no
+        elif header is not None and line:
+            chunks.append(line)
+    if header is not None:
+        yield header, "".join(chunks), start_line
+
+
+def validate_sequence(name, seq, line_no=0):
+    """Normalise a sequence and reject residues Modeller cannot read."""
+    seq = seq.upper().rstrip("*").replace(" ", "")
+    bad = sorted(set(_INVALID.findall(seq)))
+    if bad:
+        raise ValueError(f"Record '{name}' (line {line_no}): invalid residue(s) {''.join(bad)}")
+    return seq
+
+
+def iter_pir(records, validate=True):
+    """Turn (header, sequence, line) records into PIR entries with unique align codes."""
+    name_counts = defaultdict(int)
+    for header, seq, line_no in records:
+        if not seq:
+            continue
+        seq_name = make_short_code(header)
+        if validate:
+            seq = validate_sequence(seq_name, seq, line_no)
+        name_counts[seq_name] += 1
+        unique_name = f"{seq_name}_{name_counts[seq_name]}" if name_counts[seq_name] > 1 else seq_name
+        yield unique_name, f">P1;{unique_name}\nsequence:{unique_name}:::::::0.00:0.00\n{seq}*\n", len(seq)
+
+
+def convert_stream(src, dst, validate=True, progress=None, progress_every=1000):
+    """Stream FASTA from `src` to PIR on `dst`; returns throughput statistics."""
+    start = time.perf_counter()
+    records = residues = 0
+    first = True
+    for _, entry, length in iter_pir(iter_fasta(src), validate=validate):
+        if not first:
+            dst.write("\n")
+        dst.write(entry.rstrip("\n"))
+        first = False
+        records += 1
+        residues += length
+        if progress and records % progress_every == 0:
+            progress(records, residues)
+    elapsed = time.perf_counter() - start
+    return {
+        'records': records,
+        'residues': residues,
+        'seconds': elapsed,
+        'records_per_s': records / elapsed if elapsed else float(records),
+        'residues_per_s': residues / elapsed if elapsed else float(residues),
+    }
+
+
+def convert_file(src_path, dst_path, validate=True, progress=None, progress_every=1000):
+    with open(src_path, 'r', encoding='utf-8') as src, open(dst_path, 'w', encoding='utf-8') as dst:
+        return convert_stream(src, dst, validate=validate, progress=progress, progress_every=progress_every)
+
+
+def format_stats(stats):
+    return (f"{stats['records']} records, {stats['residues']} residues in {stats['seconds']:.2f}s "
+            f"({stats['records_per_s']:.0f} records/s, {stats['residues_per_s'] / 1e6:.2f} Mres/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert FASTA to Modeller PIR without loading the file into memory.")
+    parser.add_argument("fasta")
+    parser.add_argument("pir")
+    parser.add_argument("--no-validate", action="store_true", help="skip residue validation")
+    args = parser.parse_args()
+
+    def report(records, residues):
+        print(f"  {records} records...", file=sys.stderr)
+
+    try:
+        stats = convert_file(args.fasta, args.pir, validate=not args.no_validate,
+                             progress=report, progress_every=10000)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(format_stats(stats))
+
+
+if __name__ == "__main__":
+    main()
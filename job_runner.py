@@ -0,0 +1,213 @@
+import os
+import sys
+import ctypes
+import queue
+import time
+import signal
+import threading
+import traceback
+import importlib
+import multiprocessing
+
+
+# Seconds between liveness checks while waiting for events from a job
+POLL_INTERVAL = 0.2
+# Seconds between memory samples of jobs that have a budget
+SAMPLE_SECONDS = 1.0
+# Seconds between ('progress', (percent, seconds_left)) events of jobs that have a timer
+PROGRESS_SECONDS = 1.0
+# Seconds a cancelled job gets to exit on SIGTERM before it is killed
+CANCEL_GRACE_SECONDS = 5.0
+
+
+def _pipe_output(events):
+    """Point fds 1 and 2 at a pipe and forward its lines as ('log', line) events.
+
+    Working at the descriptor level also captures what Modeller's compiled
+    core prints, not only Python-level writes. Returns a function that
+    flushes, closes the pipe and waits for the last lines.
+    """
+    read_fd, write_fd = os.pipe()
+    os.dup2(write_fd, 1)
+    os.dup2(write_fd, 2)
+    os.close(write_fd)
+    sys.stdout = sys.stderr = open(1, 'w', buffering=1, encoding='utf-8', errors='replace', closefd=False)
+
+    def forward():
+        with open(read_fd, 'r', encoding='utf-8', errors='replace') as fh:
+            for line in fh:
+                if line.strip():
+                    events.put(('log', line.rstrip('\n')))
+
+    reader = threading.Thread(target=forward, daemon=True)
+    reader.start()
+
+    def close():
+        sys.stdout.flush()
+        try:
+            ctypes.CDLL(None).fflush(None)
+        except Exception:
+            pass
+        os.close(1)
+        os.close(2)
+        reader.join(5)
+    return close
+
+
+def _job_main(target, kwargs, cwd, events):
+    """Child entry point: own cwd, own stdout/stderr, events back over the queue."""
+    if hasattr(os, 'setpgrp'):
+        # Own process group, so cancelling also stops any pools the job starts
+        os.setpgrp()
+    close_output = _pipe_output(events)
+    try:
+        if cwd:
+            os.makedirs(cwd, exist_ok=True)
+            os.chdir(cwd)
+        module_name, func_name = target.rsplit('.', 1)
+        func = getattr(importlib.import_module(module_name), func_name)
+        result = func(emit=lambda kind, payload: events.put((kind, payload)), **kwargs)
+        close_output()
+        events.put(('result', result))
+    except BaseException as e:
+        error = f"{e}\n{traceback.format_exc()}"
+        close_output()
+        events.put(('error', error))
+
+
+class JobProcess:
+    """One Modeller job in a spawned child process.
+
+    `target` is a dotted "module.function" name; the function receives the
+    keyword arguments plus an `emit(kind, payload)` callback. The child runs
+    in `cwd` with stdout/stderr piped to the event queue, so concurrent
+    jobs never share a working directory or log stream with each other or
+    with the GUI.
+    """
+
+    def __init__(self, target, cwd=None, budget=None, timer=None, **kwargs):
+        self.target = target
+        self.cwd = os.path.abspath(cwd) if cwd else None
+        self.kwargs = kwargs
+        # Optional resources.JobBudget: admission control, RSS sampling and the memory limit
+        self.budget = budget
+        # Optional eta.StageTimer: progress events while running, duration recorded on success
+        self.timer = timer
+        self.memory_error = None
+        self.context = multiprocessing.get_context('spawn')
+        self.events = self.context.Queue()
+        self.process = None
+        self.cancelled = False
+        self.cancel_time = None
+
+    def start(self):
+        self.process = self.context.Process(target=_job_main,
+                                            args=(self.target, self.kwargs, self.cwd, self.events))
+        self.process.start()
+        return self
+
+    def iter_events(self):
+        """Yield (kind, payload) until the job ends; the last event is 'result' or 'error'."""
+        last_sample = 0.0
+        last_progress = time.monotonic()
+        while True:
+            if (self.cancel_time is not None and time.monotonic() - self.cancel_time > CANCEL_GRACE_SECONDS
+                    and self.process.is_alive()):
+                self.kill()
+            if self.timer and time.monotonic() - last_progress >= PROGRESS_SECONDS:
+                last_progress = time.monotonic()
+                yield 'progress', self.timer.status()
+            if self.budget and time.monotonic() - last_sample >= SAMPLE_SECONDS and not self.memory_error:
+                last_sample = time.monotonic()
+                self.memory_error = self.budget.sample(self.process.pid)
+                if self.memory_error:
+                    self.cancel()
+            try:
+                event = self.events.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                if self.process.is_alive():
+                    continue
+                # Drain anything flushed just before exit
+                try:
+                    event = self.events.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    self.process.join()
+                    if self.memory_error:
+                        yield 'error', self.memory_error
+                    elif self.cancelled:
+                        yield 'error', "Job cancelled by user."
+                    else:
+                        yield 'error', f"Job process exited unexpectedly (code {self.process.exitcode})."
+                    return
+            if event[0] == 'error' and self.memory_error:
+                event = ('error', self.memory_error)
+            yield event
+            if event[0] in ('result', 'error'):
+                self.process.join()
+                return
+
+    def run(self, on_event=None):
+        """Start, forward non-final events to `on_event` and return the result (raises on error).
+
+        With a budget the job first waits until its estimated memory fits,
+        and its measured peak is recorded to improve later estimates. A
+        timer starts once the job is admitted and records only completed runs.
+        """
+        if self.budget and not self.budget.admit(lambda: self.cancelled,
+                                                 lambda text: on_event and on_event('message', text)):
+            raise RuntimeError("Job cancelled by user.")
+        finished = False
+        completed = False
+        try:
+            if self.timer:
+                self.timer.start()
+            self.start()
+            for kind, payload in self.iter_events():
+                if kind == 'result':
+                    finished = completed = True
+                    return payload
+                if kind == 'error':
+                    finished = self.memory_error is not None
+                    raise RuntimeError(payload)
+                if on_event:
+                    on_event(kind, payload)
+        finally:
+            if self.budget:
+                # User cancellations stop early and would bias the estimate low
+                self.budget.finish(record=finished)
+            if self.timer:
+                self.timer.finish(record=completed)
+
+    def cancel(self, wait=False):
+        """Terminate the child and everything it started.
+
+        Returns right after signalling, so it is safe from the GUI thread; the
+        thread in run()/iter_events() reaps the child and kills it if it has
+        not exited after CANCEL_GRACE_SECONDS. `wait` blocks for that here
+        instead, for shutdown paths where no such thread keeps running.
+        """
+        self.cancelled = True
+        if not self.process or not self.process.is_alive():
+            return
+        if self.cancel_time is None:
+            self.cancel_time = time.monotonic()
+        try:
+            if hasattr(os, 'killpg'):
+                os.killpg(self.process.pid, signal.SIGTERM)
+            else:
+                self.process.terminate()
+        except ProcessLookupError:
+            pass
+        if wait:
+            self.process.join(CANCEL_GRACE_SECONDS)
+            if self.process.is_alive():
+                self.kill()
+
+    def kill(self):
+        try:
+            if hasattr(os, 'killpg'):
+                os.killpg(self.process.pid, signal.SIGKILL)
+            else:
+                self.process.kill()
+        except ProcessLookupError:
+            pass
@@ -0,0 +1,453 @@
+import os
+import sys
+import json
+import uuid
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+from cache_utils import cache_path
+from job_runner import JobProcess
+from pir_index import PirIndex
+from resources import JobBudget, build_features
+from eta import StageTimer, available_cores
+from build_presets import preset_settings, relative_cost
+from run_export import export_run
+
+
+DEFAULT_PORT = 8765
+# Longest time a GET /jobs/<id>/events request waits for something new
+LONG_POLL_SECONDS = 20
+MAX_UPLOAD_BYTES = 200 * 1024 * 1024
+
+# Job kinds accepted by the service, the parameters each may carry with their
+# accepted types, and the ones every request must give
+JOB_TARGETS = {
+    'build': 'modeller_jobs.build_models',
+}
+JOB_PARAMS = {
+    'build': {'knowns': list, 'sequence': str, 'start_model': int, 'end_model': int,
+              'assess_methods': list, 'adaptive': (dict, type(None)), 'preset': (str, type(None))},
+}
+REQUIRED_PARAMS = {
+    'build': ('knowns', 'sequence', 'start_model', 'end_model'),
+}
+ATOM_SUFFIXES = ('', '.pdb', '.atm', '.ent')
+
+
+class Job:
+    def __init__(self, kind, params, directory):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.params = params
+        self.directory = directory
+        self.status = 'queued'
+        self.events = []
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.process = None
+        self.peak_rss_mb = None
+        # Latest (percent, seconds left) of a running job; not kept in the event list
+        self.progress = None
+        self.changed = threading.Condition()
+
+    def add_event(self, kind, payload):
+        with self.changed:
+            self.events.append([kind, payload])
+            self.changed.notify_all()
+
+    def set_status(self, status, result=None, error=None):
+        with self.changed:
+            self.status = status
+            self.result = result
+            self.error = error
+            if status in ('done', 'failed', 'cancelled'):
+                self.finished = time.time()
+            self.changed.notify_all()
+
+    @property
+    def active(self):
+        return self.status in ('queued', 'running')
+
+    def summary(self):
+        return {'id': self.id, 'kind': self.kind, 'status': self.status,
+                'created': self.created, 'finished': self.finished,
+                'events': len(self.events), 'error': self.error, 'peak_rss_mb': self.peak_rss_mb,
+                'progress': self.progress}
+
+
+def check_params(kind, params):
+    """Raise ValueError unless `params` holds only known parameters of the right types."""
+    if not isinstance(params, dict):
+        raise ValueError("'params' must be an object")
+    unknown = set(params) - set(JOB_PARAMS[kind])
+    if unknown:
+        raise ValueError(f"Unsupported parameters: {', '.join(sorted(unknown))}")
+    missing = [name for name in REQUIRED_PARAMS[kind] if name not in params]
+    if missing:
+        raise ValueError(f"Missing parameters: {', '.join(missing)}")
+    for name, value in params.items():
+        expected = JOB_PARAMS[kind][name]
+        # JSON has no separate integer type for booleans to be mistaken for
+        if not isinstance(value, expected) or (expected is int and isinstance(value, bool)):
+            raise ValueError(f"Invalid value for '{name}': {value!r}")
+    if kind == 'build':
+        if not all(isinstance(code, str) for code in params['knowns']):
+            raise ValueError("'knowns' must be a list of template codes")
+        if not all(isinstance(name, str) for name in params.get('assess_methods', [])):
+            raise ValueError("'assess_methods' must be a list of method names")
+        if not 1 <= params['start_model'] <= params['end_model']:
+            raise ValueError("Model range must satisfy 1 <= start_model <= end_model")
+        if 'preset' in params:
+            preset_settings(params['preset'])
+
+
+class JobManager:
+    """Runs submitted jobs on a bounded pool; each job is one JobProcess in its own directory."""
+
+    def __init__(self, root=None, workers=2):
+        self.root = root or cache_path("jobs")
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers))
+
+    def submit(self, kind, params, alignment, files):
+        if kind not in JOB_TARGETS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        check_params(kind, params)
+        if not isinstance(alignment, str) or not isinstance(files or {}, dict):
+            raise ValueError("'alignment' must be a string and 'files' an object")
+        job = Job(kind, dict(params), None)
+        job.directory = os.path.join(self.root, job.id)
+        os.makedirs(job.directory)
+        # Uploaded alignment and template structures live in the job directory
+        with open(os.path.join(job.directory, 'alignment.ali'), 'w', encoding='utf-8') as fh:
+            fh.write(alignment)
+        for name, text in (files or {}).items():
+            with open(os.path.join(job.directory, os.path.basename(name)), 'w', encoding='utf-8') as fh:
+                fh.write(text)
+        job.params['alnfile'] = os.path.join(job.directory, 'alignment.ali')
+        job.params['atom_dirs'] = [job.directory]
+        with self.lock:
+            self.jobs[job.id] = job
+        self.pool.submit(self._run, job)
+        return job
+
+    def _run(self, job):
+        # Runs on the pool: anything escaping here would leave the job queued forever
+        try:
+            self._run_job(job)
+        except Exception as e:
+            if job.active:
+                job.set_status('failed', error=str(e) or type(e).__name__)
+
+    def _run_job(self, job):
+        if job.status == 'cancelled':
+            return
+        budget = timer = None
+        if job.kind == 'build':
+            # Queued builds start only when their estimated memory fits next to the running ones
+            try:
+                features = build_features(job.params['alnfile'], job.params['knowns'])
+                budget = JobBudget('build', features)
+                timer = StageTimer('build', dict(features, cores=available_cores(),
+                                                 models=job.params['end_model'] - job.params['start_model'] + 1,
+                                                 effort=relative_cost(job.params.get('preset'))))
+            except (OSError, KeyError, ValueError) as e:
+                job.add_event('message', f"Memory and time estimates unavailable: {e}")
+        process = JobProcess(JOB_TARGETS[job.kind], cwd=job.directory, budget=budget, timer=timer,
+                             **job.params)
+        # A cancel during the setup above wins; cancel() takes the same lock
+        with self.lock:
+            if job.status == 'cancelled':
+                return
+            job.process = process
+            job.set_status('running')
+
+        models = []
+
+        def on_event(kind, payload):
+            if kind == 'progress':
+                job.progress = payload
+            else:
+                if kind == 'models':
+                    models[:] = payload
+                    if timer:
+                        timer.actual['models'] = len(payload)
+                job.add_event(kind, payload)
+
+        started = time.time()
+        try:
+            result = job.process.run(on_event)
+            job.set_status('done', result=result)
+        except Exception as e:
+            cancelled = job.process.cancelled and not job.process.memory_error
+            job.set_status('cancelled' if cancelled else 'failed', error=str(e))
+        if budget:
+            job.peak_rss_mb = round(budget.peak_mb, 1)
+            job.add_event('message', budget.report())
+        if job.kind == 'build':
+            # Same result tables as GUI builds (run_export)
+            params = {k: v for k, v in job.params.items() if k not in ('alnfile', 'atom_dirs')}
+            try:
+                export_run(job.params['sequence'], job.directory, job.result or models, job.params['alnfile'],
+                           job.params['knowns'], dict(params, source='job_service', job=job.id),
+                           status=job.status, started=started)
+            except (OSError, RuntimeError) as e:
+                job.add_event('message', f"Result export failed: {e}")
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self.lock:
+            return [job.summary() for job in self.jobs.values()]
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        with self.lock:
+            if job.status == 'queued':
+                job.set_status('cancelled', error="Job cancelled by user.")
+            elif job.status == 'running' and job.process:
+                job.process.cancel()
+        return job
+
+    def events(self, job_id, since=0, wait=0):
+        """Events after index `since`; blocks up to `wait` seconds while the job is active."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        deadline = time.time() + wait
+        with job.changed:
+            while len(job.events) <= since and job.active and time.time() < deadline:
+                job.changed.wait(deadline - time.time())
+            return {'status': job.status, 'events': job.events[since:], 'next': len(job.events),
+                    'result': job.result, 'error': job.error, 'progress': job.progress}
+
+    def file_path(self, job_id, name):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        path = os.path.join(job.directory, os.path.basename(name))
+        return path if os.path.isfile(path) else None
+
+    def shutdown(self):
+        for job in list(self.jobs.values()):
+            if job.active and job.process:
+                job.process.cancel(wait=True)
+        self.pool.shutdown(wait=False)
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """JSON API:
+
+    POST /jobs                       {kind, params, alignment, files} -> {id}
+    GET  /jobs                       list of job summaries
+    GET  /jobs/<id>/events?since=N   long-polls for log/message/models events
+    POST /jobs/<id>/cancel
+    GET  /jobs/<id>/files            output file names
+    GET  /jobs/<id>/files/<name>     raw output file
+    """
+
+    manager = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def route(self):
+        url = urlparse(self.path)
+        return [p for p in url.path.split('/') if p], parse_qs(url.query)
+
+    def do_GET(self):
+        parts, query = self.route()
+        if parts == ['jobs']:
+            return self.send_json({'jobs': self.manager.list()})
+        if len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'events':
+            try:
+                since = int(query.get('since', ['0'])[0])
+                wait = min(float(query.get('wait', ['0'])[0]), LONG_POLL_SECONDS)
+                if since < 0:
+                    raise ValueError("'since' must not be negative")
+            except ValueError as e:
+                return self.send_json({'error': str(e)}, 400)
+            data = self.manager.events(parts[1], since, wait)
+            return self.send_json(data) if data else self.send_json({'error': 'unknown job'}, 404)
+        if len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'files':
+            job = self.manager.get(parts[1])
+            if job is None:
+                return self.send_json({'error': 'unknown job'}, 404)
+            return self.send_json({'files': sorted(os.listdir(job.directory))})
+        if len(parts) == 4 and parts[0] == 'jobs' and parts[2] == 'files':
+            path = self.manager.file_path(parts[1], parts[3])
+            if path is None:
+                return self.send_json({'error': 'file not found'}, 404)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(os.path.getsize(path)))
+            self.end_headers()
+            with open(path, 'rb') as fh:
+                while True:
+                    chunk = fh.read(64 * 1024)
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+            return
+        self.send_json({'error': 'not found'}, 404)
+
+    def do_POST(self):
+        parts, _ = self.route()
+        if parts == ['jobs']:
+            length = int(self.headers.get('Content-Length', 0))
+            if length > MAX_UPLOAD_BYTES:
+                return self.send_json({'error': 'request too large'}, 413)
+            try:
+                request = json.loads(self.rfile.read(length) or b'{}')
+                if not isinstance(request, dict):
+                    raise ValueError("request body must be a JSON object")
+                if 'alignment' not in request:
+                    raise ValueError("missing 'alignment'")
+                job = self.manager.submit(request.get('kind', 'build'), request.get('params', {}),
+                                          request['alignment'], request.get('files', {}))
+            except (KeyError, ValueError) as e:
+                return self.send_json({'error': str(e)}, 400)
+            return self.send_json({'id': job.id}, 201)
+        if len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'cancel':
+            job = self.manager.cancel(parts[1])
+            return self.send_json(job.summary()) if job else self.send_json({'error': 'unknown job'}, 404)
+        self.send_json({'error': 'not found'}, 404)
+
+
+def serve(host='127.0.0.1', port=DEFAULT_PORT, root=None, workers=2):
+    """Create the HTTP server; call serve_forever() on the result."""
+    handler = type('BoundJobRequestHandler', (JobRequestHandler,), {'manager': JobManager(root, workers)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+class JobClient:
+    """Client for a job service; used by the GUI for remote builds."""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _check(self, response):
+        if response.status_code >= 400:
+            try:
+                message = response.json().get('error')
+            except ValueError:
+                message = response.text
+            raise RuntimeError(f"Job service error {response.status_code}: {message}")
+        return response
+
+    def submit_build(self, alnfile, params, atom_dirs=()):
+        """Upload the alignment plus every template structure it references and start a build."""
+        index = PirIndex(alnfile)
+        files = {}
+        search = [os.path.dirname(os.path.abspath(alnfile))] + list(atom_dirs)
+        for code in params.get('knowns', []):
+            header = index.header(code).split(':')
+            atom_file = header[1].strip() if len(header) > 1 and header[1].strip() else code
+            path = find_atom_file(atom_file, search)
+            if path is None:
+                raise FileNotFoundError(f"Template structure for {code} ({atom_file}) not found")
+            with open(path, 'r', encoding='utf-8', errors='replace') as fh:
+                files[os.path.basename(path)] = fh.read()
+        with open(alnfile, 'r', encoding='utf-8') as fh:
+            alignment = fh.read()
+        payload = {'kind': 'build', 'params': params, 'alignment': alignment, 'files': files}
+        response = self._check(self.session.post(f"{self.base_url}/jobs", json=payload, timeout=self.timeout))
+        return response.json()['id']
+
+    def events(self, job_id, since=0, wait=LONG_POLL_SECONDS):
+        response = self.session.get(f"{self.base_url}/jobs/{job_id}/events",
+                                    params={'since': since, 'wait': wait}, timeout=wait + self.timeout)
+        return self._check(response).json()
+
+    def follow(self, job_id, on_event=None):
+        """Stream events until the job ends; returns the final events response."""
+        since = 0
+        while True:
+            data = self.events(job_id, since)
+            for kind, payload in data['events']:
+                if on_event:
+                    on_event(kind, payload)
+            if on_event and data.get('progress') and data['status'] == 'running':
+                on_event('progress', data['progress'])
+            since = data['next']
+            if data['status'] not in ('queued', 'running'):
+                return data
+
+    def cancel(self, job_id):
+        return self._check(self.session.post(f"{self.base_url}/jobs/{job_id}/cancel",
+                                             timeout=self.timeout)).json()
+
+    def files(self, job_id):
+        return self._check(self.session.get(f"{self.base_url}/jobs/{job_id}/files",
+                                            timeout=self.timeout)).json()['files']
+
+    def download(self, job_id, name, out_dir):
+        path = os.path.join(out_dir, os.path.basename(name))
+        with self.session.get(f"{self.base_url}/jobs/{job_id}/files/{name}", stream=True,
+                              timeout=self.timeout) as response:
+            self._check(response)
+            with open(path, 'wb') as fh:
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    fh.write(chunk)
+        return path
+
+
+def find_atom_file(name, directories):
+    """Locate a template structure the way Modeller's atom_files_directory search does."""
+    stem = os.path.basename(name)
+    for directory in directories:
+        for candidate in [stem + suffix for suffix in ATOM_SUFFIXES] + [f"pdb{stem.lower()}.ent"]:
+            path = os.path.join(directory, candidate)
+            if os.path.isfile(path):
+                return path
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Modeller build jobs for remote GUI clients.")
+    parser.add_argument("--host", default="127.0.0.1", help="interface to bind (0.0.0.0 for all)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="jobs run concurrently; further jobs wait in the queue")
+    parser.add_argument("--root", default=None, help="directory for job folders (default: cache/jobs)")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.root, args.workers)
+    print(f"Job service on http://{args.host}:{args.port} ({args.workers} workers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.RequestHandlerClass.manager.shutdown()
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
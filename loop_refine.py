@@ -0,0 +1,192 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from modeller import Environ, Selection
+from modeller.automodel import DOPELoopModel, LoopModel, refine, assess
+from modeller.scripts import complete_pdb
+
+from pir_index import PirIndex
+from artifacts import decompress_file
+
+
+# Loops longer than this are not worth sampling with LoopModel
+MAX_LOOP_LENGTH = 14
+MAX_REGIONS = 4
+# Residues whose smoothed DOPE exceeds mean + DOPE_SIGMA * std count as a hotspot
+DOPE_SIGMA = 1.0
+DOPE_WINDOW = 5
+
+
+def merge_regions(regions, pad=1, n_residues=None):
+    """Pad, clip and merge overlapping 1-based (start, end) residue ranges."""
+    merged = []
+    for start, end in sorted(regions):
+        start = max(1, start - pad)
+        end = end + pad if n_residues is None else min(n_residues, end + pad)
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def alignment_loop_regions(alnfile, knowns, sequence, pad=1):
+    """Target residues not covered by any template, plus both sides of template-only insertions."""
+    index = PirIndex(alnfile)
+    target = index.sequence(sequence)
+    templates = [index.sequence(code) for code in knowns if code in index.by_code]
+    regions, run_start, residue = [], None, 0
+    for col, aa in enumerate(target):
+        if aa == '/':
+            continue
+        if aa == '-':
+            # Deletion in the target: the flanking residues need rebuilding
+            if any(col < len(t) and t[col] not in '-/' for t in templates) and residue:
+                regions.append((residue, residue + 1))
+            continue
+        residue += 1
+        uncovered = all(col >= len(t) or t[col] in '-/' for t in templates)
+        if uncovered and run_start is None:
+            run_start = residue
+        elif not uncovered and run_start is not None:
+            regions.append((run_start, residue - 1))
+            run_start = None
+    if run_start is not None:
+        regions.append((run_start, residue))
+    return merge_regions(regions, pad=pad, n_residues=residue)
+
+
+def dope_loop_regions(env, pdbfile, sigma=DOPE_SIGMA, window=DOPE_WINDOW):
+    """Contiguous stretches with a high smoothed per-residue DOPE energy."""
+    mdl = complete_pdb(env, pdbfile)
+    profile = Selection(mdl).get_dope_profile().get_smoothed(window=window)
+    energies = [r.energy for r in profile]
+    if not energies:
+        return []
+    mean = sum(energies) / len(energies)
+    std = (sum((e - mean) ** 2 for e in energies) / len(energies)) ** 0.5
+    cutoff = mean + sigma * std
+    regions, run_start = [], None
+    for i, e in enumerate(energies, 1):
+        if e > cutoff and run_start is None:
+            run_start = i
+        elif e <= cutoff and run_start is not None:
+            regions.append((run_start, i - 1))
+            run_start = None
+    if run_start is not None:
+        regions.append((run_start, len(energies)))
+    return regions
+
+
+class _RegionSelection:
+    """select_loop_atoms over an explicit list of 1-based residue ranges (set as `loop_regions`)."""
+
+    loop_regions = ()
+
+    def select_loop_atoms(self):
+        residues = [self.residues[i - 1] for start, end in self.loop_regions for i in range(start, end + 1)]
+        return Selection(*residues)
+
+
+class RegionLoopModel(_RegionSelection, LoopModel):
+    pass
+
+
+class RegionDOPELoopModel(_RegionSelection, DOPELoopModel):
+    pass
+
+
+def refine_task(task):
+    """Worker: refine the loops of one parent model in its own directory."""
+    # Modeller reads plain files only; parents outside the retained top models may be compressed
+    parent_path = decompress_file(task['parent_path']) or task['parent_path']
+    work_dir = task['work_dir']
+    os.makedirs(work_dir, exist_ok=True)
+    original_cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        env = Environ()
+        env.io.atom_files_directory = [os.path.dirname(parent_path)] + task['atom_dirs']
+        env.libs.topology.read(file='$(LIB)/top_heav.lib')
+        env.libs.parameters.read(file='$(LIB)/par.lib')
+
+        regions = list(task['regions'])
+        if task['use_dope']:
+            regions += dope_loop_regions(env, parent_path)
+        regions = merge_regions(regions, pad=0)
+        regions = [r for r in regions if r[1] - r[0] + 1 <= MAX_LOOP_LENGTH][:MAX_REGIONS]
+        if not regions:
+            return {'parent': task['parent'], 'regions': [], 'models': []}
+
+        model_class = RegionDOPELoopModel if task['dope_loop'] else RegionLoopModel
+        m = model_class(env, inimodel=parent_path, sequence=task['sequence'],
+                        loop_assess_methods=(assess.DOPE,))
+        m.loop_regions = regions
+        m.loop.starting_model = 1
+        m.loop.ending_model = task['n_models']
+        m.loop.md_level = refine.fast
+        m.make()
+
+        models = []
+        for out in m.loop.outputs:
+            if out.get('failure') is not None:
+                continue
+            models.append({
+                'filename': os.path.relpath(os.path.join(work_dir, out['name']), task['output_dir']),
+                'parent': task['parent'],
+                'molpdf': out.get('molpdf'),
+                'dope': out.get('DOPE score'),
+                'loops': ", ".join(f"{s}-{e}" for s, e in regions),
+            })
+        return {'parent': task['parent'], 'regions': regions, 'models': models}
+    finally:
+        os.chdir(original_cwd)
+
+
+def refine_models(parents, alnfile, knowns, sequence, output_dir, atom_dirs=(),
+                  n_models=5, use_alignment=True, use_dope=True, dope_loop=True,
+                  processes=None, log=print):
+    """Refine loop regions of several parent models in parallel.
+
+    parents: model filenames relative to output_dir (e.g. the best N by DOPE).
+    Returns one result dict per parent with the detected regions and the
+    scored loop models, whose filenames are relative to output_dir.
+    """
+    shared_regions = alignment_loop_regions(alnfile, knowns, sequence) if use_alignment else []
+    if shared_regions:
+        log("Alignment loop regions: " + ", ".join(f"{s}-{e}" for s, e in shared_regions))
+
+    tasks = []
+    for parent in parents:
+        stem = os.path.splitext(os.path.basename(parent))[0]
+        tasks.append({
+            'parent': parent,
+            'parent_path': os.path.abspath(os.path.join(output_dir, parent)),
+            'work_dir': os.path.abspath(os.path.join(output_dir, 'loops', stem)),
+            'output_dir': os.path.abspath(output_dir),
+            'atom_dirs': [os.path.abspath(d) for d in atom_dirs],
+            'sequence': sequence,
+            'regions': shared_regions,
+            'use_dope': use_dope,
+            'dope_loop': dope_loop,
+            'n_models': n_models,
+        })
+
+    results = []
+    workers = processes or min(os.cpu_count() or 1, len(tasks)) or 1
+    log(f"Refining loops of {len(tasks)} models on {workers} processes...")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(refine_task, t): t['parent'] for t in tasks}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                log(f"Loop refinement of {futures[future]} failed: {e}")
+                continue
+            if not result['regions']:
+                log(f"{result['parent']}: no refinable loop regions")
+            else:
+                regions = ", ".join(f"{s}-{e}" for s, e in result['regions'])
+                log(f"{result['parent']}: refined {regions} -> {len(result['models'])} loop models")
+            results.append(result)
+    return results
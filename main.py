@@ -16,7 +16,13 @@ from PyQt5.QtWidgets import (
 from PyQt5.QtGui import QPalette, QColor, QTextCursor, QFont, QIcon, QLinearGradient, QBrush
 from Bio import SeqIO
 from io import StringIO
+from itertools import islice
 from blast import BlastWindow
+from fasta_pir import convert_stream, convert_file, format_stats
+
+# Uploads larger than this are previewed, not loaded, and converted file-to-file
+LARGE_FASTA_BYTES = 5 * 1024 * 1024
+PREVIEW_LINES = 200
 
 
 class MainWindow(QMainWindow):
@@ -25,6 +31,8 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("AutoMod - Home")
         self.setMinimumSize(1000, 700)
         self.setWindowIcon(QIcon("D:/Shreya_VS_projects/Modeller_automation/Images/Screenshot 2025-11-09 171245.png"))
+        self.fasta_path = None
+        self.loaded_text = None
         self.initUI()
 
     def initUI(self):
@@ -144,9 +152,16 @@ class MainWindow(QMainWindow):
         print(f"Selected file: {filepath}")
 
         try:
-            with open(filepath, 'r', encoding='utf-8') as file:
-                content = file.read()
-                self.text_fasta.setPlainText(content)
+            self.fasta_path = filepath
+            if os.path.getsize(filepath) > LARGE_FASTA_BYTES:
+                # Show only the head of proteome-scale files; conversion streams from disk
+                with open(filepath, 'r', encoding='utf-8') as file:
+                    content = "".join(islice(file, PREVIEW_LINES))
+            else:
+                with open(filepath, 'r', encoding='utf-8') as file:
+                    content = file.read()
+            self.text_fasta.setPlainText(content)
+            self.loaded_text = self.text_fasta.toPlainText()
         except Exception as e:
             QMessageBox.warning(self, f'Error! Failed to read the file : {e}')
     def submit_fasta(self):
@@ -164,47 +179,33 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Empty Input", "Please paste or upload a FASTA sequence first.")
 
     def fasta_to_pir(self):
-        from collections import defaultdict
-        import re
-
         fasta_text = self.text_fasta.toPlainText().strip()
         if not fasta_text:
             return None
 
-        lines = fasta_text.splitlines()
-        pir_lines, seq, name_counts = [], [], defaultdict(int)
-        seq_name = None
-
-        def make_short_code(header):
-            token = header.split("|")[-1].split()[0]
-            token = token.split("_")[0]
-            code = re.sub(r"[^A-Za-z0-9_]", "_", token.upper() or "SEQ")
-            return code
-
-        for line in lines:
-            if line.startswith(">"):
-                if seq_name and seq:
-                    name_counts[seq_name] += 1
-                    unique_name = f"{seq_name}_{name_counts[seq_name]}" if name_counts[seq_name] > 1 else seq_name
-                    pir_lines.append(f">P1;{unique_name}")
-                    pir_lines.append(f"sequence:{unique_name}:::::::0.00:0.00")
-                    pir_lines.append("".join(seq) + "*")
-                    seq = []
-                seq_name = make_short_code(line[1:])
-            else:
-                seq.append(line.strip())
-
-        if seq_name and seq:
-            name_counts[seq_name] += 1
-            unique_name = f"{seq_name}_{name_counts[seq_name]}" if name_counts[seq_name] > 1 else seq_name
-            pir_lines.append(f">P1;{unique_name}")
-            pir_lines.append(f"sequence:{unique_name}:::::::0.00:0.00")
-            pir_lines.append("".join(seq) + "*")
-
-        return "\n".join(pir_lines)
+        out = StringIO()
+        convert_stream(StringIO(fasta_text), out)
+        return out.getvalue()
 
     def download_ali(self):
-        pir_text = self.fasta_to_pir()
+        # Large uploads are converted file-to-file without going through the widget
+        if self.fasta_path and self.text_fasta.toPlainText() == self.loaded_text:
+            filename, _ = QFileDialog.getSaveFileName(self, "Save PIR File", "target.ali", "PIR Files (*.ali)")
+            if not filename:
+                return
+            try:
+                stats = convert_file(self.fasta_path, filename)
+            except (OSError, ValueError) as e:
+                QMessageBox.warning(self, "Conversion Failed", str(e))
+                return
+            QMessageBox.information(self, "Success", f"Target file (PIR) saved successfully.\n{format_stats(stats)}")
+            return
+
+        try:
+            pir_text = self.fasta_to_pir()
+        except ValueError as e:
+            QMessageBox.warning(self, "Invalid Sequence", str(e))
+            return
         if pir_text:
             options = QFileDialog.Options()
             filename, _ = QFileDialog.getSaveFileName(self, "Save PIR File", "target.ali", "PIR Files (*.ali)")
@@ -9,118 +9,142 @@ import sys
 # from PyQt5 import QtWebEngine
 # QtWebEngine.QtWebEngine.initialize()
 
-import io
 import re
+import time
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QLabel, QHBoxLayout, QVBoxLayout, QPushButton,
     QFileDialog, QTextEdit, QWidget, QMessageBox, QLineEdit, QSpinBox,
     QCheckBox, QProgressBar, QGroupBox, QFormLayout, QTabWidget,
-    QTableWidget, QTableWidgetItem, QHeaderView, QSplitter
+    QTableWidget, QTableWidgetItem, QHeaderView, QSplitter, QComboBox
 )
 from PyQt5.QtGui import QFont, QColor, QIcon, QPalette, QBrush, QLinearGradient
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
-
-from modeller import Environ
-from modeller.automodel import AutoModel, assess
+from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer
 
 from dynamic_align import DynamicAlign
+from job_runner import JobProcess
+from job_service import JobClient, DEFAULT_PORT
+from cache_utils import cache_path
+from assistant_context import register_run, write_summary
+from artifacts import ArtifactManager, RetentionPolicy, format_stats
+from run_export import RunExporter
+from resources import JobBudget, build_features
+from eta import StageTimer, available_cores, format_eta
+from build_presets import PRESETS, DEFAULT_PRESET, relative_cost
+from pir_index import PirIndex
+from trajectory import TrajectoryMonitor, sparkline
+from violations import load_run, summarize
+from validation import validate_models
+
+# (header, model key, shown only when present) for the Models table
+MODEL_COLUMNS = [
+    ("Filename", 'filename', False),
+    ("Parent", 'parent', True),
+    ("Loops", 'loops', True),
+    ("MolPDF", 'molpdf', False),
+    ("DOPE", 'dope', False),
+    ("DOPE-HR", 'dopehr', True),
+    ("z-DOPE", 'normalized_dope', True),
+    ("GA341", 'ga341', False),
+    ("Clashes", 'clashes', True),
+    ("Rama outliers", 'rama_outliers', True),
+]
 
 
 
-class LogStream(io.StringIO):
-    def __init__(self, line_signal):
-        super().__init__()
-        self.line_signal = line_signal
-        self.pending = ""
-
-    def write(self, text):
-        super().write(text)
-        self.pending += text
-        while '\n' in self.pending:
-            line, self.pending = self.pending.split('\n', 1)
-            if line.strip():
-                self.line_signal.emit(line)
-
-
 class ModelBuildWorker(QThread):
     progress = pyqtSignal(int)
+    # Seconds left, or None when the build is taking longer than estimated
+    eta = pyqtSignal(object)
     finished = pyqtSignal(str, bool, list)
     message = pyqtSignal(str)
     log_line = pyqtSignal(str)
+    models_ready = pyqtSignal(list)
 
-    def __init__(self, alnfile, knowns, sequence, start_model, end_model, assess_methods, output_dir=None):
+    def __init__(self, alnfile, knowns, sequence, start_model, end_model, assess_methods, output_dir=None,
+                 adaptive=None, preset=DEFAULT_PRESET):
         super().__init__()
         self.alnfile = alnfile
         self.knowns = knowns
         self.sequence = sequence
         self.start_model = start_model
         self.end_model = end_model
+        # Names in modeller.automodel.assess, e.g. ('DOPE', 'GA341')
         self.assess_methods = assess_methods
         self.output_dir = output_dir
-        self._cancel = False
+        # Adaptive sampling options (AdaptiveSampler keyword arguments), or None for a fixed range
+        self.adaptive = adaptive
+        # Speed preset name (see build_presets.py)
+        self.preset = preset
+        self.job = None
+        self.timer = None
 
 
 
     def run(self):
-        log_text = ""
+        log_lines = []
         success = False
         successful_models = []
-        old_stdout = None
-        original_cwd = os.getcwd()
 
-        try:
-            self.message.emit("Initializing Modeller environment...")
-            env = Environ()
-
-            # Ensure outputs go to chosen folder
-            if self.output_dir:
-                os.makedirs(self.output_dir, exist_ok=True)
-                os.chdir(self.output_dir)
-            env.io.atom_files_directory = [self.output_dir or os.getcwd()]
-            self.message.emit(f"Models will be saved to: {self.output_dir or os.getcwd()}")
-
-            # Capture Modeller output
-            buffer = LogStream(self.log_line)
-            old_stdout = sys.stdout
-            sys.stdout = buffer
-            sys.stderr = buffer
+        features = self.job_features()
+        budget = None
+        if features:
+            budget = JobBudget('build', features)
+            self.timer = StageTimer('build', self.timing_features(features))
+
+        # The build runs in its own process and directory; this thread only relays its events
+        self.job = JobProcess('modeller_jobs.build_models', cwd=self.output_dir or os.getcwd(),
+                              alnfile=os.path.abspath(self.alnfile),
+                              knowns=list(self.knowns),
+                              sequence=self.sequence,
+                              start_model=self.start_model,
+                              end_model=self.end_model,
+                              assess_methods=list(self.assess_methods),
+                              atom_dirs=[os.path.dirname(os.path.abspath(self.alnfile))],
+                              adaptive=self.adaptive,
+                              preset=self.preset,
+                              budget=budget, timer=self.timer)
+
+        def relay(kind, payload):
+            if kind == 'log':
+                log_lines.append(payload)
+                self.log_line.emit(payload)
+            elif kind == 'models':
+                if self.timer:
+                    # Adaptive runs may stop early; the duration is recorded against the models built
+                    self.timer.actual['models'] = len(payload)
+                self.models_ready.emit(payload)
+            elif kind == 'progress':
+                self.progress.emit(payload[0])
+                self.eta.emit(payload[1])
+            else:
+                self.message.emit(payload)
 
+        try:
             self.message.emit("Starting model build...")
-            a = AutoModel(env,
-                          alnfile=self.alnfile,
-                          knowns=self.knowns,
-                          sequence=self.sequence,
-                          assess_methods=self.assess_methods)
-            a.starting_model = self.start_model
-            a.ending_model = self.end_model
-
-            self.message.emit(f"Building models {self.start_model} to {self.end_model}...")
-
-            if self._cancel:
-                raise RuntimeError("Build cancelled by user.")
-
-            a.make()
+            successful_models = self.job.run(relay) or []
             success = True
-            log_text = buffer.getvalue()
-
-            # Parse summary
-            summary_match = re.search(r'Summary of successfully produced models:[\s\S]+', log_text)
-            if summary_match:
-                successful_models = self.parse_summary(summary_match.group(0))
-
             self.message.emit(f"Produced {len(successful_models)} successful models.")
         except Exception as e:
-            import traceback
-            error_msg = f"Build failed: {e}\n{traceback.format_exc()}"
+            error_msg = f"Build failed: {e}"
             self.message.emit(error_msg)
-            log_text = error_msg
-        finally:
-            if old_stdout is not None:
-                sys.stdout = old_stdout
-            sys.stderr = sys.__stderr__
-            os.chdir(original_cwd)
+            log_lines.append(error_msg)
+        if budget:
+            self.message.emit(budget.report())
+        if self.timer and success:
+            self.message.emit(self.timer.report())
+
+        self.finished.emit("\n".join(log_lines), success, successful_models)
+
+    def job_features(self):
+        try:
+            return build_features(self.alnfile, self.knowns)
+        except (OSError, KeyError, ValueError) as e:
+            self.message.emit(f"Memory and time estimates unavailable: {e}")
+            return None
 
-        self.finished.emit(log_text, success, successful_models)
+    def timing_features(self, features):
+        return dict(features, models=self.end_model - self.start_model + 1, cores=available_cores(),
+                    effort=relative_cost(self.preset))
 
     def parse_summary(self, text):
         successful_models = []
@@ -142,19 +166,198 @@ class ModelBuildWorker(QThread):
         return successful_models
 
     def cancel(self):
-        self._cancel = True
-        self.message.emit("Cancel requested. (Note: may not stop an active model run.)")
+        if self.job:
+            self.job.cancel()
+        self.message.emit("Build cancelled: Modeller process terminated.")
+
+
+class RemoteBuildWorker(ModelBuildWorker):
+    """ModelBuildWorker whose build runs on a job service (see job_service.py)."""
+
+    def __init__(self, server_url, alnfile, knowns, sequence, start_model, end_model, assess_methods,
+                 output_dir=None, adaptive=None, preset=DEFAULT_PRESET):
+        super().__init__(alnfile, knowns, sequence, start_model, end_model, assess_methods,
+                         output_dir or os.getcwd(), adaptive, preset)
+        self.client = JobClient(server_url)
+        self.params = {'knowns': list(knowns), 'sequence': sequence,
+                       'start_model': start_model, 'end_model': end_model,
+                       'assess_methods': list(assess_methods), 'adaptive': adaptive, 'preset': preset}
+        self.job_id = None
+
+    def run(self):
+        log_lines = []
+        success = False
+        models = []
+
+        def relay(kind, payload):
+            if kind == 'log':
+                log_lines.append(payload)
+                self.log_line.emit(payload)
+            elif kind == 'models':
+                self.models_ready.emit(payload)
+            elif kind == 'progress':
+                # Estimated by the service from its own timing history
+                self.progress.emit(payload[0])
+                self.eta.emit(payload[1])
+            else:
+                self.message.emit(payload)
+
+        try:
+            self.job_id = self.client.submit_build(self.alnfile, self.params, [cache_path("templates")])
+            self.message.emit(f"Submitted job {self.job_id} to {self.client.base_url}")
+            data = self.client.follow(self.job_id, relay)
+            if data['status'] != 'done':
+                raise RuntimeError(data.get('error') or data['status'])
+            models = data['result'] or []
+            # Fetch models and violation profiles so the local views work unchanged
+            os.makedirs(self.output_dir, exist_ok=True)
+            wanted = {m['filename'] for m in models}
+            prefix = self.params['sequence'] + '.V'
+            for name in self.client.files(self.job_id):
+                if name in wanted or name.startswith(prefix):
+                    self.client.download(self.job_id, name, self.output_dir)
+            success = True
+            self.message.emit(f"Produced {len(models)} successful models.")
+        except Exception as e:
+            error_msg = f"Build failed: {e}"
+            self.message.emit(error_msg)
+            log_lines.append(error_msg)
+
+        self.finished.emit("\n".join(log_lines), success, models)
+
+    def cancel(self):
+        if self.job_id:
+            try:
+                self.client.cancel(self.job_id)
+                self.message.emit(f"Cancel sent for job {self.job_id}.")
+            except Exception as e:
+                self.message.emit(f"Cancel failed: {e}")
+
+
+class LoopRefineWorker(QThread):
+    message = pyqtSignal(str)
+    finished = pyqtSignal(list)
+
+    def __init__(self, parents, alnfile, knowns, sequence, output_dir, n_models):
+        super().__init__()
+        self.parents = parents
+        self.alnfile = alnfile
+        self.knowns = knowns
+        self.sequence = sequence
+        self.output_dir = output_dir
+        self.n_models = n_models
+
+    def run(self):
+        job = JobProcess('modeller_jobs.refine_loops', cwd=self.output_dir,
+                         parents=self.parents, alnfile=os.path.abspath(self.alnfile),
+                         knowns=list(self.knowns), sequence=self.sequence,
+                         output_dir=os.path.abspath(self.output_dir), n_models=self.n_models)
+        try:
+            results = job.run(lambda kind, payload: self.message.emit(payload))
+        except Exception as e:
+            self.message.emit(f"Loop refinement failed: {e}")
+            results = []
+        self.finished.emit(results)
+
+
+class AssessWorker(QThread):
+    message = pyqtSignal(str)
+    finished = pyqtSignal(list, str)
+
+    def __init__(self, directory, sequence, methods):
+        super().__init__()
+        self.directory = directory
+        self.sequence = sequence
+        self.methods = methods
+
+    def run(self):
+        job = JobProcess('modeller_jobs.assess_folder', cwd=self.directory,
+                         directory=os.path.abspath(self.directory), sequence=self.sequence,
+                         methods=list(self.methods))
+        try:
+            models = job.run(lambda kind, payload: self.message.emit(payload) if kind == 'message' else None)
+            self.finished.emit(models, '')
+        except Exception as e:
+            self.finished.emit([], str(e))
+
+
+class ArtifactWorker(QThread):
+    finished = pyqtSignal(str)
+
+    def __init__(self, manager, models, final=True):
+        super().__init__()
+        self.manager = manager
+        self.models = models
+        self.final = final
+
+    def run(self):
+        try:
+            if self.final:
+                stats = self.manager.apply(self.models)
+            else:
+                stats = self.manager.compress_finished(self.models)
+            self.finished.emit(format_stats(stats))
+        except Exception as e:
+            self.finished.emit(f"failed: {e}")
+
+
+class ViolationWorker(QThread):
+    finished = pyqtSignal(object)
+
+    def __init__(self, directory, sequence, exporter=None, run_id=None):
+        super().__init__()
+        self.directory = directory
+        self.sequence = sequence
+        self.exporter = exporter
+        self.run_id = run_id
+
+    def run(self):
+        try:
+            run = load_run(self.directory, self.sequence)
+            if run is not None and self.run_id:
+                self.exporter.add_residue_profiles(self.run_id, run)
+            self.finished.emit(summarize(run) if run is not None else None)
+        except Exception as e:
+            self.finished.emit({'error': str(e)})
+        finally:
+            if self.run_id:
+                self.exporter.finish_run(self.run_id)
+
+
+class ValidationWorker(QThread):
+    finished = pyqtSignal(dict, float)
+
+    def __init__(self, directory, filenames):
+        super().__init__()
+        self.directory = directory
+        self.filenames = filenames
+
+    def run(self):
+        started = time.perf_counter()
+        paths = [os.path.join(self.directory, name) for name in self.filenames]
+        results = validate_models(paths, processes=1)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        # Keyed by the table's filenames, which are relative to the output folder (loops/...)
+        self.finished.emit({name: results[path] for name, path in zip(self.filenames, paths)},
+                           elapsed_ms / max(len(paths), 1))
 
 
 class ModelBuild(QMainWindow):
-    def __init__(self):
+    def __init__(self, alnfile=None):
         super().__init__()
         self.setWindowTitle('Modeller GUI - Model Building')
         self.setMinimumSize(1000, 700)
         self.setWindowIcon(QIcon("D:/Shreya_VS_projects/Modeller_automation/Images/Screenshot 2025-11-09 171245.png"))
         self.worker = None
+        self.loop_worker = None
+        self.artifact_worker = None
+        self.exporter = None
+        self.export_run_id = None
+        self.models = []
         self.visualizers =[]
         self.initUI()
+        if alnfile and os.path.exists(alnfile):
+            self.load_alignment(alnfile)
 
     
     def initUI(self):
@@ -271,6 +474,12 @@ class ModelBuild(QMainWindow):
         row2.addWidget(btn_out)
         left_layout.addLayout(row2)
 
+        # Job service (blank runs on this machine)
+        left_layout.addWidget(field_label("Job Server (optional)"))
+        self.server_edit = styled_input()
+        self.server_edit.setPlaceholderText(f"e.g. http://localhost:{DEFAULT_PORT}")
+        left_layout.addWidget(self.server_edit)
+
         # Model range
         left_layout.addWidget(field_label("Model Range"))
         range_row = QHBoxLayout()
@@ -293,6 +502,16 @@ class ModelBuild(QMainWindow):
         range_row.addWidget(self.end_spin)
         left_layout.addLayout(range_row)
 
+        # Speed preset: optimization schedule and MD refinement
+        left_layout.addWidget(field_label("Speed Preset"))
+        self.preset_combo = QComboBox()
+        self.preset_combo.setFont(QFont("Segoe UI", 12))
+        for name, settings in PRESETS.items():
+            self.preset_combo.addItem(name.capitalize(), name)
+            self.preset_combo.setItemData(self.preset_combo.count() - 1, settings['description'], Qt.ToolTipRole)
+        self.preset_combo.setCurrentIndex(list(PRESETS).index(DEFAULT_PRESET))
+        left_layout.addWidget(self.preset_combo)
+
         # Assess methods
         left_layout.addWidget(field_label("Assessment Methods"))
         chk_row = QHBoxLayout()
@@ -302,10 +521,53 @@ class ModelBuild(QMainWindow):
         self.chk_ga341 = QCheckBox("GA341")
         self.chk_ga341.setFont(QFont('Concolas', 12))
         self.chk_ga341.setChecked(True)
+        self.chk_dopehr = QCheckBox("DOPE-HR")
+        self.chk_dopehr.setFont(QFont('Concolas', 12))
+        self.chk_zdope = QCheckBox("z-DOPE")
+        self.chk_zdope.setFont(QFont('Concolas', 12))
         chk_row.addWidget(self.chk_dope)
         chk_row.addWidget(self.chk_ga341)
+        chk_row.addWidget(self.chk_dopehr)
+        chk_row.addWidget(self.chk_zdope)
         left_layout.addLayout(chk_row)
 
+        # Adaptive sampling
+        self.chk_adaptive = QCheckBox("Adaptive sampling (stop on plateau)")
+        self.chk_adaptive.setFont(QFont('Concolas', 12))
+        self.chk_adaptive.setToolTip("Build in waves up to the 'To' model and stop once the best "
+                                     "DOPE (or molpdf) stops improving")
+        left_layout.addWidget(self.chk_adaptive)
+        adaptive_row = QHBoxLayout()
+        self.wave_spin = QSpinBox()
+        self.wave_spin.setRange(1, 100)
+        self.wave_spin.setValue(4)
+        self.patience_spin = QSpinBox()
+        self.patience_spin.setRange(1, 20)
+        self.patience_spin.setValue(2)
+        self.budget_spin = QSpinBox()
+        self.budget_spin.setRange(0, 100000)
+        self.budget_spin.setSuffix(" min")
+        self.budget_spin.setSpecialValueText("no limit")
+        for label, w in (("Wave", self.wave_spin), ("Patience", self.patience_spin), ("Budget", self.budget_spin)):
+            lbl = QLabel(label)
+            lbl.setFont(QFont('Concolas', 10))
+            adaptive_row.addWidget(lbl)
+            adaptive_row.addWidget(w)
+        left_layout.addLayout(adaptive_row)
+
+        # Artifact retention
+        retention_row = QHBoxLayout()
+        self.chk_compress = QCheckBox("Compress outputs, keep best")
+        self.chk_compress.setFont(QFont('Concolas', 12))
+        self.chk_compress.setToolTip("Compress traces, violation profiles, restraints and all but the "
+                                     "best models as they finish; analysis reads them transparently")
+        self.keep_spin = QSpinBox()
+        self.keep_spin.setRange(1, 1000)
+        self.keep_spin.setValue(5)
+        retention_row.addWidget(self.chk_compress)
+        retention_row.addWidget(self.keep_spin)
+        left_layout.addLayout(retention_row)
+
         # Action Buttons
         def action_button(text, color):
             btn = QPushButton(text)
@@ -336,6 +598,31 @@ class ModelBuild(QMainWindow):
         self.btn_cancel.setEnabled(False)
         left_layout.addWidget(self.btn_cancel)
 
+        # Loop refinement of the best models
+        loop_row = QHBoxLayout()
+        self.loop_top_spin = QSpinBox()
+        self.loop_top_spin.setRange(1, 50)
+        self.loop_top_spin.setValue(3)
+        self.loop_models_spin = QSpinBox()
+        self.loop_models_spin.setRange(1, 100)
+        self.loop_models_spin.setValue(5)
+        for label, w in (("Best", self.loop_top_spin), ("Loop models", self.loop_models_spin)):
+            lbl = QLabel(label)
+            lbl.setFont(QFont('Concolas', 10))
+            loop_row.addWidget(lbl)
+            loop_row.addWidget(w)
+        left_layout.addLayout(loop_row)
+        self.btn_loops = action_button("Refine Loops", "#6b705c")
+        self.btn_loops.clicked.connect(self.refine_loops)
+        left_layout.addWidget(self.btn_loops)
+
+        # Re-score existing models with the checked assessment methods
+        self.btn_assess = action_button("Re-assess Models", "#5e548e")
+        self.btn_assess.setToolTip("Score every model in the output folder with the checked methods; "
+                                   "models are not rebuilt and known scores come from the cache")
+        self.btn_assess.clicked.connect(self.reassess_models)
+        left_layout.addWidget(self.btn_assess)
+
         left_layout.addStretch()
         splitter.addWidget(left_widget)
 
@@ -401,8 +688,36 @@ class ModelBuild(QMainWindow):
         """)
         models_layout.addWidget(self.table)
 
+        self.hotspot_label = QLabel("Restraint Violation Hotspots")
+        self.hotspot_label.setFont(QFont("Segoe UI", 11, QFont.Medium))
+        self.hotspot_label.setStyleSheet("color:#4a4e69;")
+        models_layout.addWidget(self.hotspot_label)
+        self.hotspot_table = QTableWidget(0, 5)
+        self.hotspot_table.setHorizontalHeaderLabels(["Region", "Residues", "Mean Violation", "Max Violation", "Dominant Restraint"])
+        self.hotspot_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.hotspot_table.setMaximumHeight(180)
+        models_layout.addWidget(self.hotspot_table)
+        self.violation_worker = None
+
         self.tabs.addTab(models_tab, "Models")
 
+        # Convergence Tab
+        convergence_tab = QWidget()
+        convergence_layout = QVBoxLayout(convergence_tab)
+        self.traj_table = QTableWidget(0, 6)
+        self.traj_table.setHorizontalHeaderLabels(["Model", "Status", "Stage", "Energy", "Gradient / T", "Energy Curve"])
+        self.traj_table.setFont(QFont("Consolas", 10))
+        self.traj_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.traj_table.horizontalHeader().setStretchLastSection(True)
+        convergence_layout.addWidget(self.traj_table)
+        self.tabs.addTab(convergence_tab, "Convergence")
+
+        # Polls the Modeller .D traces while a build runs
+        self.monitor = None
+        self.monitor_timer = QTimer(self)
+        self.monitor_timer.setInterval(1000)
+        self.monitor_timer.timeout.connect(self.update_trajectories)
+
         splitter.addWidget(right_widget)
         splitter.setSizes([350, 900])
 
@@ -411,22 +726,8 @@ class ModelBuild(QMainWindow):
 
     def parse_ali_file(self, ali_path):
         """Parse .ali/.pir file to extract template and target align codes."""
-        templates, target = [], None
-        with open(ali_path, 'r') as f:
-            lines = f.readlines()
-
-        current = None
-        for line in lines:
-            line = line.strip()
-            if line.startswith('>P1;'):
-                current = line.split(';')[1].strip()
-            elif current and line.lower().startswith('structurex'):
-                templates.append(current)
-                current = None
-            elif current and line.lower().startswith('sequence:'):
-                target = current
-                current = None
-        return templates, target
+        index = PirIndex(ali_path)
+        return index.templates(), index.target()
 
 
     # --- Slots ---
@@ -435,20 +736,24 @@ class ModelBuild(QMainWindow):
             self, "Select Alignment File", "", "Alignment Files (*.ali *.pir);;All Files (*)"
         )
         if path:
-            self.aln_edit.setText(path)
-            try:
-                templates, target = self.parse_ali_file(path)
-                if templates:
-                    self.knowns_edit.setText(",".join(templates))
-                if target:
-                    self.seq_edit.setText(target)
+            self.load_alignment(path, notify=True)
+
+    def load_alignment(self, path, notify=False):
+        self.aln_edit.setText(path)
+        try:
+            templates, target = self.parse_ali_file(path)
+            if templates:
+                self.knowns_edit.setText(",".join(templates))
+            if target:
+                self.seq_edit.setText(target)
+            if notify:
                 QMessageBox.information(
                     self,
                     "Alignment Parsed",
                     f"Detected Templates: {', '.join(templates)}\nTarget: {target}"
                 )
-            except Exception as e:
-                QMessageBox.warning(self, "Parsing Error", f"Failed to parse alignment file:\n{e}")
+        except Exception as e:
+            QMessageBox.warning(self, "Parsing Error", f"Failed to parse alignment file:\n{e}")
 
 
     def browse_output(self):
@@ -470,23 +775,70 @@ class ModelBuild(QMainWindow):
         outdir = self.output_edit.text().strip() or None
 
         assess_methods = []
-        if self.chk_dope.isChecked(): assess_methods.append(assess.DOPE)
-        if self.chk_ga341.isChecked(): assess_methods.append(assess.GA341)
-        if not assess_methods: assess_methods = (assess.GA341,)
+        if self.chk_dope.isChecked(): assess_methods.append('DOPE')
+        if self.chk_ga341.isChecked(): assess_methods.append('GA341')
+        if self.chk_dopehr.isChecked(): assess_methods.append('DOPEHR')
+        if self.chk_zdope.isChecked(): assess_methods.append('normalized_dope')
+        if not assess_methods: assess_methods = ('GA341',)
 
         self.console.clear()
-        self.progress.setRange(0, 0)
+        self.progress.setRange(0, 100)
+        self.progress.setValue(0)
+        self.progress.setFormat("%p%")
+        self.traj_table.setRowCount(0)
+        server_url = self.server_edit.text().strip()
+        # Remote builds write their traces on the server, so there is nothing to monitor locally
+        self.monitor = None
+        if not server_url:
+            self.monitor = TrajectoryMonitor(outdir or os.getcwd(), sequence,
+                                             self.start_spin.value(), self.end_spin.value())
+            self.monitor_timer.start()
         self.status_label.setText("Running Modeller...")
         self.btn_build.setEnabled(False)
         self.btn_cancel.setEnabled(True)
 
-        self.worker = ModelBuildWorker(alnfile, knowns, sequence,
-                                       self.start_spin.value(),
-                                       self.end_spin.value(),
-                                       tuple(assess_methods),
-                                       outdir)
+        adaptive = None
+        if self.chk_adaptive.isChecked():
+            adaptive = {
+                'wave_size': self.wave_spin.value(),
+                'patience': self.patience_spin.value(),
+                'max_seconds': self.budget_spin.value() * 60 or None,
+                'score_key': 'dope' if self.chk_dope.isChecked() else 'molpdf',
+            }
+
+        preset = self.preset_combo.currentData()
+
+        # Results are appended to the columnar export as models finish
+        try:
+            self.exporter = RunExporter()
+            self.export_run_id = self.exporter.start_run(
+                sequence, outdir or os.getcwd(), alnfile, knowns,
+                {'start_model': self.start_spin.value(), 'end_model': self.end_spin.value(),
+                 'assess_methods': list(assess_methods), 'adaptive': adaptive, 'preset': preset,
+                 'server': server_url or None})
+        except (OSError, RuntimeError) as e:
+            self.exporter = self.export_run_id = None
+            self.console.append(f"Result export disabled: {e}")
+
+        worker_class = ModelBuildWorker
+        args = ()
+        if server_url:
+            worker_class = RemoteBuildWorker
+            args = (server_url,)
+        self.worker = worker_class(*args, alnfile, knowns, sequence,
+                                   self.start_spin.value(),
+                                   self.end_spin.value(),
+                                   tuple(assess_methods),
+                                   outdir,
+                                   adaptive,
+                                   preset)
         self.worker.message.connect(self.console.append)
+        self.worker.progress.connect(self.progress.setValue)
+        self.worker.eta.connect(self.update_eta)
         self.worker.log_line.connect(self.on_log_line)
+        self.worker.models_ready.connect(self.populate_table)
+        self.worker.models_ready.connect(self.compress_finished_models)
+        self.worker.models_ready.connect(self.export_models)
         self.worker.finished.connect(self.on_finished)
         self.worker.start()
 
@@ -498,8 +850,8 @@ class ModelBuild(QMainWindow):
 
     def on_log_line(self, line):
         self.console.append(line)
-        # Detect live summary
-        if "Summary of successfully produced models:" in line:
+        # Detect live summary (adaptive runs report cumulative results via models_ready)
+        if "Summary of successfully produced models:" in line and not self.worker.adaptive:
             text = self.console.toPlainText()
             match = re.search(r"Summary of successfully produced models:[\s\S]+", text)
             if match:
@@ -515,41 +867,255 @@ class ModelBuild(QMainWindow):
 
     def populate_table(self, models):
         if not models: return
-        headers = ["Filename", "MolPDF", "DOPE", "GA341","Visualize"]
+        self.models = list(models)
+        # Optional columns only appear when some model carries the value
+        columns = [(header, key) for header, key, optional in MODEL_COLUMNS
+                   if not optional or any(m.get(key) is not None for m in models)]
+        headers = [header for header, _ in columns] + ["Visualize"]
         self.table.setColumnCount(len(headers))
         self.table.setHorizontalHeaderLabels(headers)
         self.table.setRowCount(len(models))
 
         best_dope = min((m.get('dope', float('inf')) for m in models if m.get('dope') is not None), default=None)
         for r, m in enumerate(models):
-            self.table.setItem(r, 0, QTableWidgetItem(str(m.get('filename', ''))))
-            self.table.setItem(r, 1, QTableWidgetItem(f"{m.get('molpdf', 0):.2f}"))
-            dope_val = m.get('dope')
-            dope_item = QTableWidgetItem(f"{dope_val:.2f}" if dope_val else "")
-            if dope_val == best_dope:
-                dope_item.setBackground(QColor(144, 238, 144))
-            self.table.setItem(r, 2, dope_item)
-            self.table.setItem(r, 3, QTableWidgetItem(f"{m.get('ga341', 0):.2f}"))
+            for c, (header, key) in enumerate(columns):
+                value = m.get(key)
+                item = QTableWidgetItem(f"{value:.2f}" if isinstance(value, float) else str(value if value is not None else ''))
+                if key == 'dope' and value is not None and value == best_dope:
+                    item.setBackground(QColor(144, 238, 144))
+                self.table.setItem(r, c, item)
 
             visualize_btn = QPushButton("Visualize")
             visualize_btn.setStyleSheet('background-color : lightgreen; color : white; font-weight: bold')
 
             visualize_btn.clicked.connect(lambda _, model=m: self.open_visualizer(model))
-            self.table.setCellWidget(r, 4, visualize_btn)
+            self.table.setCellWidget(r, len(columns), visualize_btn)
             
 
         self.table.resizeColumnsToContents()
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.tabs.setCurrentIndex(1)
 
+    def refine_loops(self):
+        if not self.models:
+            QMessageBox.warning(self, "No Models", "Build models first; loops are refined on the best of them.")
+            return
+        alnfile = self.aln_edit.text().strip()
+        sequence = self.seq_edit.text().strip()
+        knowns = tuple(k.strip() for k in self.knowns_edit.text().split(',') if k.strip())
+        if not alnfile or not sequence:
+            QMessageBox.warning(self, "Missing Input", "Alignment file and target sequence are required.")
+            return
+
+        # Rank parents by DOPE when available, otherwise by molpdf
+        key = 'dope' if any(m.get('dope') is not None for m in self.models) else 'molpdf'
+        parents = [m for m in self.models if not m.get('parent') and isinstance(m.get(key), float)]
+        parents = sorted(parents, key=lambda m: m[key])[:self.loop_top_spin.value()]
+        if not parents:
+            QMessageBox.warning(self, "No Models", "No scored models available for loop refinement.")
+            return
+
+        self.btn_loops.setEnabled(False)
+        self.status_label.setText("Refining loops...")
+        self.loop_worker = LoopRefineWorker([m['filename'] for m in parents], alnfile, knowns, sequence,
+                                            self.output_edit.text().strip() or os.getcwd(),
+                                            self.loop_models_spin.value())
+        self.loop_worker.message.connect(self.console.append)
+        self.loop_worker.finished.connect(self.on_loops_finished)
+        self.loop_worker.start()
+
+    def on_loops_finished(self, results):
+        loop_models = [m for result in results for m in result['models']]
+        self.btn_loops.setEnabled(True)
+        self.status_label.setText(f"Loop refinement produced {len(loop_models)} models")
+        if loop_models:
+            # Register loop models directly after their parents
+            merged = []
+            for m in self.models:
+                merged.append(m)
+                merged.extend(lm for lm in loop_models if lm['parent'] == m.get('filename'))
+            self.populate_table(merged)
+            self.validate_structures()
+
+    def reassess_models(self):
+        methods = [key for key, chk in (('dope', self.chk_dope), ('dopehr', self.chk_dopehr),
+                                        ('normalized_dope', self.chk_zdope), ('ga341', self.chk_ga341))
+                   if chk.isChecked()]
+        if not methods:
+            QMessageBox.warning(self, "No Methods", "Check at least one assessment method.")
+            return
+        directory = self.output_edit.text().strip() or os.getcwd()
+        self.btn_assess.setEnabled(False)
+        self.status_label.setText("Assessing models...")
+        self.assess_worker = AssessWorker(directory, self.seq_edit.text().strip(), methods)
+        self.assess_worker.message.connect(self.console.append)
+        self.assess_worker.finished.connect(self.on_assessed)
+        self.assess_worker.start()
+
+    def on_assessed(self, models, error):
+        self.btn_assess.setEnabled(True)
+        if error:
+            self.status_label.setText("Assessment failed")
+            self.console.append(f"Assessment failed: {error.splitlines()[0]}")
+            return
+        self.status_label.setText(f"Assessed {len(models)} models")
+        self.populate_table(models)
+        self.validate_structures()
+        directory = self.assess_worker.directory
+        sequence = self.assess_worker.sequence
+        # New scores go into the run's score table and the exported results
+        if sequence:
+            write_summary(directory, sequence, models)
+        try:
+            exporter = RunExporter()
+            run_id = exporter.start_run(sequence or '*', directory,
+                                        params={'assessment': self.assess_worker.methods})
+            exporter.add_models(run_id, models)
+            exporter.finish_run(run_id, status='reassessed')
+        except (OSError, RuntimeError) as e:
+            self.console.append(f"Result export failed: {e}")
+
+    def update_trajectories(self):
+        if not self.monitor:
+            return
+        self.monitor.poll()
+        # Measured progress sharpens the timing estimate behind the progress bar
+        if self.worker and self.worker.timer:
+            self.worker.timer.observe(self.monitor.progress())
+        else:
+            self.progress.setValue(int(self.monitor.progress() * 100))
+
+        rows = self.monitor.summary()
+        self.traj_table.setRowCount(len(rows))
+        flagged = []
+        for r, (model, status, latest, energies) in enumerate(rows):
+            stage, step, energy, gradient = latest or ('', 0, float('nan'), float('nan'))
+            values = [str(model), status, f"{stage} #{step}" if latest else '',
+                      f"{energy:.2f}", f"{gradient:.4g}", sparkline(energies)]
+            for c, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if status in ('diverging', 'stalled'):
+                    item.setBackground(QColor(255, 205, 210))
+                self.traj_table.setItem(r, c, item)
+            if status in ('diverging', 'stalled'):
+                flagged.append(f"{model} ({status})")
+        if flagged:
+            self.status_label.setText("Running Modeller... check models: " + ", ".join(flagged))
+
+    def update_eta(self, seconds):
+        self.progress.setFormat(f"%p% ({format_eta(seconds)})")
+
     def on_finished(self, log_text, success, models):
-        self.progress.setRange(0, 100)
+        self.monitor_timer.stop()
+        try:
+            register_run(self.output_edit.text().strip() or os.getcwd(), self.seq_edit.text().strip(),
+                         log_text, models)
+        except OSError as e:
+            self.console.append(f"Could not save run summary: {e}")
+        self.update_trajectories()
         self.progress.setValue(100 if success else 0)
+        self.progress.setFormat("%p%")
         if models:
             self.populate_table(models)
         self.status_label.setText("Completed" if success else "Failed")
         self.btn_build.setEnabled(True)
         self.btn_cancel.setEnabled(False)
+        self.export_models(models)
+        if not success and self.export_run_id:
+            self.exporter.finish_run(self.export_run_id, status='failed')
+            self.export_run_id = None
+        if success and self.chk_compress.isChecked():
+            # Violations are analysed once compression is done so files do not move underneath
+            self.start_artifact_worker(models, final=True)
+        elif success:
+            self.analyze_violations()
+
+    def export_models(self, models):
+        if not self.export_run_id:
+            return
+        try:
+            self.exporter.add_models(self.export_run_id, models)
+        except (OSError, RuntimeError) as e:
+            self.console.append(f"Result export failed: {e}")
+
+    def artifact_manager(self):
+        policy = RetentionPolicy(keep_top=self.keep_spin.value(),
+                                 score_key='dope' if self.chk_dope.isChecked() else 'molpdf')
+        return ArtifactManager(self.output_edit.text().strip() or os.getcwd(),
+                               self.seq_edit.text().strip(), policy)
+
+    def start_artifact_worker(self, models, final):
+        if self.artifact_worker and self.artifact_worker.isRunning():
+            if not final:
+                return
+            self.artifact_worker.wait()
+        self.artifact_worker = ArtifactWorker(self.artifact_manager(), list(models), final)
+        self.artifact_worker.finished.connect(lambda text, final=final: self.on_artifacts_done(text, final))
+        self.artifact_worker.start()
+
+    def compress_finished_models(self, models):
+        # Remote builds write on the server; only local outputs are compressed mid-run
+        if self.chk_compress.isChecked() and not isinstance(self.worker, RemoteBuildWorker):
+            self.start_artifact_worker(models, final=False)
+
+    def on_artifacts_done(self, text, final):
+        self.console.append(f"Artifacts: {text}")
+        if final:
+            self.analyze_violations()
+
+    def analyze_violations(self):
+        directory = self.output_edit.text().strip() or os.getcwd()
+        sequence = self.seq_edit.text().strip()
+        if not sequence:
+            return
+        self.hotspot_label.setText("Restraint Violation Hotspots (analysing...)")
+        # The worker adds the per-residue profiles and closes the exported run
+        self.violation_worker = ViolationWorker(directory, sequence, self.exporter, self.export_run_id)
+        self.export_run_id = None
+        self.violation_worker.finished.connect(self.show_hotspots)
+        self.violation_worker.start()
+        self.validate_structures()
+
+    def validate_structures(self):
+        names = [m['filename'] for m in self.models if m.get('filename')]
+        if not names:
+            return
+        self.validation_worker = ValidationWorker(self.output_edit.text().strip() or os.getcwd(), names)
+        self.validation_worker.finished.connect(self.on_validated)
+        self.validation_worker.start()
+
+    def on_validated(self, results, ms_per_model):
+        failed = [name for name, r in results.items() if 'error' in r]
+        for model in self.models:
+            result = results.get(model.get('filename'))
+            if result and 'error' not in result:
+                model['clashes'] = result['clashes']
+                model['rama_outliers'] = result['rama_outliers']
+        checked = len(results) - len(failed)
+        self.console.append(f"Validated {checked} models ({ms_per_model:.0f} ms per model): "
+                            f"{sum(r.get('clashes', 0) for r in results.values())} clashes, "
+                            f"{sum(r.get('rama_outliers', 0) for r in results.values())} Ramachandran outliers")
+        if failed:
+            self.console.append(f"Validation failed for: {', '.join(failed)}")
+        self.populate_table(self.models)
+
+    def show_hotspots(self, summary):
+        if not summary:
+            self.hotspot_label.setText("Restraint Violation Hotspots (no .V files found)")
+            return
+        if 'error' in summary:
+            self.hotspot_label.setText(f"Restraint Violation Hotspots (failed: {summary['error']})")
+            return
+        hotspots = summary['hotspots']
+        self.hotspot_label.setText(f"Restraint Violation Hotspots ({summary['n_models']} models, "
+                                   f"{len(hotspots)} regions)")
+        self.hotspot_table.setRowCount(len(hotspots))
+        for r, h in enumerate(hotspots):
+            region = f"{h['start']}" if h['start'] == h['end'] else f"{h['start']}-{h['end']}"
+            values = [region, h['residues'], f"{h['mean_violation']:.1f}",
+                      f"{h['max_violation']:.1f}", h['dominant_type']]
+            for c, value in enumerate(values):
+                self.hotspot_table.setItem(r, c, QTableWidgetItem(value))
 
     def open_visualizer(self, model):
         from visualize import Visualizer
@@ -0,0 +1,183 @@
+import os
+import shutil
+
+from modeller import Environ, Alignment
+from modeller.automodel import AutoModel, assess, autosched, generate, refine
+
+from template_cache import TemplateCache
+from progressive_align import progressive_align
+from adaptive import AdaptiveSampler
+from loop_refine import refine_models
+from assessment import assess_directory
+from build_presets import DEFAULT_PRESET, preset_settings
+from artifacts import RUN_SUFFIXES
+
+
+# Job functions run inside JobProcess children (see job_runner.py): the
+# working directory is already the job's own folder, stdout is piped back to
+# the parent, and `emit(kind, payload)` sends 'message' / 'models' events.
+
+
+def models_from_outputs(outputs):
+    """Convert AutoModel.outputs into the model dicts shown in the Models table."""
+    models = []
+    for out in outputs:
+        if out.get('failure') is not None:
+            continue
+        model = {'filename': out.get('name'), 'molpdf': out.get('molpdf')}
+        if out.get('DOPE score') is not None:
+            model['dope'] = out['DOPE score']
+        if out.get('DOPE-HR score') is not None:
+            model['dopehr'] = out['DOPE-HR score']
+        if out.get('Normalized DOPE score') is not None:
+            model['normalized_dope'] = out['Normalized DOPE score']
+        ga341 = out.get('GA341 score')
+        if ga341:
+            model['ga341'] = ga341[0]
+        models.append(model)
+    return models
+
+
+def apply_preset(automodel, preset):
+    """Set the optimization schedule and MD refinement of a build preset (see build_presets.py)."""
+    settings = preset_settings(preset)
+    automodel.library_schedule = getattr(autosched, settings['library_schedule'])
+    automodel.max_var_iterations = settings['max_var_iterations']
+    automodel.md_level = getattr(refine, settings['md_level']) if settings['md_level'] else None
+    automodel.repeat_optimization = settings['repeat_optimization']
+
+
+class ExistingRestraintsModel(AutoModel):
+    """AutoModel that can skip restraint generation.
+
+    With `reuse_restraints` set, make() reads the initial model and the
+    restraints (<sequence>.ini / .rsr) already in the working directory
+    instead of deriving them from the templates again.
+    """
+
+    reuse_restraints = False
+
+    def homcsr(self, exit_stage):
+        if not self.reuse_restraints or exit_stage:
+            return AutoModel.homcsr(self, exit_stage)
+        aln = self.read_alignment()
+        self.create_topology(aln)
+        generate.read_xyz(self, aln)
+
+
+def _build_env(atom_dirs, rand_seed=None):
+    env = Environ(rand_seed=rand_seed) if rand_seed else Environ()
+    # Alignments reference the chain-restricted template files in the template cache
+    env.io.atom_files_directory = [os.getcwd()] + list(atom_dirs) + [TemplateCache().root]
+    return env
+
+
+def build_restraints(alnfile, knowns, sequence, atom_dirs=(), emit=None):
+    """Only derive the restraints and initial model (<sequence>.rsr / .ini) in the current directory."""
+    env = _build_env(atom_dirs)
+    a = AutoModel(env, alnfile=alnfile, knowns=tuple(knowns), sequence=sequence)
+    a.make(exit_stage=1)
+    emit('message', f"Restraints written to {os.path.join(os.getcwd(), sequence + '.rsr')}")
+    return None
+
+
+def build_models(alnfile, knowns, sequence, start_model, end_model, assess_methods=('GA341',),
+                 atom_dirs=(), adaptive=None, rand_seed=None, preset=DEFAULT_PRESET, restraints_dir=None,
+                 emit=None):
+    """AutoModel run in the current directory; `adaptive` holds AdaptiveSampler options.
+
+    Builds of single model indices in separate processes need their own
+    `rand_seed` (-2 to -50000), otherwise every process repeats the same model.
+    `preset` selects a speed preset: 'draft', 'standard' or 'thorough'.
+    `restraints_dir` holds the output of build_restraints for this alignment,
+    which is used instead of deriving the restraints again.
+    """
+    preset_settings(preset)  # unknown presets fail before Modeller starts
+    env = _build_env(atom_dirs, rand_seed)
+    if restraints_dir:
+        for suffix in RUN_SUFFIXES:
+            path = os.path.join(restraints_dir, sequence + suffix)
+            if os.path.exists(path):
+                shutil.copy(path, os.getcwd())
+    methods = tuple(getattr(assess, name) for name in assess_methods)
+    emit('message', f"Models will be saved to: {os.getcwd()}")
+    emit('message', f"Build preset: {preset or DEFAULT_PRESET}")
+
+    def make(first, last, reuse_restraints=False):
+        a = ExistingRestraintsModel(env, alnfile=alnfile, knowns=tuple(knowns), sequence=sequence,
+                                    assess_methods=methods)
+        apply_preset(a, preset)
+        a.reuse_restraints = reuse_restraints
+        a.starting_model, a.ending_model = first, last
+        a.make()
+        return models_from_outputs(a.outputs)
+
+    if not adaptive:
+        emit('message', f"Building models {start_model} to {end_model}...")
+        return make(start_model, end_model, reuse_restraints=bool(restraints_dir))
+
+    # Build in waves until the best score plateaus or the budget runs out
+    sampler = AdaptiveSampler(start_model=start_model, max_models=end_model - start_model + 1, **adaptive)
+    models = []
+    while True:
+        wave = sampler.next_wave()
+        if wave is None:
+            break
+        emit('message', f"Adaptive wave: building models {wave[0]} to {wave[1]}...")
+        # The first wave writes the restraints; later waves only optimize new models from them
+        wave_models = make(*wave, reuse_restraints=bool(restraints_dir) or wave[0] > start_model)
+        models.extend(wave_models)
+        emit('models', list(models))
+        sampler.record(wave_models)
+        emit('message', sampler.report())
+    emit('message', f"Adaptive sampling stopped: {sampler.stop_reason}")
+    return models
+
+
+def _prepare_templates(env, templates, emit):
+    cache = TemplateCache()
+    entries = []
+    for code, chain, pdbfile in templates:
+        align_code = f"{code}{chain}"
+        entry, cached = cache.prepare(env, pdbfile, chain, align_code)
+        entries.append((entry, align_code))
+        emit('message', f"Template added: {code} chain {chain}" + (" (cached)" if cached else ""))
+    return cache, entries
+
+
+def align2d(target_file, target_format, templates, max_gap_length, emit=None):
+    """align2d of the target against all templates; writes Alignment.ali/.pap to the current directory."""
+    env = Environ()
+    env.io.atom_files_directory = [TemplateCache().root, '.']
+    cache, entries = _prepare_templates(env, templates, emit)
+    templates_ali = cache.write_entries(entries, os.path.abspath('Templates.ali'))
+    aln = Alignment(env)
+    aln.append(file=templates_ali, align_codes='all')
+    aln.append(file=target_file, alignment_format=target_format)
+    aln.align2d(max_gap_length=max_gap_length)
+    aln.write(file='Alignment.ali', alignment_format='PIR')
+    aln.write(file='Alignment.pap', alignment_format='PAP')
+    return None
+
+
+def progressive(target_file, target_format, templates, max_gap_length, emit=None):
+    """Progressive salign of the templates followed by the target (see progressive_align)."""
+    env = Environ()
+    env.io.atom_files_directory = [TemplateCache().root, '.']
+    cache, entries = _prepare_templates(env, templates, emit)
+    template_files = [(code, cache.write_entries([(entry, code)], os.path.abspath(f"{code}.ali")))
+                      for entry, code in entries]
+    pdb_dirs = sorted({os.path.dirname(os.path.abspath(pdbfile)) for _, _, pdbfile in templates})
+    return progressive_align(template_files, target_file, target_format, os.getcwd(),
+                             [cache.root] + pdb_dirs, max_gap_length=max_gap_length,
+                             log=lambda text: emit('message', text))
+
+
+def refine_loops(parents, alnfile, knowns, sequence, output_dir, n_models=5, emit=None):
+    return refine_models(parents, alnfile, knowns, sequence, output_dir,
+                         atom_dirs=[TemplateCache().root], n_models=n_models,
+                         log=lambda text: emit('message', text))
+
+
+def assess_folder(directory, sequence, methods, emit=None):
+    return assess_directory(directory, sequence or None, methods, log=lambda text: emit('message', text))
@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from cache_utils import cache_path
+
+
+DOWNLOAD_URL = "https://files.rcsb.org/download/{}.pdb"
+CHUNK_SIZE = 64 * 1024
+
+
+class Cancelled(Exception):
+    """Raised when a download is abandoned because the entry is no longer wanted."""
+
+
+def new_session():
+    """Session with retries/backoff for RCSB downloads."""
+    session = requests.Session()
+    retries = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
+    session.mount("https://", HTTPAdapter(max_retries=retries))
+    return session
+
+
+class PdbStore:
+    """Local store of downloaded PDB entries, shared by the BLAST, alignment and build windows.
+
+    Files are downloaded once into the cache (`<root>/<ID>.pdb`) and copied
+    into whatever folder a step works in, so a template prefetched while the
+    user was reading BLAST results costs nothing when it is needed.
+    """
+
+    def __init__(self, root=None, session=None):
+        self.root = root or cache_path("pdb")
+        self.session = session
+
+    def path(self, pdb_id):
+        return os.path.join(self.root, f"{pdb_id.upper()}.pdb")
+
+    def __contains__(self, pdb_id):
+        return os.path.exists(self.path(pdb_id))
+
+    def fetch(self, pdb_id, timeout=30, cancelled=None):
+        """Download an entry unless it is stored already; returns its path in the store.
+
+        `cancelled` is polled between chunks; when it returns True the partial
+        file is removed and Cancelled is raised.
+        """
+        path = self.path(pdb_id)
+        if os.path.exists(path):
+            return path
+        if self.session is None:
+            self.session = new_session()
+        # Unique per call: the BLAST prefetcher, the alignment window and daemon
+        # threads may all fetch the same entry at once
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=f"{pdb_id.upper()}.", suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as fh, \
+                    self.session.get(DOWNLOAD_URL.format(pdb_id.upper()), timeout=timeout, stream=True) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    if cancelled is not None and cancelled():
+                        raise Cancelled(pdb_id)
+                    if chunk:
+                        fh.write(chunk)
+            try:
+                os.replace(tmp, path)
+            except OSError:
+                # Another fetch of the same entry finished first
+                if not os.path.exists(path):
+                    raise
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return path
+
+    def copy_to(self, pdb_id, folder, timeout=30):
+        """Place `<ID>.pdb` in folder, from the store when possible; returns the path there."""
+        target = os.path.join(folder, f"{pdb_id}.pdb")
+        if os.path.exists(target):
+            return target
+        source = self.fetch(pdb_id, timeout=timeout)
+        # Copy under a unique name and rename, so concurrent copies never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=folder or '.', prefix=f"{pdb_id}.", suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as dst, open(source, 'rb') as src:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp, target)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return target
@@ -0,0 +1,136 @@
+import os
+import mmap
+
+from cache_utils import read_json, write_json
+
+
+class PirIndex:
+    """Offset index over the `>P1;` entries of a PIR/ALI file.
+
+    The file is scanned once through mmap; entry offsets are cached beside
+    the file as `<file>.idx.json` and reused while size and mtime match.
+    Sequences are only decoded when asked for.
+    """
+
+    INDEX_SUFFIX = ".idx.json"
+    INDEX_VERSION = 1
+
+    def __init__(self, path):
+        self.path = path
+        st = os.stat(path)
+        self.size = st.st_size
+        self.mtime = st.st_mtime_ns
+        self._sequences = {}
+        self.entries = self._load_index()
+        if self.entries is None:
+            self.entries = self._build_index()
+            self._save_index()
+        self.by_code = {e['code']: e for e in self.entries}
+
+    # --- Index construction ---
+    def _load_index(self):
+        data = read_json(self.path + self.INDEX_SUFFIX)
+        if (data and data.get('version') == self.INDEX_VERSION
+                and data.get('size') == self.size and data.get('mtime') == self.mtime):
+            return data['entries']
+        return None
+
+    def _save_index(self):
+        try:
+            write_json(self.path + self.INDEX_SUFFIX, {
+                'version': self.INDEX_VERSION, 'size': self.size,
+                'mtime': self.mtime, 'entries': self.entries})
+        except OSError:
+            pass  # read-only location; the in-memory index still works
+
+    def _build_index(self):
+        entries = []
+        if not self.size:
+            return entries
+        with open(self.path, 'rb') as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:4] == b'>P1;':
+                pos = 0
+            else:
+                pos = mm.find(b'\n>P1;')
+                pos = pos if pos == -1 else pos + 1
+            while pos != -1:
+                code_end = mm.find(b'\n', pos)
+                code_end = self.size if code_end == -1 else code_end
+                code = mm[pos + 4:code_end].decode('utf-8', 'replace').strip()
+
+                # Header is the next non-blank line after the code line
+                header_start = code_end + 1
+                header_end = header_start
+                header = ''
+                while header_start < self.size:
+                    header_end = mm.find(b'\n', header_start)
+                    header_end = self.size if header_end == -1 else header_end
+                    header = mm[header_start:header_end].decode('utf-8', 'replace').strip()
+                    if header:
+                        break
+                    header_start = header_end + 1
+
+                nxt = mm.find(b'\n>P1;', header_end)
+                end = self.size if nxt == -1 else nxt + 1
+                entries.append({
+                    'code': code,
+                    'kind': header.split(':', 1)[0].strip().lower(),
+                    'header': header,
+                    'offset': pos,
+                    'seq_start': min(header_end + 1, end),
+                    'end': end,
+                })
+                pos = -1 if nxt == -1 else nxt + 1
+        return entries
+
+    # --- Queries ---
+    def __len__(self):
+        return len(self.entries)
+
+    def codes(self):
+        return [e['code'] for e in self.entries]
+
+    def header(self, code):
+        return self.by_code[code]['header']
+
+    def sequence(self, code):
+        """Aligned sequence of one entry (gaps and chain breaks kept, terminal '*' removed)."""
+        if code not in self._sequences:
+            entry = self.by_code[code]
+            with open(self.path, 'rb') as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                raw = mm[entry['seq_start']:entry['end']]
+            seq = b"".join(raw.split()).decode('utf-8', 'replace')
+            self._sequences[code] = seq.split('*', 1)[0]
+        return self._sequences[code]
+
+    def records(self):
+        return [(code, self.sequence(code)) for code in self.codes()]
+
+    def templates(self):
+        return [e['code'] for e in self.entries if e['kind'].startswith('structurex')]
+
+    def target(self):
+        """Align code of the (last) plain sequence entry, as ModelBuild expects."""
+        targets = [e['code'] for e in self.entries if e['kind'].startswith('sequence')]
+        return targets[-1] if targets else None
+
+    def preview(self, max_lines=400):
+        """First `max_lines` lines, read straight from the mapping."""
+        if not self.size:
+            return ''
+        with open(self.path, 'rb') as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            end = -1
+            for _ in range(max_lines):
+                end = mm.find(b'\n', end + 1)
+                if end == -1:
+                    end = self.size
+                    break
+            return mm[:end].decode('utf-8', 'replace')
+
+
+def is_pir_file(path):
+    with open(path, 'r', encoding='utf-8', errors='replace') as fh:
+        for line in fh:
+            if line.strip():
+                return line.startswith('>P1;')
+    return False
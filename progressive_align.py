@@ -0,0 +1,200 @@
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import combinations
+
+from modeller import Environ, Alignment
+
+from pir_index import PirIndex
+
+
+# Structure-based salign settings (Modeller's multiple structure alignment recipe)
+STRUCT_FEATURE_WEIGHTS = (1., 0., 0., 0., 1., 0.)
+STRUCT_GAP_PENALTIES_1D = (-450, -50)
+STRUCT_GAP_PENALTIES_3D = (0, 3)
+# Sequence-to-structure settings used when the target is added to the template block
+TARGET_GAP_PENALTIES_1D = (-450, 0)
+TARGET_GAP_PENALTIES_2D = (0.35, 1.2, 0.9, 1.2, 0.6, 8.6, 1.2, 0., 0.)
+
+
+def _new_env(atom_dirs):
+    env = Environ()
+    env.io.atom_files_directory = list(atom_dirs)
+    return env
+
+
+def _structural_salign(aln, align_block=0):
+    return aln.salign(rms_cutoff=3.5, normalize_pp_scores=False,
+                      rr_file='$(LIB)/as1.sim.mat', overhang=30,
+                      gap_penalties_1d=STRUCT_GAP_PENALTIES_1D,
+                      gap_penalties_3d=STRUCT_GAP_PENALTIES_3D,
+                      gap_gap_score=0, gap_residue_score=0,
+                      alignment_type='PAIRWISE', align_block=align_block,
+                      feature_weights=STRUCT_FEATURE_WEIGHTS,
+                      improve_alignment=True, fit=True, write_fit=False,
+                      output='')
+
+
+def template_pair_score(task):
+    """Worker: structural alignment of two templates, written to `pair_file` for the
+    progressive stage; returns (i, j, quality score)."""
+    i, j, file_i, code_i, file_j, code_j, atom_dirs, pair_file = task
+    env = _new_env(atom_dirs)
+    aln = Alignment(env)
+    aln.append(file=file_i, align_codes=code_i)
+    aln.append(file=file_j, align_codes=code_j)
+    result = _structural_salign(aln, align_block=1)
+    aln.write(file=pair_file, alignment_format='PIR')
+    return i, j, float(getattr(result, 'qscorepct', 0.0))
+
+
+def target_template_identity(task):
+    """Worker: align2d of the target against one template; returns (i, % sequence identity)."""
+    i, tpl_file, tpl_code, target_file, target_format, atom_dirs, max_gap_length = task
+    env = _new_env(atom_dirs)
+    aln = Alignment(env)
+    aln.append(file=tpl_file, align_codes=tpl_code)
+    aln.append(file=target_file, alignment_format=target_format)
+    aln.align2d(max_gap_length=max_gap_length)
+    return i, float(aln[0].get_sequence_identity(aln[1]))
+
+
+def guide_order(pair_scores, target_identity):
+    """Progressive order: start at the template closest to the target, then add the
+    remaining template that is structurally most similar to those already placed."""
+    n = len(target_identity)
+    order = [max(range(n), key=lambda k: target_identity[k])]
+    remaining = set(range(n)) - set(order)
+    while remaining:
+        def affinity(k):
+            scores = [pair_scores.get((min(k, o), max(k, o)), 0.0) for o in order]
+            return (sum(scores) / len(scores), target_identity[k])
+        nxt = max(remaining, key=affinity)
+        order.append(nxt)
+        remaining.remove(nxt)
+    return order
+
+
+def merge_on_anchor(block, anchor, pair):
+    """Add the second row of a pairwise alignment to a block of aligned rows.
+
+    block: equal-length gapped rows; anchor: index of the row that also is the
+    first row of `pair`. Residue columns of the anchor are matched up, gaps of
+    either side become new columns, so neither alignment is changed.
+    """
+    rows, added = [[] for _ in block], []
+    anchor_row, (pair_anchor, pair_new) = block[anchor], pair
+    i = j = 0
+    while i < len(anchor_row) or j < len(pair_anchor):
+        if i < len(anchor_row) and (anchor_row[i] == '-' or j == len(pair_anchor)):
+            for row, src in zip(rows, block):
+                row.append(src[i])
+            added.append('-')
+            i += 1
+        elif j < len(pair_anchor) and (pair_anchor[j] == '-' or i == len(anchor_row)):
+            for row in rows:
+                row.append('-')
+            added.append(pair_new[j])
+            j += 1
+        elif anchor_row[i] != pair_anchor[j]:
+            raise ValueError(f"Pairwise alignments disagree on the anchor sequence at column {i + 1}")
+        else:
+            for row, src in zip(rows, block):
+                row.append(src[i])
+            added.append(pair_new[j])
+            i += 1
+            j += 1
+    return ["".join(row) for row in rows] + ["".join(added)]
+
+
+def write_pir(path, entries):
+    """entries: [(align_code, header, gapped sequence), ...]"""
+    with open(path, 'w', encoding='utf-8') as fh:
+        for code, header, seq in entries:
+            fh.write(f">P1;{code}\n{header}\n")
+            seq += '*'
+            fh.write("\n".join(seq[k:k + 75] for k in range(0, len(seq), 75)) + "\n\n")
+
+
+def progressive_align(templates, target_file, target_format, out_dir, atom_dirs,
+                      max_gap_length=50, processes=None, log=print):
+    """Multi-template alignment built progressively from parallel pairwise stages.
+
+    templates: [(align_code, pir_file), ...] with one structureX entry per file.
+    Writes Alignment.ali (PIR) and Alignment.pap into out_dir and returns a
+    summary dict with the guide order and pairwise scores.
+    """
+    n = len(templates)
+    atom_dirs = [os.path.abspath(d) for d in atom_dirs]
+    pair_scores = {}
+    target_identity = [0.0] * n
+
+    # Stage 1: template-template and target-template pairwise alignments in parallel;
+    # the template pairs are kept for stage 2
+    pair_dir = os.path.join(os.path.abspath(out_dir), '.pairwise')
+    os.makedirs(pair_dir, exist_ok=True)
+    pair_files = {(i, j): os.path.join(pair_dir, f"{i}-{j}.ali") for i, j in combinations(range(n), 2)}
+    pair_tasks = [(i, j, templates[i][1], templates[i][0], templates[j][1], templates[j][0], atom_dirs,
+                   pair_files[(i, j)]) for i, j in combinations(range(n), 2)]
+    target_tasks = [(i, templates[i][1], templates[i][0], target_file, target_format, atom_dirs, max_gap_length)
+                    for i in range(n)]
+    workers = processes or min(os.cpu_count() or 1, max(1, len(pair_tasks) + len(target_tasks)))
+    log(f"Pairwise stage: {len(pair_tasks)} structural + {len(target_tasks)} target alignments on {workers} processes")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(template_pair_score, t) for t in pair_tasks]
+        futures += [pool.submit(target_template_identity, t) for t in target_tasks]
+        for future in as_completed(futures):
+            result = future.result()
+            if len(result) == 3:
+                i, j, score = result
+                pair_scores[(i, j)] = score
+                log(f"  {templates[i][0]} ~ {templates[j][0]}: structural score {score:.1f}")
+            else:
+                i, identity = result
+                target_identity[i] = identity
+                log(f"  target ~ {templates[i][0]}: {identity:.1f}% identity")
+
+    # Stage 2: progressive combination along the guide order. Each template joins
+    # through its pairwise alignment with the most similar template already placed,
+    # so no structural alignment is run again.
+    order = guide_order(pair_scores, target_identity)
+    log("Guide order: " + " > ".join(templates[k][0] for k in order))
+    env = _new_env(atom_dirs)
+    aln = Alignment(env)
+    try:
+        if n == 1:
+            aln.append(file=templates[0][1], align_codes=templates[0][0])
+        else:
+            block, headers = [], []
+            for step, k in enumerate(order[1:], start=1):
+                placed = order[:step]
+                anchor = max(placed, key=lambda p: pair_scores.get((min(p, k), max(p, k)), 0.0))
+                index = PirIndex(pair_files[(min(anchor, k), max(anchor, k))])
+                pair = (index.sequence(templates[anchor][0]), index.sequence(templates[k][0]))
+                if step == 1:
+                    block = list(pair)
+                    headers = [index.header(templates[anchor][0]), index.header(templates[k][0])]
+                else:
+                    block = merge_on_anchor(block, placed.index(anchor), pair)
+                    headers.append(index.header(templates[k][0]))
+            merged = os.path.join(pair_dir, 'templates.ali')
+            write_pir(merged, [(templates[k][0], header, seq) for k, header, seq in zip(order, headers, block)])
+            aln.append(file=merged, align_codes='all')
+    finally:
+        shutil.rmtree(pair_dir, ignore_errors=True)
+
+    # Stage 3: align the target against the whole template block
+    aln.append(file=target_file, alignment_format=target_format)
+    aln.salign(output='', max_gap_length=max_gap_length, gap_function=True,
+               align_block=n, feature_weights=(1., 0., 0., 0., 0., 0.), overhang=80,
+               gap_penalties_1d=TARGET_GAP_PENALTIES_1D,
+               gap_penalties_2d=TARGET_GAP_PENALTIES_2D,
+               similarity_flag=True)
+
+    aln.write(file=os.path.join(out_dir, 'Alignment.ali'), alignment_format='PIR')
+    aln.write(file=os.path.join(out_dir, 'Alignment.pap'), alignment_format='PAP')
+    return {
+        'order': [templates[k][0] for k in order],
+        'target_identity': {templates[k][0]: target_identity[k] for k in range(n)},
+        'pair_scores': {f"{templates[i][0]}~{templates[j][0]}": s for (i, j), s in pair_scores.items()},
+    }
@@ -0,0 +1,220 @@
+import os
+import threading
+
+import numpy as np
+
+try:
+    import psutil
+except ImportError:  # optional; /proc is read directly on Linux
+    psutil = None
+
+from cache_utils import cache_path, read_json, write_json
+from pir_index import PirIndex
+
+
+# Features the memory estimate of each job kind is learned from. Template structures are
+# read over the whole aligned length (gap columns included, e.g. a small chain cut from a
+# large complex), while restraints grow with the target residues; both per template.
+FEATURES = {
+    'build': ('alignment_length', 'target_length', 'templates'),
+}
+# Prior used until enough runs are recorded:
+# MB = a + b * columns * templates + c * target residues * templates
+DEFAULT_COEFFICIENTS = {
+    'build': (200.0, 0.05, 0.5),
+}
+MIN_SAMPLES = 5
+MAX_SAMPLES = 200
+# Estimates are padded by this factor before admission
+SAFETY_FACTOR = 1.2
+# A job is killed once its RSS exceeds OVERRUN_FACTOR x its estimate (and at least MIN_HEADROOM_MB over it)
+OVERRUN_FACTOR = 2.0
+MIN_HEADROOM_MB = 512
+# Memory left for the GUI and the rest of the system when admitting jobs
+RESERVE_MB = 512
+# Below this much free memory, jobs running over their estimate are killed
+LOW_MEMORY_MB = 256
+ADMISSION_POLL_SECONDS = 2.0
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+# --- Measuring ---
+def system_available_mb():
+    if psutil is not None:
+        return psutil.virtual_memory().available / 2 ** 20
+    try:
+        with open('/proc/meminfo', 'r') as fh:
+            for line in fh:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float('inf')
+
+
+def process_tree_rss_mb(pid):
+    """Resident memory of a job process plus everything it started (its process group)."""
+    if psutil is not None:
+        try:
+            root = psutil.Process(pid)
+            procs = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return 0.0
+        total = 0
+        for proc in procs:
+            try:
+                total += proc.memory_info().rss
+            except psutil.Error:
+                continue
+        return total / 2 ** 20
+    # JobProcess children call setpgrp, so the job's process group id is its pid
+    total = 0
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return 0.0
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as fh:
+                stat = fh.read()
+        except OSError:
+            continue
+        # Fields after the command name: state, ppid, pgrp, ... rss (field 24) at index 21
+        fields = stat[stat.rfind(')') + 2:].split()
+        if len(fields) > 21 and (int(fields[2]) == pid or int(entry) == pid):
+            total += int(fields[21]) * _PAGE_SIZE
+    return total / 2 ** 20
+
+
+def build_features(alnfile, knowns):
+    """Target length (residues), alignment length (columns) and template count of a build."""
+    index = PirIndex(alnfile)
+    target = index.target()
+    if target is None:
+        raise ValueError(f"No target sequence in {alnfile}")
+    row = index.sequence(target)
+    length = sum(1 for c in row if c not in '-/.')
+    return {'target_length': length, 'alignment_length': len(row), 'templates': len(knowns)}
+
+
+# --- Learning ---
+class MemoryModel:
+    """Peak-RSS history per job kind and a least-squares estimate learned from it."""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(cache_path("resources"), "memory.json")
+        self.history = read_json(self.path, {})
+
+    @staticmethod
+    def design(kind, features):
+        columns, length, templates = (float(features.get(name, 0)) for name in FEATURES[kind])
+        return np.array([1.0, columns * templates, length * templates])
+
+    def estimate(self, kind, features):
+        """Expected peak RSS in MB, padded by SAFETY_FACTOR."""
+        x = self.design(kind, features)
+        # Samples recorded with other features (older versions) would skew the fit
+        samples = [s for s in self.history.get(kind, []) if set(FEATURES[kind]) <= set(s['features'])]
+        prior = float(x @ np.array(DEFAULT_COEFFICIENTS[kind]))
+        if len(samples) < MIN_SAMPLES:
+            return prior * SAFETY_FACTOR
+        X = np.array([self.design(kind, s['features']) for s in samples])
+        y = np.array([s['peak_mb'] for s in samples])
+        coef, *_ = np.linalg.lstsq(X, y, rcond=None)
+        fitted = float(x @ coef)
+        # Never trust a fit below the smallest job ever seen (extrapolation to tiny inputs)
+        return max(fitted, float(y.min())) * SAFETY_FACTOR
+
+    def record(self, kind, features, peak_mb):
+        self.history = read_json(self.path, {})
+        samples = self.history.setdefault(kind, [])
+        samples.append({'features': {name: features.get(name, 0) for name in FEATURES[kind]},
+                        'peak_mb': round(float(peak_mb), 1)})
+        del samples[:-MAX_SAMPLES]
+        try:
+            write_json(self.path, self.history)
+        except OSError:
+            pass
+
+
+# --- Admission control ---
+class MemoryScheduler:
+    """Starts jobs only when their estimated memory fits next to the jobs already running.
+
+    Free memory is what the system reports minus what admitted jobs are still
+    expected to grow into. A job is always admitted when nothing else runs,
+    so an oversized estimate delays jobs but never deadlocks them.
+    """
+
+    def __init__(self, reserve_mb=RESERVE_MB):
+        self.reserve_mb = reserve_mb
+        self.running = []
+        self.condition = threading.Condition()
+
+    def free_mb(self):
+        pending = sum(max(b.estimate_mb - b.rss_mb, 0.0) for b in self.running)
+        return system_available_mb() - pending - self.reserve_mb
+
+    def acquire(self, budget, cancelled=None, on_wait=None):
+        """Block until the budget fits; returns False if `cancelled()` became true while waiting."""
+        with self.condition:
+            announced = False
+            while self.running and self.free_mb() < budget.estimate_mb:
+                if cancelled is not None and cancelled():
+                    return False
+                if on_wait and not announced:
+                    on_wait(f"Waiting for memory: job needs ~{budget.estimate_mb:.0f} MB, "
+                            f"{max(self.free_mb(), 0):.0f} MB free")
+                    announced = True
+                self.condition.wait(ADMISSION_POLL_SECONDS)
+            self.running.append(budget)
+            return True
+
+    def release(self, budget):
+        with self.condition:
+            if budget in self.running:
+                self.running.remove(budget)
+            self.condition.notify_all()
+
+
+SCHEDULER = MemoryScheduler()
+
+
+class JobBudget:
+    """Memory estimate, limit and measured peak of one job; pass it to JobProcess(budget=...)."""
+
+    def __init__(self, kind, features, limit_mb=None, model=None, scheduler=None):
+        self.kind = kind
+        self.features = features
+        self.model = model or MemoryModel()
+        self.scheduler = scheduler or SCHEDULER
+        self.estimate_mb = self.model.estimate(kind, features)
+        self.limit_mb = limit_mb or max(self.estimate_mb * OVERRUN_FACTOR, self.estimate_mb + MIN_HEADROOM_MB)
+        self.rss_mb = 0.0
+        self.peak_mb = 0.0
+
+    def admit(self, cancelled=None, on_wait=None):
+        return self.scheduler.acquire(self, cancelled, on_wait)
+
+    def sample(self, pid):
+        """Measure the job; returns an error message when it has to be stopped, else None."""
+        self.rss_mb = process_tree_rss_mb(pid)
+        self.peak_mb = max(self.peak_mb, self.rss_mb)
+        if self.rss_mb > self.limit_mb:
+            return (f"Job stopped: memory use {self.rss_mb:.0f} MB exceeded its limit of "
+                    f"{self.limit_mb:.0f} MB (estimated {self.estimate_mb:.0f} MB).")
+        if self.rss_mb > self.estimate_mb and system_available_mb() < LOW_MEMORY_MB:
+            return (f"Job stopped: system memory nearly exhausted while the job used {self.rss_mb:.0f} MB "
+                    f"(estimated {self.estimate_mb:.0f} MB).")
+        return None
+
+    def finish(self, record=True):
+        self.scheduler.release(self)
+        if record and self.peak_mb > 0:
+            self.model.record(self.kind, self.features, self.peak_mb)
+
+    def report(self):
+        return f"Peak memory {self.peak_mb:.0f} MB (estimated {self.estimate_mb:.0f} MB)"
@@ -0,0 +1,224 @@
+import os
+import csv
+import sys
+import json
+import glob
+import time
+import uuid
+import argparse
+import threading
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional; CSV is written instead
+    pa = pq = None
+
+from cache_utils import cache_path
+from violations import RESTRAINT_TYPES
+import artifacts
+
+
+# Table schemas; every append writes exactly these columns in this order
+TABLES = {
+    'runs': ['run_id', 'sequence', 'started', 'finished', 'status', 'n_models',
+             'templates', 'alignment', 'output_dir', 'params'],
+    'models': ['run_id', 'sequence', 'filename', 'model', 'parent', 'molpdf', 'dope', 'dopehr',
+               'normalized_dope', 'ga341', 'finished_at', 'seconds', 'templates', 'output_dir'],
+    'residues': ['run_id', 'sequence', 'model', 'resid', 'resname', 'violation', 'dominant_type'],
+}
+FLOAT_COLUMNS = {'started', 'finished', 'molpdf', 'dope', 'dopehr', 'normalized_dope', 'ga341', 'finished_at', 'seconds', 'violation'}
+INT_COLUMNS = {'n_models', 'model', 'resid'}
+# Headless services export from several threads; CSV appends must not interleave
+_WRITE_LOCK = threading.Lock()
+
+
+def default_format():
+    return 'parquet' if pq is not None else 'csv'
+
+
+def _coerce(column, value):
+    if value is None or value == '':
+        return None
+    if column in FLOAT_COLUMNS:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    if column in INT_COLUMNS:
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+    return value if isinstance(value, str) else json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+
+
+class RunExporter:
+    """Appends run, model and per-residue results to columnar files as they are produced.
+
+    Parquet (when pyarrow is installed) is written as one part file per
+    append under `<root>/<table>/`, so pandas, pyarrow or duckdb can read
+    the whole directory as a dataset; `compact_run` merges a run's parts once
+    it is finished. Without pyarrow each table is a single appended CSV file.
+    """
+
+    def __init__(self, root=None, fmt=None):
+        self.root = root or cache_path("results")
+        self.format = fmt or default_format()
+        if self.format == 'parquet' and pq is None:
+            raise RuntimeError("Parquet export needs the 'pyarrow' package")
+        os.makedirs(self.root, exist_ok=True)
+        self.runs = {}
+
+    # --- Writing ---
+    def _append(self, table, rows, part=None):
+        if not rows:
+            return
+        columns = TABLES[table]
+        records = [{c: _coerce(c, row.get(c)) for c in columns} for row in rows]
+        with _WRITE_LOCK:
+            self._write(table, columns, records, part)
+
+    def _write(self, table, columns, records, part):
+        if self.format == 'parquet':
+            directory = os.path.join(self.root, table)
+            os.makedirs(directory, exist_ok=True)
+            data = pa.Table.from_pylist(records, schema=self.schema(table))
+            name = f"{part or 'part'}-{time.time_ns()}.parquet"
+            pq.write_table(data, os.path.join(directory, name))
+        else:
+            path = os.path.join(self.root, f"{table}.csv")
+            new = not os.path.exists(path)
+            if not new:
+                self._upgrade_csv(path, columns)
+            with open(path, 'a', newline='', encoding='utf-8') as fh:
+                writer = csv.DictWriter(fh, fieldnames=columns)
+                if new:
+                    writer.writeheader()
+                writer.writerows(records)
+
+    def _upgrade_csv(self, path, columns):
+        """Rewrite a CSV table written with an older column set so appended rows line up."""
+        with open(path, 'r', newline='', encoding='utf-8') as fh:
+            reader = csv.DictReader(fh)
+            if reader.fieldnames == columns:
+                return
+            rows = list(reader)
+        with open(path + ".tmp", 'w', newline='', encoding='utf-8') as fh:
+            writer = csv.DictWriter(fh, fieldnames=columns, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(rows)
+        os.replace(path + ".tmp", path)
+
+    def schema(self, table):
+        fields = []
+        for column in TABLES[table]:
+            kind = pa.float64() if column in FLOAT_COLUMNS else pa.int64() if column in INT_COLUMNS else pa.string()
+            fields.append(pa.field(column, kind))
+        return pa.schema(fields)
+
+    # --- Run lifecycle ---
+    def start_run(self, sequence, output_dir, alignment=None, templates=(), params=None):
+        run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self.runs[run_id] = {
+            'run_id': run_id, 'sequence': sequence, 'started': time.time(), 'last_finish': time.time(),
+            'templates': ",".join(templates), 'alignment': alignment and os.path.abspath(alignment),
+            'output_dir': os.path.abspath(output_dir), 'params': params or {},
+            'exported': set(),
+        }
+        return run_id
+
+    def add_models(self, run_id, models):
+        """Append models not exported yet; timings come from the model files' modification times."""
+        run = self.runs[run_id]
+        rows = []
+        pending = [m for m in models if m.get('filename') and m['filename'] not in run['exported']]
+        for model in sorted(pending, key=lambda m: self._finished_at(run, m) or 0):
+            finished_at = self._finished_at(run, model)
+            seconds = None
+            if finished_at:
+                # Time since the previous model of the run finished (or since the run started)
+                seconds = max(finished_at - run['last_finish'], 0.0)
+                run['last_finish'] = max(run['last_finish'], finished_at)
+            rows.append(dict(model, run_id=run_id, sequence=run['sequence'],
+                             model=artifacts.model_number(model['filename']),
+                             finished_at=finished_at, seconds=seconds,
+                             templates=run['templates'], output_dir=run['output_dir']))
+            run['exported'].add(model['filename'])
+        self._append('models', rows, part=run_id)
+        return len(rows)
+
+    def _finished_at(self, run, model):
+        real = artifacts.resolve(os.path.join(run['output_dir'], model['filename']))
+        return os.path.getmtime(real) if real else None
+
+    def add_residue_profiles(self, run_id, violation_run):
+        """Per-model, per-residue restraint violation totals from violations.load_run."""
+        run = self.runs[run_id]
+        profiles = violation_run['profiles']
+        totals = profiles.sum(axis=2)
+        dominant = profiles.argmax(axis=2)
+        rows = []
+        for m, name in enumerate(violation_run['models']):
+            number = int(str(name)[-4:]) if str(name)[-4:].isdigit() else None
+            for r, resid in enumerate(violation_run['resids']):
+                t = int(dominant[m, r])
+                rows.append({'run_id': run_id, 'sequence': run['sequence'], 'model': number,
+                             'resid': int(resid), 'resname': str(violation_run['resnames'][r]),
+                             'violation': float(totals[m, r]),
+                             'dominant_type': RESTRAINT_TYPES[t] if totals[m, r] > 0 and t < len(RESTRAINT_TYPES) else ''})
+        self._append('residues', rows, part=run_id)
+        return len(rows)
+
+    def finish_run(self, run_id, status='done'):
+        run = self.runs.pop(run_id)
+        row = dict(run, finished=time.time(), status=status, n_models=len(run['exported']))
+        self._append('runs', [row], part=run_id)
+        if self.format == 'parquet':
+            self.compact_run(run_id)
+
+    def compact_run(self, run_id):
+        """Merge the part files a run appended incrementally into one file per table."""
+        for table in TABLES:
+            parts = sorted(glob.glob(os.path.join(self.root, table, f"{run_id}-*.parquet")))
+            if len(parts) < 2:
+                continue
+            merged = pa.concat_tables([pq.read_table(p) for p in parts])
+            target = os.path.join(self.root, table, f"{run_id}.parquet")
+            pq.write_table(merged, target + ".tmp")
+            os.replace(target + ".tmp", target)
+            for p in parts:
+                os.remove(p)
+
+
+def export_run(sequence, output_dir, models, alignment=None, templates=(), params=None,
+               status='done', started=None, root=None):
+    """Export a finished run in one go, for the headless runners (watch daemon, job service, work queue)."""
+    exporter = RunExporter(root)
+    run_id = exporter.start_run(sequence, output_dir, alignment, templates, params)
+    if started:
+        exporter.runs[run_id]['started'] = exporter.runs[run_id]['last_finish'] = started
+    exporter.add_models(run_id, models or [])
+    exporter.finish_run(run_id, status=status)
+    return run_id
+
+
+def table_path(table, root=None, fmt=None):
+    """Path for pandas.read_parquet / read_csv or a duckdb glob."""
+    root = root or cache_path("results")
+    if (fmt or default_format()) == 'parquet':
+        return os.path.join(root, table)
+    return os.path.join(root, f"{table}.csv")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show where exported run results are stored.")
+    parser.add_argument("--root", default=None)
+    args = parser.parse_args()
+    for table in TABLES:
+        print(f"{table}: {table_path(table, args.root)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+import os
+from modeller import Model, Alignment
+
+from cache_utils import cache_path, file_digest, read_json, write_json
+
+
+class TemplateCache:
+    """Stores each template chain once as a chain-restricted PDB plus its PIR entry.
+
+    Entries are keyed by the content hash of the source PDB and the chain, so
+    re-downloaded or renamed files map to the same entry and repeat alignments
+    never re-parse the original (often multi-megabyte) PDB.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or cache_path("templates")
+        os.makedirs(self.root, exist_ok=True)
+        self.index_path = os.path.join(self.root, "index.json")
+        self.index = read_json(self.index_path, {})
+
+    def key(self, pdbfile, chain):
+        return f"{file_digest(pdbfile)[:20]}_{chain or 'A'}"
+
+    def lookup(self, pdbfile, chain):
+        key = self.key(pdbfile, chain)
+        entry = self.index.get(key)
+        if entry is None:
+            # Another process may have prepared it since we loaded the index
+            self.index = read_json(self.index_path, {})
+            entry = self.index.get(key)
+        if entry and all(os.path.exists(os.path.join(self.root, entry[f])) for f in ('atom_file', 'entry_file')):
+            return entry
+        return None
+
+    def prepare(self, env, pdbfile, chain, align_code):
+        """Return (entry, cached) for a template chain, parsing the PDB only on a miss."""
+        chain = chain or 'A'
+        entry = self.lookup(pdbfile, chain)
+        if entry:
+            return entry, True
+
+        key = self.key(pdbfile, chain)
+        atom_file = f"{key}.pdb"
+        entry_file = f"{key}.ali"
+
+        mdl = Model(env, file=pdbfile, model_segment=(f'FIRST:{chain}', f'LAST:{chain}'))
+        mdl.write(file=os.path.join(self.root, atom_file))
+        aln = Alignment(env)
+        aln.append_model(mdl, align_codes=align_code, atom_files=atom_file)
+        aln.write(file=os.path.join(self.root, entry_file), alignment_format='PIR')
+
+        entry = {
+            'key': key,
+            'chain': chain,
+            'source': os.path.abspath(pdbfile),
+            'align_code': align_code,
+            'atom_file': atom_file,
+            'entry_file': entry_file,
+        }
+        self.index = read_json(self.index_path, {})
+        self.index[key] = entry
+        write_json(self.index_path, self.index)
+        return entry, False
+
+    def entry_text(self, entry, align_code):
+        """PIR text of a cached entry, relabelled with the requested align code."""
+        with open(os.path.join(self.root, entry['entry_file']), 'r', encoding='utf-8') as fh:
+            lines = fh.read().strip().splitlines()
+        for i, line in enumerate(lines):
+            if line.startswith('>P1;'):
+                lines[i] = f">P1;{align_code}"
+                break
+        return "\n".join(lines) + "\n"
+
+    def write_entries(self, entries, path):
+        """Write [(entry, align_code), ...] as one PIR file that Alignment.append can read."""
+        with open(path, 'w', encoding='utf-8') as fh:
+            for entry, align_code in entries:
+                fh.write(self.entry_text(entry, align_code))
+                fh.write("\n")
+        return path
@@ -0,0 +1,206 @@
+import os
+import re
+import glob
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from cache_utils import cache_path, read_json, write_json
+
+
+# Header-only PDB files are a few KB, so quality data can be collected before any full download
+HEADER_URL = "https://files.rcsb.org/header/{}.pdb"
+INDEX_VERSION = 1
+# Header downloads in flight at once; each is a small request dominated by round-trip time
+FETCH_WORKERS = 8
+
+# Resolution (A) scored 1.0 at or below GOOD_RESOLUTION, falling linearly to 0.0 at POOR_RESOLUTION
+GOOD_RESOLUTION = 1.5
+POOR_RESOLUTION = 4.5
+# Quality assumed for methods without a resolution (NMR ensembles)
+NMR_QUALITY = 0.4
+# Weights of resolution and chain completeness in the quality score
+QUALITY_WEIGHTS = (0.6, 0.4)
+
+_RFREE = re.compile(r"FREE R VALUE\s*(?:\([^)]*\))?\s*:\s*([0-9.]+)")
+_PDB_ID = re.compile(r"[0-9][A-Za-z0-9]{3}")
+
+
+def _to_float(text):
+    try:
+        return float(text)
+    except ValueError:
+        return np.nan
+
+
+def parse_pdb_header(lines):
+    """Read resolution, method, model count and per-chain SEQRES / REMARK 465 counts.
+
+    Stops at the first coordinate record, so full entries cost no more than
+    header-only files.
+    """
+    info = {'method': '', 'resolution': np.nan, 'r_free': np.nan, 'n_models': 1, 'chains': {}}
+    seqres, missing = {}, {}
+    in_missing = False
+    for line in lines:
+        record = line[:6]
+        if record in ('ATOM  ', 'HETATM', 'MODEL '):
+            break
+        if record == 'EXPDTA':
+            info['method'] = line[10:].strip()
+        elif record == 'NUMMDL':
+            n_models = _to_float(line[10:].strip())
+            info['n_models'] = int(n_models) if n_models > 0 else 1
+        elif record == 'SEQRES':
+            chain = line[11].strip() or 'A'
+            seqres[chain] = int(_to_float(line[13:17]))
+        elif line.startswith('REMARK   2 RESOLUTION.'):
+            info['resolution'] = _to_float(line[22:].split()[0]) if line[22:].split() else np.nan
+        elif line.startswith('REMARK   3') and 'FREE R VALUE' in line and 'TEST' not in line:
+            match = _RFREE.search(line)
+            if match and np.isnan(info['r_free']):
+                info['r_free'] = _to_float(match.group(1))
+        elif line.startswith('REMARK 465'):
+            if 'SSSEQI' in line:
+                in_missing = True
+            elif in_missing and len(line) > 19 and line[15:18].strip():
+                chain = line[19].strip() or 'A'
+                missing[chain] = missing.get(chain, 0) + 1
+    # NMR deposits list missing residues once per model
+    per_model = max(info['n_models'], 1) if 'NMR' in info['method'] else 1
+    for chain, n in seqres.items():
+        info['chains'][chain] = {'seqres': n, 'missing': missing.get(chain, 0) // per_model}
+    return info
+
+
+def pdb_id_from_path(path):
+    """'6B3Q.pdb' / 'pdb6b3q.ent' -> '6B3Q'; None for models and other PDB-format files."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if stem.lower().startswith('pdb') and len(stem) == 7:
+        stem = stem[3:]
+    return stem.upper() if _PDB_ID.fullmatch(stem) else None
+
+
+class TemplateIndex:
+    """Local index of PDB header metadata (resolution, method, completeness) per entry.
+
+    Filled from PDB files already on disk and from RCSB header-only
+    downloads; `quality()` returns column arrays aligned with a hit list so
+    BLAST hits can be ranked and filtered before anything is aligned.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or cache_path("template_index")
+        self.path = os.path.join(self.root, "index.json")
+        data = read_json(self.path, {})
+        self.entries = data.get('entries', {}) if data.get('version') == INDEX_VERSION else {}
+        self.dirty = False
+
+    def __contains__(self, pdb_id):
+        return pdb_id.upper() in self.entries
+
+    def add_file(self, path):
+        """Index one local PDB file, skipping it when unchanged since the last scan."""
+        pdb_id = pdb_id_from_path(path)
+        if not pdb_id:
+            raise ValueError(f"Not a PDB entry file name: {path}")
+        stat = os.stat(path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        entry = self.entries.get(pdb_id)
+        if entry and entry.get('signature') == signature:
+            return entry
+        with open(path, 'r', encoding='utf-8', errors='replace') as fh:
+            entry = parse_pdb_header(fh)
+        entry['source'] = os.path.abspath(path)
+        entry['signature'] = signature
+        self.entries[pdb_id] = entry
+        self.dirty = True
+        return entry
+
+    def scan(self, directories):
+        """Index every *.pdb / *.ent file in the given directories."""
+        count = 0
+        for directory in directories:
+            for pattern in ("*.pdb", "*.ent"):
+                for path in glob.glob(os.path.join(directory, pattern)):
+                    if not pdb_id_from_path(path):
+                        continue
+                    try:
+                        self.add_file(path)
+                        count += 1
+                    except (OSError, ValueError):
+                        continue
+        return count
+
+    def fetch(self, pdb_ids, session=None, timeout=15, workers=FETCH_WORKERS):
+        """Download header-only files for entries not yet indexed; returns the ids that failed.
+
+        Up to `workers` downloads run at once on threads sharing one session.
+        """
+        missing = [p for p in dict.fromkeys(p.upper() for p in pdb_ids if p) if p not in self.entries]
+        if not missing:
+            return []
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_maxsize=workers))
+
+        def get(pdb_id):
+            try:
+                response = session.get(HEADER_URL.format(pdb_id), timeout=timeout)
+                response.raise_for_status()
+            except requests.exceptions.RequestException:
+                return None
+            return parse_pdb_header(response.text.splitlines())
+
+        failed = []
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(missing)))) as pool:
+            for pdb_id, entry in zip(missing, pool.map(get, missing)):
+                if entry is None:
+                    failed.append(pdb_id)
+                    continue
+                entry['source'] = 'rcsb-header'
+                self.entries[pdb_id] = entry
+                self.dirty = True
+        return failed
+
+    def save(self):
+        if self.dirty:
+            write_json(self.path, {'version': INDEX_VERSION, 'entries': self.entries})
+            self.dirty = False
+
+    def quality(self, pdb_ids, chains):
+        """Column arrays for the given (pdb_id, chain) pairs; NaN / '' where unknown."""
+        n = len(pdb_ids)
+        resolution = np.full(n, np.nan)
+        r_free = np.full(n, np.nan)
+        models = np.full(n, np.nan)
+        completeness = np.full(n, np.nan)
+        methods = [''] * n
+        for i, (pdb_id, chain) in enumerate(zip(pdb_ids, chains)):
+            entry = self.entries.get(str(pdb_id).upper())
+            if not entry:
+                continue
+            resolution[i] = entry['resolution'] if entry['resolution'] is not None else np.nan
+            r_free[i] = entry['r_free'] if entry['r_free'] is not None else np.nan
+            models[i] = entry['n_models']
+            methods[i] = entry['method']
+            stats = entry['chains'].get(chain) or (next(iter(entry['chains'].values()), None)
+                                                    if len(entry['chains']) == 1 else None)
+            if stats and stats['seqres']:
+                completeness[i] = 100.0 * (stats['seqres'] - stats['missing']) / stats['seqres']
+        return {'Resolution': resolution, 'R_Free': r_free, 'Models': models,
+                'Completeness_%': completeness, 'Method': methods}
+
+
+def quality_score(resolution, completeness, methods):
+    """Vectorised 0-1 template quality from resolution, completeness and method; NaN if unknown."""
+    resolution = np.asarray(resolution, dtype=float)
+    completeness = np.asarray(completeness, dtype=float)
+    nmr = np.array(['NMR' in m for m in methods], dtype=bool)
+    res_term = np.clip((POOR_RESOLUTION - resolution) / (POOR_RESOLUTION - GOOD_RESOLUTION), 0.0, 1.0)
+    res_term = np.where(nmr & np.isnan(resolution), NMR_QUALITY, res_term)
+    comp_term = np.where(np.isnan(completeness), res_term, completeness / 100.0)
+    w_res, w_comp = QUALITY_WEIGHTS
+    return w_res * res_term + w_comp * comp_term
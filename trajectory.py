@@ -0,0 +1,199 @@
+import os
+import math
+import time
+
+import artifacts
+
+
+# Rows in a complete .D trace with AutoModel's default schedule (INS example);
+# replaced by the observed length once a model of the run has finished
+DEFAULT_EXPECTED_ROWS = 230
+# A CG stage whose energy climbs this far above its own minimum is flagged as diverging
+DIVERGE_FACTOR = 1.5
+# Seconds without new rows before an unfinished model is flagged as stalled
+STALL_SECONDS = 120
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+
+def _to_float(text):
+    try:
+        return float(text)
+    except ValueError:
+        return math.nan  # Modeller prints '*****' on overflow
+
+
+class TrajectoryReader:
+    """Tail-follows one Modeller .D optimization trace and parses new rows incrementally."""
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.partial = ''
+        self.sections = []
+        self.rows = 0
+        self.last_update = None
+
+    def poll(self):
+        """Read whatever was appended since the last call; returns the number of new rows."""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return 0
+        if size < self.offset:
+            # File was rewritten (model restarted); start over
+            self.__init__(self.path)
+        if size == self.offset:
+            return 0
+        with open(self.path, 'r', encoding='utf-8', errors='replace') as fh:
+            fh.seek(self.offset)
+            data = fh.read()
+            self.offset = fh.tell()
+        data = self.partial + data
+        lines = data.split('\n')
+        self.partial = lines.pop()  # incomplete last line, finished on the next poll
+        new_rows = 0
+        for line in lines:
+            new_rows += self._parse_line(line)
+        if new_rows:
+            self.rows += new_rows
+            self.last_update = time.time()
+        return new_rows
+
+    def _parse_line(self, line):
+        line = line.strip()
+        if not line:
+            return 0
+        if line.startswith('#'):
+            text = line.lstrip('#').strip()
+            if text.startswith('Conjugate gradients'):
+                self.sections.append({'kind': 'cg', 'temperature': None, 'step': [], 'energy': [], 'gradient': []})
+            elif text.startswith('Molecular dynamics'):
+                parts = text.split()
+                temp = _to_float(parts[-2]) if len(parts) >= 2 else math.nan
+                self.sections.append({'kind': 'md', 'temperature': temp, 'step': [], 'energy': [], 'gradient': []})
+            return 0
+        fields = line.split()
+        if len(fields) < 6 or not self.sections:
+            return 0
+        section = self.sections[-1]
+        section['step'].append(int(_to_float(fields[0])) if fields[0].isdigit() else 0)
+        section['energy'].append(_to_float(fields[1]))
+        # Last column: gradient norm for CG, kinetic temperature for MD
+        section['gradient'].append(_to_float(fields[5]))
+        return 1
+
+    @classmethod
+    def from_artifact(cls, path):
+        """Reader filled from a complete (possibly compressed) trace."""
+        reader = cls(path)
+        with artifacts.open_artifact(path) as fh:
+            for line in fh:
+                reader.rows += reader._parse_line(line)
+        reader.offset = os.path.getsize(path) if os.path.exists(path) else 0
+        reader.last_update = time.time()
+        return reader
+
+    def energies(self):
+        return [e for s in self.sections for e in s['energy']]
+
+    def latest(self):
+        """(stage label, step, energy, gradient-or-temperature) of the newest row."""
+        for section in reversed(self.sections):
+            if section['energy']:
+                label = 'CG' if section['kind'] == 'cg' else f"MD {section['temperature']:.0f}K"
+                return label, section['step'][-1], section['energy'][-1], section['gradient'][-1]
+        return None
+
+    def is_diverging(self):
+        for section in self.sections:
+            energy = section['energy']
+            if not energy:
+                continue
+            if any(not math.isfinite(e) for e in energy):
+                return True
+            if section['kind'] == 'cg':
+                lowest = min(energy)
+                if energy[-1] - lowest > (DIVERGE_FACTOR - 1) * max(abs(lowest), 1.0):
+                    return True
+        return False
+
+
+class TrajectoryMonitor:
+    """Watches the .D traces of every model in a build and estimates overall progress."""
+
+    def __init__(self, directory, sequence, start_model, end_model):
+        self.directory = directory
+        self.sequence = sequence
+        self.models = list(range(start_model, end_model + 1))
+        self.readers = {}
+
+    def trace_path(self, model):
+        return os.path.join(self.directory, f"{self.sequence}.D{model:08d}")
+
+    def model_path(self, model):
+        return os.path.join(self.directory, f"{self.sequence}.B9999{model:04d}.pdb")
+
+    def poll(self):
+        for model in self.models:
+            reader = self.readers.get(model)
+            if reader is None:
+                path = self.trace_path(model)
+                if not os.path.exists(path):
+                    # Finished traces may already be compressed; read them once in full
+                    if artifacts.exists(path):
+                        self.readers[model] = TrajectoryReader.from_artifact(path)
+                    continue
+                reader = self.readers[model] = TrajectoryReader(path)
+            reader.poll()
+
+    def is_done(self, model):
+        return artifacts.exists(self.model_path(model))
+
+    def expected_rows(self):
+        finished = sorted(r.rows for m, r in self.readers.items() if self.is_done(m) and r.rows)
+        return finished[len(finished) // 2] if finished else DEFAULT_EXPECTED_ROWS
+
+    def progress(self):
+        """Fraction (0-1) of the whole build completed, from finished models and trace lengths."""
+        if not self.models:
+            return 0.0
+        expected = self.expected_rows()
+        total = 0.0
+        for model in self.models:
+            if self.is_done(model):
+                total += 1.0
+            elif model in self.readers:
+                total += min(self.readers[model].rows / expected, 0.99)
+        return total / len(self.models)
+
+    def status(self, model):
+        if self.is_done(model):
+            return 'done'
+        reader = self.readers.get(model)
+        if reader is None:
+            return 'pending'
+        if reader.is_diverging():
+            return 'diverging'
+        if reader.last_update and time.time() - reader.last_update > STALL_SECONDS:
+            return 'stalled'
+        return 'running'
+
+    def summary(self):
+        """Per-model rows: (model, status, latest row or None, energy curve)."""
+        return [(m, self.status(m), self.readers[m].latest(), self.readers[m].energies())
+                for m in self.models if m in self.readers]
+
+
+def sparkline(values, width=40):
+    """Unicode sparkline of an energy curve on a log scale (energies span orders of magnitude)."""
+    values = [v for v in values if math.isfinite(v)]
+    if not values:
+        return ''
+    if len(values) > width:
+        step = len(values) / width
+        values = [values[int(i * step)] for i in range(width)]
+    low = min(values)
+    scaled = [math.log10(v - low + 1.0) for v in values]
+    top = max(scaled) or 1.0
+    return "".join(SPARK_CHARS[min(int(s / top * (len(SPARK_CHARS) - 1)), len(SPARK_CHARS) - 1)] for s in scaled)
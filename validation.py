@@ -0,0 +1,316 @@
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # optional; a NumPy cell list is used instead
+    cKDTree = None
+
+from artifacts import open_artifact, glob_artifacts
+
+
+# Van der Waals radii (Bondi) of the heavy atoms in protein models
+VDW_RADII = {'C': 1.70, 'N': 1.55, 'O': 1.52, 'S': 1.80}
+DEFAULT_RADIUS = 1.80
+# Two atoms clash when their van der Waals spheres overlap by at least this much (Angstrom)
+CLASH_OVERLAP = 0.4
+# Extra overlap tolerated between N/O pairs, which may be hydrogen bonded
+HBOND_ALLOWANCE = 0.4
+BACKBONE = ('N', 'CA', 'C', 'O')
+# Longest C(i-1)-N(i) distance still treated as a peptide bond
+PEPTIDE_BOND_MAX = 2.0
+DISULFIDE_MAX = 2.5
+
+# Ramachandran regions as (phi_min, phi_max, psi_min, psi_max) boxes in degrees.
+# A coarse approximation of the favoured/allowed contours: good enough to flag
+# outliers, not a replacement for a full MolProbity analysis.
+_GENERAL_FAVORED = [(-180, -45, 90, 180), (-180, -45, -180, -165), (-160, -45, -75, 50), (45, 75, 15, 65)]
+_GENERAL_ALLOWED = [(-180, -25, 50, 180), (-180, -25, -180, -150), (-180, -25, -110, 50), (30, 110, -40, 100),
+                    (150, 180, 150, 180), (150, 180, -180, -160)]
+
+
+def _mirror(boxes):
+    return [(-phi_max, -phi_min, -psi_max, -psi_min) for phi_min, phi_max, psi_min, psi_max in boxes]
+
+
+RAMA_REGIONS = {
+    # residue class: (favoured boxes, allowed boxes)
+    'general': (_GENERAL_FAVORED, _GENERAL_ALLOWED),
+    # Glycine has no side chain: the map is symmetric and only phi near 0 is excluded
+    'gly': (_GENERAL_FAVORED + _mirror(_GENERAL_FAVORED),
+            _GENERAL_ALLOWED + _mirror(_GENERAL_ALLOWED) + [(-180, -45, -180, 180), (45, 180, -180, 180)]),
+    # The proline ring fixes phi near -65
+    'pro': ([(-95, -50, -60, 50), (-95, -50, 100, 180), (-95, -50, -180, -170)],
+            [(-110, -40, -80, 180), (-110, -40, -180, -160)]),
+}
+
+
+# --- Reading ---
+def read_atoms(path):
+    """Heavy atoms of the first model in a PDB file as arrays (altloc A / blank only)."""
+    names, resnames, chains, resseqs, elements, coords = [], [], [], [], [], []
+    with open_artifact(path) as fh:
+        for line in fh:
+            if line.startswith('ENDMDL'):
+                break
+            if not line.startswith(('ATOM', 'HETATM')) or len(line) < 54 or line[16] not in ' A':
+                continue
+            resname = line[17:20].strip()
+            if resname == 'HOH':
+                continue
+            name = line[12:16].strip()
+            element = line[76:78].strip().upper() if len(line) > 76 else ''
+            element = element or name.lstrip('0123456789')[:1]
+            if element in ('H', 'D'):
+                continue
+            names.append(name)
+            resnames.append(resname)
+            chains.append(line[21])
+            resseqs.append(line[22:27])
+            elements.append(element)
+            coords.append((line[30:38], line[38:46], line[46:54]))
+    chains = np.array(chains)
+    # Residue index per atom, in file order; a new residue starts whenever chain/number/icode change
+    keys = np.char.add(chains, np.array(resseqs)) if names else np.zeros(0, dtype=str)
+    starts = np.concatenate(([True], keys[1:] != keys[:-1])) if len(keys) else np.zeros(0, dtype=bool)
+    return {
+        'names': np.array(names),
+        'resnames': np.array(resnames),
+        'chains': chains,
+        'resseqs': np.array([r.strip() for r in resseqs]),
+        'elements': np.array(elements),
+        'coords': np.array(coords, dtype=float).reshape(-1, 3),
+        'residues': np.cumsum(starts) - 1,
+    }
+
+
+# --- Spatial index ---
+_HALF_SHELL = [(0, 0, 0)] + [(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)
+                             if (dx, dy, dz) > (0, 0, 0)]
+
+
+def neighbor_pairs(coords, cutoff):
+    """Index arrays (i, j), i < j, of all atom pairs closer than `cutoff`.
+
+    Uses scipy's cKDTree when available, otherwise a cell list: atoms are
+    binned into cubes of edge `cutoff` and only the 13 forward neighbour
+    cells (plus the cell itself) are searched, all in vectorised NumPy.
+    """
+    n = len(coords)
+    if n < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    if cKDTree is not None:
+        pairs = cKDTree(coords).query_pairs(cutoff, output_type='ndarray')
+        i, j = pairs[:, 0], pairs[:, 1]
+        return np.minimum(i, j), np.maximum(i, j)
+
+    cells = np.floor((coords - coords.min(axis=0)) / cutoff).astype(np.int64)
+    dims = cells.max(axis=0) + 1
+
+    def cell_key(c):
+        return (c[:, 0] * dims[1] + c[:, 1]) * dims[2] + c[:, 2]
+
+    order = np.argsort(cell_key(cells), kind='stable')
+    sorted_keys = cell_key(cells)[order]
+    found_i, found_j = [], []
+    for offset in _HALF_SHELL:
+        neighbor = cells + offset
+        valid = np.all((neighbor >= 0) & (neighbor < dims), axis=1)
+        keys = cell_key(np.where(valid[:, None], neighbor, 0))
+        lo = np.searchsorted(sorted_keys, keys, 'left')
+        hi = np.searchsorted(sorted_keys, keys, 'right')
+        counts = np.where(valid, hi - lo, 0)
+        total = counts.sum()
+        if not total:
+            continue
+        i = np.repeat(np.arange(n), counts)
+        # Position within each atom's candidate range, added to the range start
+        within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        j = order[np.repeat(lo, counts) + within]
+        keep = i < j if offset == (0, 0, 0) else i != j
+        i, j = i[keep], j[keep]
+        d2 = np.einsum('ij,ij->i', coords[i] - coords[j], coords[i] - coords[j])
+        close = d2 < cutoff * cutoff
+        found_i.append(i[close])
+        found_j.append(j[close])
+    if not found_i:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    i, j = np.concatenate(found_i), np.concatenate(found_j)
+    return np.minimum(i, j), np.maximum(i, j)
+
+
+# --- Clashes ---
+def find_clashes(atoms):
+    """Non-bonded heavy-atom pairs overlapping by >= CLASH_OVERLAP; returns (i, j, overlap) arrays.
+
+    Pairs within a residue, backbone pairs of sequence neighbours and pairs
+    across a disulfide bridge are covalently constrained and never counted.
+    """
+    coords = atoms['coords']
+    radii = np.array([VDW_RADII.get(e, DEFAULT_RADIUS) for e in atoms['elements']])
+    if not len(coords):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    i, j = neighbor_pairs(coords, 2 * radii.max() - CLASH_OVERLAP)
+    res, chains, names = atoms['residues'], atoms['chains'], atoms['names']
+
+    distance = np.linalg.norm(coords[i] - coords[j], axis=1)
+    overlap = radii[i] + radii[j] - distance
+    polar = np.isin(atoms['elements'][i], ('N', 'O')) & np.isin(atoms['elements'][j], ('N', 'O'))
+    clash = overlap >= CLASH_OVERLAP + np.where(polar, HBOND_ALLOWANCE, 0.0)
+
+    backbone = np.isin(names, BACKBONE)
+    adjacent = (np.abs(res[i] - res[j]) == 1) & (chains[i] == chains[j])
+    bonded = (res[i] == res[j]) | (adjacent & (backbone[i] | backbone[j]))
+    sg = (names[i] == 'SG') & (names[j] == 'SG') & (distance < DISULFIDE_MAX)
+    if sg.any():
+        # Residue pairs encoded as one integer, so bridged pairs are matched with isin
+        n_res = res.max() + 1
+        pair_key = np.minimum(res[i], res[j]) * n_res + np.maximum(res[i], res[j])
+        bonded |= np.isin(pair_key, pair_key[sg])
+    keep = clash & ~bonded
+    return i[keep], j[keep], overlap[keep]
+
+
+# --- Backbone geometry ---
+def dihedrals(p0, p1, p2, p3):
+    """Dihedral angles in degrees for stacked (n, 3) point arrays."""
+    b0 = p0 - p1
+    b1 = p2 - p1
+    b2 = p3 - p2
+    b1 = b1 / np.linalg.norm(b1, axis=1, keepdims=True)
+    v = b0 - np.einsum('ij,ij->i', b0, b1)[:, None] * b1
+    w = b2 - np.einsum('ij,ij->i', b2, b1)[:, None] * b1
+    x = np.einsum('ij,ij->i', v, w)
+    y = np.einsum('ij,ij->i', np.cross(b1, v), w)
+    return np.degrees(np.arctan2(y, x))
+
+
+def backbone_torsions(atoms):
+    """phi and psi per residue (NaN where undefined, e.g. at termini or chain breaks)."""
+    n_res = int(atoms['residues'].max()) + 1 if len(atoms['residues']) else 0
+    backbone = {}
+    with np.errstate(invalid='ignore'):
+        for name in ('N', 'CA', 'C'):
+            xyz = np.full((n_res, 3), np.nan)
+            mask = atoms['names'] == name
+            xyz[atoms['residues'][mask]] = atoms['coords'][mask]
+            backbone[name] = xyz
+        N, CA, C = backbone['N'], backbone['CA'], backbone['C']
+        phi = np.full(n_res, np.nan)
+        psi = np.full(n_res, np.nan)
+        if n_res > 1:
+            linked = np.linalg.norm(C[:-1] - N[1:], axis=1) < PEPTIDE_BOND_MAX
+            phi[1:] = np.where(linked, dihedrals(C[:-1], N[1:], CA[1:], C[1:]), np.nan)
+            psi[:-1] = np.where(linked, dihedrals(N[:-1], CA[:-1], C[:-1], N[1:]), np.nan)
+    return phi, psi
+
+
+def _in_boxes(phi, psi, boxes):
+    inside = np.zeros(len(phi), dtype=bool)
+    for phi_min, phi_max, psi_min, psi_max in boxes:
+        inside |= (phi >= phi_min) & (phi <= phi_max) & (psi >= psi_min) & (psi <= psi_max)
+    return inside
+
+
+def ramachandran(atoms):
+    """Classify residues with defined phi/psi; returns (residue indices, class) with 'favored'/'allowed'/'outlier'."""
+    phi, psi = backbone_torsions(atoms)
+    defined = np.flatnonzero(np.isfinite(phi) & np.isfinite(psi))
+    first_atom = np.searchsorted(atoms['residues'], defined)
+    resnames = atoms['resnames'][first_atom]
+    kind = np.where(resnames == 'GLY', 'gly', np.where(resnames == 'PRO', 'pro', 'general'))
+    classes = np.full(len(defined), 'outlier', dtype=object)
+    for name, (favored, allowed) in RAMA_REGIONS.items():
+        rows = kind == name
+        p, s = phi[defined][rows], psi[defined][rows]
+        classes[rows] = np.where(_in_boxes(p, s, favored), 'favored',
+                                 np.where(_in_boxes(p, s, allowed), 'allowed', 'outlier'))
+    return defined, classes
+
+
+# --- Models ---
+def _residue_label(atoms, atom):
+    chain = atoms['chains'][atom].strip()
+    return f"{chain and chain + ':'}{atoms['resnames'][atom]}{atoms['resseqs'][atom]}"
+
+
+def validate_model(path):
+    """Clash and Ramachandran outlier counts of one model file, as values for the Models table."""
+    started = time.perf_counter()
+    atoms = read_atoms(path)
+    i, j, overlap = find_clashes(atoms)
+    residues, classes = ramachandran(atoms)
+    outliers = residues[classes == 'outlier']
+    first_atom = np.searchsorted(atoms['residues'], outliers)
+    n_atoms = len(atoms['coords'])
+    return {
+        'filename': os.path.basename(path),
+        'clashes': int(len(i)),
+        # Clashes per 1000 atoms, comparable across model sizes
+        'clashscore': 1000.0 * len(i) / n_atoms if n_atoms else 0.0,
+        'worst_overlap': float(overlap.max()) if len(overlap) else 0.0,
+        'rama_outliers': int(len(outliers)),
+        'rama_favored': 100.0 * float(np.mean(classes == 'favored')) if len(classes) else 0.0,
+        'outlier_residues': ", ".join(_residue_label(atoms, a) for a in first_atom),
+        'validation_ms': (time.perf_counter() - started) * 1000,
+    }
+
+
+def validate_models(paths, processes=None):
+    """validate_model for many files across a process pool; returns {path: result or {'error': text}}."""
+    def safe(path):
+        try:
+            return validate_model(path)
+        except (OSError, ValueError, IndexError) as e:
+            return {'error': str(e)}
+
+    workers = processes or min(os.cpu_count() or 1, len(paths))
+    if workers <= 1 or len(paths) < 2:
+        return {path: safe(path) for path in paths}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = {}
+        futures = {path: pool.submit(validate_model, path) for path in paths}
+        for path, future in futures.items():
+            try:
+                results[path] = future.result()
+            except (OSError, ValueError, IndexError) as e:
+                results[path] = {'error': str(e)}
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clash and Ramachandran validation of model files.")
+    parser.add_argument("paths", nargs='+', help="PDB files or folders (every *.B9999????.pdb)")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+    paths = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            paths.extend(glob_artifacts(os.path.join(path, "*.B9999????.pdb")))
+        else:
+            paths.append(path)
+    if not paths:
+        print("No model files found", file=sys.stderr)
+        return 1
+    started = time.perf_counter()
+    results = validate_models(paths, args.processes)
+    print("filename\tclashes\tclashscore\trama_outliers\trama_favored\toutlier_residues")
+    for path in paths:
+        r = results[path]
+        if 'error' in r:
+            print(f"{os.path.basename(path)}\terror: {r['error']}")
+            continue
+        print(f"{r['filename']}\t{r['clashes']}\t{r['clashscore']:.1f}\t{r['rama_outliers']}\t"
+              f"{r['rama_favored']:.1f}\t{r['outlier_residues']}")
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"{len(paths)} models in {elapsed:.0f} ms ({elapsed / len(paths):.1f} ms per model)", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from cache_utils import cache_path, text_digest
+from artifacts import open_artifact, glob_artifacts, resolve
+
+
+# Column order of Modeller's physical restraint groups in .V profile files
+RESTRAINT_TYPES = [
+    "Bond length", "Bond angle", "Stereochemical cosine torsion", "Stereochemical improper torsion",
+    "Soft-sphere overlap", "Lennard-Jones 6-12", "Coulomb", "H-bonding",
+    "CA-CA distance", "N-O distance", "Mainchain Phi", "Mainchain Psi", "Mainchain Omega",
+    "Sidechain Chi_1", "Sidechain Chi_2", "Sidechain Chi_3", "Sidechain Chi_4",
+    "Disulfide distance", "Disulfide angle", "Disulfide dihedral",
+    "Lower bound distance", "Upper bound distance", "SDCH-MNCH distance", "Sidechain Chi_5",
+    "Phi/Psi pair", "SDCH-SDCH distance", "X-Y distance", "NMR distance 6", "NMR distance 7",
+    "Minimal distance", "Non-bonded", "Atomic accessibility", "Atomic density",
+    "Absolute position", "Dihedral difference", "GBSA implicit solvent", "EM density",
+    "SAXS", "Symmetry",
+]
+
+# Residues whose mean violation exceeds mean + HOTSPOT_SIGMA * std are reported
+HOTSPOT_SIGMA = 2.0
+
+
+def parse_violation_file(path):
+    """Parse one .V profile into (resids, resnames, matrix[residue, restraint type])."""
+    resids, resnames, rows = [], [], []
+    with open_artifact(path) as fh:
+        for line in fh:
+            if line.startswith('#'):
+                continue
+            fields = line.split()
+            if len(fields) < 4:
+                continue
+            resids.append(int(fields[0]))
+            resnames.append(fields[1])
+            # Per-type columns; the trailing TOTAL column is recomputed from them
+            rows.append(fields[2:-1])
+    matrix = np.array(rows, dtype=float) if rows else np.zeros((0, len(RESTRAINT_TYPES)))
+    return np.array(resids, dtype=int), resnames, matrix
+
+
+def _parse_task(path):
+    return path, parse_violation_file(path)
+
+
+def violation_files(directory, sequence):
+    """Logical paths of the run's .V profiles, whether stored plain or compressed."""
+    return glob_artifacts(os.path.join(directory, f"{sequence}.V9999????"))
+
+
+def load_run(directory, sequence, processes=None):
+    """Load every violation profile of a run into a (models, residues, types) array.
+
+    Parsing runs across a process pool; the stacked result is cached as a
+    compressed .npz keyed by the names, sizes and mtimes of the input files.
+    """
+    paths = violation_files(directory, sequence)
+    if not paths:
+        return None
+    stats = [os.stat(resolve(p)) for p in paths]
+    signature = "|".join(f"{os.path.basename(p)}:{st.st_size}:{st.st_mtime_ns}" for p, st in zip(paths, stats))
+    cache_file = os.path.join(cache_path("violations"),
+                              f"{text_digest(os.path.abspath(directory) + signature)}.npz")
+    if os.path.exists(cache_file):
+        with np.load(cache_file) as data:
+            return {k: data[k] for k in data.files}
+
+    workers = processes or min(os.cpu_count() or 1, len(paths))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = dict(pool.map(_parse_task, paths))
+    else:
+        parsed = dict(map(_parse_task, paths))
+
+    resids, resnames, reference = parsed[paths[0]]
+    models, matrices = [], []
+    for path in paths:
+        _, _, matrix = parsed[path]
+        if matrix.shape != reference.shape:
+            continue  # partially written or from a different target
+        models.append(os.path.basename(path))
+        matrices.append(matrix)
+    run = {
+        'models': np.array(models),
+        'resids': resids,
+        'resnames': np.array(resnames),
+        'profiles': np.stack(matrices) if matrices else np.zeros((0,) + reference.shape),
+    }
+    np.savez_compressed(cache_file, **run)
+    return run
+
+
+def summarize(run, sigma=HOTSPOT_SIGMA):
+    """Per-residue and per-type aggregates plus contiguous hotspot regions."""
+    profiles = run['profiles']
+    totals = profiles.sum(axis=2)                 # (models, residues)
+    per_residue_mean = totals.mean(axis=0) if len(totals) else np.zeros(len(run['resids']))
+    per_residue_max = totals.max(axis=0) if len(totals) else per_residue_mean
+    per_type = profiles.sum(axis=(0, 1)) / max(len(profiles), 1)
+    residue_type_mean = profiles.mean(axis=0) if len(profiles) else np.zeros((len(run['resids']), profiles.shape[-1]))
+
+    cutoff = per_residue_mean.mean() + sigma * per_residue_mean.std()
+    hot = (per_residue_mean > cutoff) & (per_residue_mean > 0)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], hot.astype(np.int8), [0]))))
+    hotspots = []
+    for start, stop in zip(edges[::2], edges[1::2]):
+        region_types = residue_type_mean[start:stop].sum(axis=0)
+        dominant = int(np.argmax(region_types))
+        hotspots.append({
+            'start': int(run['resids'][start]),
+            'end': int(run['resids'][stop - 1]),
+            'residues': "".join(three_to_one(n) for n in run['resnames'][start:stop]),
+            'mean_violation': float(per_residue_mean[start:stop].mean()),
+            'max_violation': float(per_residue_max[start:stop].max()),
+            'dominant_type': RESTRAINT_TYPES[dominant] if dominant < len(RESTRAINT_TYPES) else f"Type {dominant + 1}",
+        })
+    hotspots.sort(key=lambda h: h['mean_violation'], reverse=True)
+    return {
+        'n_models': len(profiles),
+        'per_residue_mean': per_residue_mean,
+        'per_residue_max': per_residue_max,
+        'per_type': per_type,
+        'hotspots': hotspots,
+    }
+
+
+_THREE_TO_ONE = {
+    'ALA': 'A', 'ARG': 'R', 'ASN': 'N', 'ASP': 'D', 'CYS': 'C', 'GLN': 'Q', 'GLU': 'E',
+    'GLY': 'G', 'HIS': 'H', 'ILE': 'I', 'LEU': 'L', 'LYS': 'K', 'MET': 'M', 'PHE': 'F',
+    'PRO': 'P', 'SER': 'S', 'THR': 'T', 'TRP': 'W', 'TYR': 'Y', 'VAL': 'V',
+}
+
+
+def three_to_one(resname):
+    return _THREE_TO_ONE.get(str(resname).upper(), 'X')
@@ -3,6 +3,8 @@ from PyQt5.QtWebEngineWidgets import QWebEngineView
 from PyQt5.QtCore import QUrl
 import tempfile, os
 
+import artifacts
+
 class Visualizer(QWidget):
     def __init__(self, output_dir):
         super().__init__()
@@ -23,13 +25,13 @@ class Visualizer(QWidget):
         filename = model.get('filename', '')
         pdb_path = os.path.join(self.output_dir, filename)
 
-        if not os.path.exists(pdb_path):
+        if not artifacts.exists(pdb_path):
             self.info_label.setText(f"File not found: {pdb_path}")
             return
 
-        # read PDB text
+        # read PDB text (compressed models are decompressed in memory)
         try:
-            with open(pdb_path, 'r', encoding='utf-8') as fh:
+            with artifacts.open_artifact(pdb_path) as fh:
                 pdb_text = fh.read()
         except Exception as e:
             self.info_label.setText(f"Could not read file: {e}")
@@ -0,0 +1,360 @@
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from cache_utils import text_digest, read_json, write_json
+from fasta_pir import iter_fasta, make_short_code, validate_sequence
+from pir_index import PirIndex, is_pir_file
+from blast_client import run_blast
+from blast_results import parse_blast_json
+from template_index import TemplateIndex
+from pdb_store import PdbStore
+from job_runner import JobProcess
+from resources import JobBudget, build_features
+from eta import StageTimer, available_cores
+from build_presets import PRESETS, DEFAULT_PRESET, relative_cost
+from assistant_context import format_models
+from validation import validate_models
+from run_export import export_run
+
+
+# Files picked up from the watched directory
+FASTA_SUFFIXES = ('.fasta', '.fa', '.faa', '.fas')
+PIR_SUFFIXES = ('.ali', '.pir')
+POLL_SECONDS = 5
+ALIGN_MAX_GAP_LENGTH = 50
+STATE_FILE = "watch_state.json"
+FINAL_STATES = ('done', 'failed')
+
+
+def read_targets(path):
+    """Targets in a dropped file as dicts with 'code', 'sequence' and, for alignments, 'alnfile'/'knowns'.
+
+    FASTA records and plain PIR sequences go through the whole pipeline;
+    a PIR file that already aligns the target to templates is only built.
+    """
+    targets = []
+    if is_pir_file(path):
+        index = PirIndex(path)
+        knowns = index.templates()
+        if knowns:
+            code = index.target()
+            if code:
+                targets.append({'code': code, 'sequence': index.sequence(code).replace('-', '').replace('/', ''),
+                                'alnfile': os.path.abspath(path), 'knowns': knowns})
+            return targets
+        records = ((code, seq, 0) for code, seq in index.records())
+    else:
+        with open(path, 'r', encoding='utf-8', errors='replace') as fh:
+            records = [(make_short_code(header), seq, line) for header, seq, line in iter_fasta(fh)]
+    for code, seq, line in records:
+        if seq:
+            targets.append({'code': code, 'sequence': validate_sequence(code, seq, line).replace('-', '')})
+    return targets
+
+
+def target_key(target):
+    """Dedupe key: the sequence, plus the templates when an alignment was supplied."""
+    return text_digest(target['sequence'] + "|" + ",".join(target.get('knowns', ())))
+
+
+class WatchDaemon:
+    """Watches a directory for sequence files and models every new target unattended.
+
+    The directory is polled with os.scandir and a file is taken once its size
+    and mtime are unchanged between two polls, so partially copied files are
+    never read. Targets are deduplicated by sequence hash across files and
+    restarts, run on a bounded pool (each Modeller step in its own child
+    process) and written to `<out_dir>/<code>-<hash>/` with a status.json
+    that is updated at every stage.
+    """
+
+    def __init__(self, watch_dir, out_dir, workers=None, n_models=5, max_templates=5,
+                 assess_methods=('DOPE', 'GA341'), poll_seconds=POLL_SECONDS, log=None, preset=DEFAULT_PRESET):
+        self.watch_dir = os.path.abspath(watch_dir)
+        self.out_dir = os.path.abspath(out_dir)
+        os.makedirs(self.out_dir, exist_ok=True)
+        self.n_models = n_models
+        self.max_templates = max_templates
+        self.assess_methods = tuple(assess_methods)
+        self.preset = preset
+        self.poll_seconds = poll_seconds
+        self.log = log or (lambda text: print(text, flush=True))
+        self.state_path = os.path.join(self.out_dir, STATE_FILE)
+        state = read_json(self.state_path, {})
+        self.files = state.get('files', {})
+        self.targets = state.get('targets', {})
+        self.pending = {}           # path -> signature seen on the previous poll
+        self.jobs = {}              # key -> running JobProcess
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.store = PdbStore()
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers or os.cpu_count() or 1))
+
+    # --- State ---
+    def save_state(self):
+        with self.lock:
+            write_json(self.state_path, {'files': self.files, 'targets': self.targets})
+
+    def status_path(self, key):
+        return os.path.join(self.targets[key], "status.json")
+
+    def update_status(self, key, **changes):
+        path = self.status_path(key)
+        status = read_json(path, {})
+        status.update(changes, updated=time.time())
+        write_json(path, status)
+        return status
+
+    # --- Watching ---
+    def poll(self):
+        """One scan of the watched directory; returns the number of targets queued."""
+        queued = 0
+        seen = set()
+        with os.scandir(self.watch_dir) as entries:
+            for entry in entries:
+                name = entry.name.lower()
+                if not entry.is_file() or not name.endswith(FASTA_SUFFIXES + PIR_SUFFIXES):
+                    continue
+                stat = entry.stat()
+                signature = [stat.st_size, stat.st_mtime_ns]
+                seen.add(entry.path)
+                if self.files.get(entry.path) == signature:
+                    continue
+                # Only read files that did not change since the previous poll
+                if self.pending.get(entry.path) != signature:
+                    self.pending[entry.path] = signature
+                    continue
+                del self.pending[entry.path]
+                self.files[entry.path] = signature
+                queued += self.ingest(entry.path)
+        for path in set(self.pending) - seen:
+            del self.pending[path]
+        self.save_state()
+        return queued
+
+    def ingest(self, path):
+        try:
+            targets = read_targets(path)
+        except (OSError, ValueError) as e:
+            self.log(f"{os.path.basename(path)}: skipped ({e})")
+            return 0
+        queued = 0
+        for target in targets:
+            key = target_key(target)
+            if key in self.targets:
+                self.log(f"{os.path.basename(path)}: {target['code']} already modelled in {self.targets[key]}")
+                continue
+            directory = os.path.join(self.out_dir, f"{target['code']}-{key[:8]}")
+            os.makedirs(directory, exist_ok=True)
+            with self.lock:
+                self.targets[key] = directory
+            self.update_status(key, target=target['code'], sequence_hash=key, source=path,
+                               length=len(target['sequence']), state='queued', stages={},
+                               created=time.time())
+            write_json(os.path.join(directory, "target.json"), target)
+            self.pool.submit(self.process, key, target)
+            queued += 1
+        return queued
+
+    def resume(self):
+        """Re-queue targets that were queued or running when the daemon last stopped."""
+        for key, directory in list(self.targets.items()):
+            status = read_json(os.path.join(directory, "status.json"), {})
+            target = read_json(os.path.join(directory, "target.json"))
+            if target and status.get('state') not in FINAL_STATES:
+                self.update_status(key, state='queued')
+                self.pool.submit(self.process, key, target)
+
+    # --- Pipeline ---
+    def process(self, key, target):
+        directory = self.targets[key]
+        stages = {}
+        started = time.time()
+        alnfile, knowns, models = None, [], []
+
+        def stage(name, func, *args):
+            if self.stopping.is_set():
+                raise RuntimeError("Daemon stopped")
+            self.update_status(key, state=name, stages=stages, percent=None, eta_seconds=None)
+            start = time.time()
+            result = func(*args)
+            stages[name] = round(time.time() - start, 2)
+            return result
+
+        try:
+            if target.get('alnfile'):
+                alnfile, knowns = target['alnfile'], target['knowns']
+                atom_dirs = [os.path.dirname(alnfile), self.store.root]
+            else:
+                templates = stage('blast', self.find_templates, target, directory)
+                if not templates:
+                    raise ValueError("No usable templates found by BLAST")
+                pdb_templates = stage('templates', self.fetch_templates, templates, directory)
+                alnfile = stage('align', self.align, key, target, pdb_templates, directory)
+                knowns = [f"{code}{chain}" for code, chain, _ in pdb_templates]
+                atom_dirs = [directory]
+            models = stage('build', self.build, key, target, alnfile, knowns, atom_dirs, directory)
+            stage('validate', self.validate, models, directory)
+            with open(os.path.join(directory, f"{target['code']}.summary.tsv"), 'w', encoding='utf-8') as fh:
+                fh.write(format_models(models))
+            best = min((m for m in models if isinstance(m.get('dope'), float)),
+                       key=lambda m: m['dope'], default=None)
+            self.update_status(key, state='done', stages=stages, models=models, percent=100, eta_seconds=0,
+                               best=best and best['filename'], finished=time.time())
+            self.log(f"{target['code']}: {len(models)} models in {directory}")
+            self.export(target, directory, alnfile, knowns, models, 'done', started, stages)
+        except Exception as e:
+            if self.stopping.is_set():
+                # Interrupted, not failed: resume() picks it up on the next start
+                self.update_status(key, state='interrupted', stages=stages)
+                return
+            self.update_status(key, state='failed', stages=stages, error=str(e), finished=time.time())
+            self.log(f"{target['code']}: failed ({e})")
+            self.export(target, directory, alnfile, knowns, models, 'failed', started, stages)
+
+    def export(self, target, directory, alnfile, knowns, models, status, started, stages):
+        """Append the run to the columnar result tables (run_export), like GUI builds."""
+        try:
+            export_run(target['code'], directory, models, alnfile, knowns,
+                       {'source': 'watch_daemon', 'n_models': self.n_models, 'preset': self.preset,
+                        'assess_methods': list(self.assess_methods), 'stages': stages},
+                       status=status, started=started)
+        except (OSError, RuntimeError) as e:
+            self.log(f"{target['code']}: result export failed ({e})")
+
+    def find_templates(self, target, directory):
+        path = os.path.join(directory, "blast.json")
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as fh:
+                result = fh.read()
+        else:
+            result = run_blast(f">{target['code']}\n{target['sequence']}\n",
+                               cancelled=self.stopping.is_set)
+            with open(path, 'w', encoding='utf-8') as fh:
+                fh.write(result)
+        hits = parse_blast_json(json.loads(result))
+        if not len(hits):
+            return []
+        # Same quality-aware ranking and non-redundant preselection as the BLAST window
+        index = TemplateIndex()
+        index.fetch([p for p in hits["PDB_ID"] if p])
+        index.save()
+        hits.annotate(index)
+        return hits.rows(hits.preselect(max_templates=self.max_templates))
+
+    def fetch_templates(self, templates, directory):
+        pdb_templates = []
+        for tpl in templates:
+            pdbfile = self.store.copy_to(tpl['PDB_ID'], directory)
+            pdb_templates.append((tpl['PDB_ID'], tpl.get('Chain') or 'A', pdbfile))
+        return pdb_templates
+
+    def run_job(self, key, target_name, directory, budget=None, timer=None, **kwargs):
+        job = JobProcess(target_name, cwd=directory, budget=budget, timer=timer, **kwargs)
+        with self.lock:
+            self.jobs[key] = job
+        try:
+            if self.stopping.is_set():
+                raise RuntimeError("Daemon stopped")
+            log_path = os.path.join(directory, "pipeline.log")
+            with open(log_path, 'a', encoding='utf-8') as log:
+                def on_event(kind, payload):
+                    if kind in ('log', 'message'):
+                        log.write(f"{payload}\n")
+                    elif kind == 'progress':
+                        self.update_status(key, percent=payload[0], eta_seconds=payload[1])
+                return job.run(on_event)
+        finally:
+            with self.lock:
+                self.jobs.pop(key, None)
+
+    def align(self, key, target, pdb_templates, directory):
+        target_file = os.path.join(directory, f"{target['code']}.ali")
+        with open(target_file, 'w', encoding='utf-8') as fh:
+            fh.write(f">P1;{target['code']}\nsequence:{target['code']}:::::::0.00:0.00\n{target['sequence']}*\n")
+        timer = StageTimer('align', {'target_length': len(target['sequence']), 'templates': len(pdb_templates)})
+        self.run_job(key, 'modeller_jobs.align2d', directory, timer=timer, target_file=target_file,
+                     target_format='PIR', templates=pdb_templates, max_gap_length=ALIGN_MAX_GAP_LENGTH)
+        return os.path.join(directory, 'Alignment.ali')
+
+    def build(self, key, target, alnfile, knowns, atom_dirs, directory):
+        # Pool workers wait here until the build's estimated memory fits
+        features = build_features(alnfile, knowns)
+        budget = JobBudget('build', features)
+        timer = StageTimer('build', dict(features, models=self.n_models, cores=available_cores(),
+                                         effort=relative_cost(self.preset)))
+        try:
+            return self.run_job(key, 'modeller_jobs.build_models', directory, budget=budget, timer=timer,
+                                alnfile=alnfile, knowns=list(knowns), sequence=target['code'], start_model=1,
+                                end_model=self.n_models, assess_methods=self.assess_methods, atom_dirs=atom_dirs,
+                                preset=self.preset)
+        finally:
+            self.update_status(key, peak_rss_mb=round(budget.peak_mb, 1), estimated_mb=round(budget.estimate_mb, 1))
+
+    def validate(self, models, directory):
+        # A few milliseconds per model; the pool already runs targets in parallel
+        results = validate_models([os.path.join(directory, m['filename']) for m in models], processes=1)
+        for model, result in zip(models, results.values()):
+            if 'error' not in result:
+                model['clashes'] = result['clashes']
+                model['rama_outliers'] = result['rama_outliers']
+
+    # --- Lifecycle ---
+    def run_forever(self):
+        self.log(f"Watching {self.watch_dir}; results in {self.out_dir}")
+        self.resume()
+        while not self.stopping.is_set():
+            queued = self.poll()
+            if queued:
+                self.log(f"Queued {queued} new target(s)")
+            self.stopping.wait(self.poll_seconds)
+
+    def stop(self, wait=True):
+        self.stopping.set()
+        with self.lock:
+            jobs = list(self.jobs.values())
+        for job in jobs:
+            job.cancel()
+        self.pool.shutdown(wait=wait, cancel_futures=True)
+        self.save_state()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Model every sequence file dropped into a directory.")
+    parser.add_argument("watch_dir")
+    parser.add_argument("out_dir")
+    parser.add_argument("--workers", type=int, default=None, help="targets processed at once (default: CPU count)")
+    parser.add_argument("--models", type=int, default=5, help="models built per target")
+    parser.add_argument("--templates", type=int, default=5, help="maximum templates per target")
+    parser.add_argument("--preset", choices=list(PRESETS), default=DEFAULT_PRESET, help="build speed preset")
+    parser.add_argument("--interval", type=float, default=POLL_SECONDS, help="seconds between directory scans")
+    parser.add_argument("--once", action="store_true", help="process the files present now, then exit")
+    args = parser.parse_args()
+
+    daemon = WatchDaemon(args.watch_dir, args.out_dir, workers=args.workers, n_models=args.models,
+                         max_templates=args.templates, poll_seconds=args.interval, preset=args.preset)
+    if args.once:
+        daemon.resume()
+        # Two scans: the first records file signatures, the second takes the stable files
+        daemon.poll()
+        daemon.poll()
+        daemon.pool.shutdown(wait=True)
+        return 0
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stopping.set())
+    try:
+        daemon.run_forever()
+    except KeyboardInterrupt:
+        pass
+    daemon.log("Stopping; cancelling running jobs")
+    daemon.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,491 @@
+import os
+import sys
+import json
+import time
+import re
+import glob
+import shutil
+import socket
+import signal
+import sqlite3
+import argparse
+import threading
+
+from job_runner import JobProcess
+from resources import JobBudget, build_features
+from eta import StageTimer, available_cores
+from build_presets import PRESETS, DEFAULT_PRESET, preset_settings, relative_cost
+from job_service import find_atom_file
+from pir_index import PirIndex
+from artifacts import MODEL_PATTERNS, RUN_SUFFIXES
+from run_export import export_run
+
+
+# A claim whose heartbeat is older than this is handed to another worker
+LEASE_SECONDS = 120
+MAX_ATTEMPTS = 3
+IDLE_POLL_SECONDS = 5
+# Poll interval while queued tasks wait for a prerequisite (their batch's restraints)
+PREREQUISITE_POLL_SECONDS = 1
+BUILD_TARGET = 'modeller_jobs.build_models'
+RESTRAINTS_TARGET = 'modeller_jobs.build_restraints'
+# Modeller accepts rand_seed values from -2 to -50000
+SEED_BASE = -1000
+SEED_RANGE = 49000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch TEXT NOT NULL,
+    kind TEXT NOT NULL DEFAULT 'model',
+    depends_on INTEGER,
+    params TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    worker TEXT,
+    claimed_at REAL,
+    heartbeat REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, id);
+CREATE INDEX IF NOT EXISTS tasks_batch ON tasks (batch);
+CREATE TABLE IF NOT EXISTS exports (
+    batch TEXT PRIMARY KEY,
+    exported REAL NOT NULL
+);
+"""
+# Columns added after the first release, for queues created by older versions
+MIGRATIONS = {
+    'kind': "ALTER TABLE tasks ADD COLUMN kind TEXT NOT NULL DEFAULT 'model'",
+    'depends_on': "ALTER TABLE tasks ADD COLUMN depends_on INTEGER",
+}
+
+
+def model_seed(model_index):
+    return SEED_BASE - (model_index % SEED_RANGE)
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+class WorkQueue:
+    """SQLite work queue in a directory shared between nodes (e.g. NFS).
+
+    Each batch starts with a 'restraints' task that derives the restraints
+    and initial model once; its 'model' tasks, one per model index, wait for
+    it and optimize from those files. Workers claim tasks inside
+    an IMMEDIATE transaction, heartbeat while building and report results;
+    claims whose heartbeat is older than the lease are re-queued (up to
+    MAX_ATTEMPTS) by the next claim. The rollback journal is used because
+    WAL mode needs shared memory and does not work over network filesystems.
+    """
+
+    def __init__(self, root, lease=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+        self.path = os.path.join(self.root, "queue.sqlite")
+        self.lease = lease
+        self.max_attempts = max_attempts
+        with self.connect() as db:
+            db.executescript(SCHEMA)
+            columns = {row['name'] for row in db.execute("PRAGMA table_info(tasks)")}
+            for column, statement in MIGRATIONS.items():
+                if column not in columns:
+                    db.execute(statement)
+
+    def connect(self):
+        db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        db.execute("PRAGMA journal_mode=DELETE")
+        db.row_factory = sqlite3.Row
+        return _Connection(db)
+
+    # --- Submitting ---
+    def submit_build(self, alnfile, knowns, sequence, n_models, assess_methods=('DOPE', 'GA341'),
+                     atom_dirs=(), output_dir=None, start_model=1, preset=DEFAULT_PRESET):
+        """Queue a restraints task and one task per model index; returns the batch id.
+
+        The alignment and every template structure it references are copied
+        into `<root>/batches/<batch>/` so workers on any node can read them;
+        the restraints task writes into its `restraints/` folder.
+        """
+        preset_settings(preset)
+        batch = time.strftime('%Y%m%d-%H%M%S-') + os.urandom(3).hex()
+        batch_dir = os.path.join(self.root, "batches", batch)
+        os.makedirs(batch_dir)
+        index = PirIndex(alnfile)
+        search = [os.path.dirname(os.path.abspath(alnfile))] + list(atom_dirs)
+        for code in knowns:
+            header = index.header(code).split(':')
+            atom_file = header[1].strip() if len(header) > 1 and header[1].strip() else code
+            path = find_atom_file(atom_file, search)
+            if path is None:
+                raise FileNotFoundError(f"Template structure for {code} ({atom_file}) not found")
+            shutil.copy(path, batch_dir)
+        shared_aln = shutil.copy(alnfile, os.path.join(batch_dir, os.path.basename(alnfile)))
+        output_dir = os.path.abspath(output_dir or batch_dir)
+        restraints_dir = os.path.join(batch_dir, "restraints")
+        now = time.time()
+        restraints = {'alnfile': shared_aln, 'knowns': list(knowns), 'sequence': sequence,
+                      'atom_dirs': [batch_dir], 'output_dir': restraints_dir}
+        with self.connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                restraints_task = db.execute("INSERT INTO tasks (batch, kind, params, created) "
+                                             "VALUES (?, 'restraints', ?, ?)",
+                                             (batch, json.dumps(restraints), now)).lastrowid
+                rows = []
+                for model_index in range(start_model, start_model + n_models):
+                    params = {'alnfile': shared_aln, 'knowns': list(knowns), 'sequence': sequence,
+                              'start_model': model_index, 'end_model': model_index,
+                              'assess_methods': list(assess_methods), 'atom_dirs': [batch_dir],
+                              'rand_seed': model_seed(model_index), 'preset': preset,
+                              'restraints_dir': restraints_dir, 'output_dir': output_dir}
+                    rows.append((batch, restraints_task, json.dumps(params), now))
+                db.executemany("INSERT INTO tasks (batch, depends_on, params, created) VALUES (?, ?, ?, ?)", rows)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return batch
+
+    # --- Claiming ---
+    def requeue_stale(self, db, now):
+        """Hand expired claims back to the queue, or fail them after too many attempts."""
+        cutoff = now - self.lease
+        db.execute("UPDATE tasks SET state='failed', finished=?, error='Claim expired too many times' "
+                   "WHERE state='claimed' AND heartbeat < ? AND attempts >= ?", (now, cutoff, self.max_attempts))
+        return db.execute("UPDATE tasks SET state='queued', worker=NULL "
+                          "WHERE state='claimed' AND heartbeat < ?", (cutoff,)).rowcount
+
+    def fail_orphans(self, db, now):
+        """Fail queued tasks whose prerequisite task has failed for good."""
+        return db.execute("UPDATE tasks SET state='failed', finished=?, error='Prerequisite task ' || depends_on "
+                          "|| ' failed' WHERE state='queued' AND depends_on IN "
+                          "(SELECT id FROM tasks WHERE state='failed')", (now,)).rowcount
+
+    def claim(self, worker):
+        """Claim the oldest queued task whose prerequisite is done; returns (task id, params) or None.
+
+        `params` carries the task's kind ('restraints' or 'model') under 'kind'
+        and its batch id under 'batch'.
+        """
+        now = time.time()
+        with self.connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                self.requeue_stale(db, now)
+                self.fail_orphans(db, now)
+                row = db.execute("SELECT id, batch, kind, params FROM tasks WHERE state='queued' AND (depends_on IS NULL "
+                                 "OR depends_on IN (SELECT id FROM tasks WHERE state='done')) "
+                                 "ORDER BY id LIMIT 1").fetchone()
+                if row is not None:
+                    db.execute("UPDATE tasks SET state='claimed', worker=?, claimed_at=?, heartbeat=?, "
+                               "attempts=attempts+1 WHERE id=?", (worker, now, now, row['id']))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return row['id'], dict(json.loads(row['params']), kind=row['kind'], batch=row['batch'])
+
+    def waiting(self):
+        """True while tasks are queued, including ones waiting for a prerequisite."""
+        with self.connect() as db:
+            return db.execute("SELECT 1 FROM tasks WHERE state='queued' LIMIT 1").fetchone() is not None
+
+    def heartbeat(self, task_id, worker):
+        """Extend a claim; False means it expired and was taken by someone else."""
+        with self.connect() as db:
+            return db.execute("UPDATE tasks SET heartbeat=? WHERE id=? AND worker=? AND state='claimed'",
+                              (time.time(), task_id, worker)).rowcount == 1
+
+    def complete(self, task_id, worker, result):
+        with self.connect() as db:
+            return db.execute("UPDATE tasks SET state='done', result=?, error=NULL, finished=? "
+                              "WHERE id=? AND worker=? AND state='claimed'",
+                              (json.dumps(result), time.time(), task_id, worker)).rowcount == 1
+
+    def release(self, task_id, worker):
+        """Give a claim back untouched (worker shutting down); the attempt is not counted."""
+        with self.connect() as db:
+            return db.execute("UPDATE tasks SET state='queued', worker=NULL, attempts=attempts-1 "
+                              "WHERE id=? AND worker=? AND state='claimed'", (task_id, worker)).rowcount == 1
+
+    def fail(self, task_id, worker, error):
+        """Record an error; the task is retried until it has used MAX_ATTEMPTS claims."""
+        with self.connect() as db:
+            return db.execute("UPDATE tasks SET state=CASE WHEN attempts < ? THEN 'queued' ELSE 'failed' END, "
+                              "worker=NULL, error=?, finished=? WHERE id=? AND worker=? AND state='claimed'",
+                              (self.max_attempts, error[-2000:], time.time(), task_id, worker)).rowcount == 1
+
+    # --- Reporting ---
+    def status(self, batch=None):
+        """{batch: {state: count}} of the model tasks of one or all batches."""
+        query = "SELECT batch, state, COUNT(*) AS n FROM tasks WHERE kind='model'"
+        args = ()
+        if batch:
+            query += " AND batch=?"
+            args = (batch,)
+        summary = {}
+        with self.connect() as db:
+            for row in db.execute(query + " GROUP BY batch, state", args):
+                summary.setdefault(row['batch'], {})[row['state']] = row['n']
+        return summary
+
+    def results(self, batch):
+        """Model dicts of the finished tasks of a batch, in model order."""
+        models = []
+        with self.connect() as db:
+            for row in db.execute("SELECT result FROM tasks WHERE batch=? AND kind='model' AND state='done' "
+                                  "ORDER BY id", (batch,)):
+                models.extend(json.loads(row['result']) or [])
+        return models
+
+    def finish_batch(self, batch):
+        """True for exactly one caller, once no task of the batch is queued or claimed any more."""
+        with self.connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                self.fail_orphans(db, time.time())
+                open_task = db.execute("SELECT 1 FROM tasks WHERE batch=? AND state IN ('queued', 'claimed') "
+                                       "LIMIT 1", (batch,)).fetchone()
+                first = open_task is None and db.execute(
+                    "INSERT OR IGNORE INTO exports (batch, exported) VALUES (?, ?)",
+                    (batch, time.time())).rowcount == 1
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return first
+
+    def batch_info(self, batch):
+        """(params of the batch's first model task, submission time, number of failed model tasks)."""
+        with self.connect() as db:
+            row = db.execute("SELECT params, created FROM tasks WHERE batch=? AND kind='model' ORDER BY id LIMIT 1",
+                             (batch,)).fetchone()
+            failed = db.execute("SELECT COUNT(*) FROM tasks WHERE batch=? AND kind='model' AND state='failed'",
+                                (batch,)).fetchone()[0]
+        return json.loads(row['params']), row['created'], failed
+
+    def errors(self, batch):
+        with self.connect() as db:
+            return [(row['id'], row['error']) for row in
+                    db.execute("SELECT id, error FROM tasks WHERE batch=? AND state='failed'", (batch,))]
+
+
+class _Connection:
+    """Closes the sqlite connection at the end of a with block (sqlite3's own only commits)."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        return self.db
+
+    def __exit__(self, *exc):
+        self.db.close()
+
+
+def collect_outputs(scratch, output_dir, sequence):
+    """Move per-model files from a task's scratch directory into the shared output directory."""
+    os.makedirs(output_dir, exist_ok=True)
+    for kind, pattern in MODEL_PATTERNS.items():
+        for path in glob.glob(os.path.join(scratch, f"{sequence}.*")):
+            name = os.path.basename(path)
+            if re.fullmatch(re.escape(sequence) + pattern, name):
+                os.replace(path, os.path.join(output_dir, name))
+    # Restraints and schedule are identical for every model; keep one copy
+    for suffix in RUN_SUFFIXES:
+        path = os.path.join(scratch, sequence + suffix)
+        target = os.path.join(output_dir, sequence + suffix)
+        if os.path.exists(path) and not os.path.exists(target):
+            os.replace(path, target)
+    shutil.rmtree(scratch, ignore_errors=True)
+    try:
+        os.rmdir(os.path.dirname(scratch))
+    except OSError:
+        pass
+
+
+def run_task(queue, task_id, params, worker, log=print, active=None):
+    """Build one claimed task in its own scratch directory while heartbeating the claim."""
+    params = dict(params)
+    kind = params.pop('kind', 'model')
+    batch = params.pop('batch', None)
+    output_dir = params.pop('output_dir')
+    scratch = os.path.join(output_dir, ".work", f"task-{task_id}")
+    try:
+        if kind == 'restraints':
+            run_restraints_task(queue, task_id, params, output_dir, scratch, worker, log, active)
+        else:
+            run_model_task(queue, task_id, params, output_dir, scratch, worker, log, active)
+    finally:
+        if batch and queue.finish_batch(batch):
+            export_batch(queue, batch, log)
+
+
+def run_model_task(queue, task_id, params, output_dir, scratch, worker, log=print, active=None):
+    """Build one model index of a batch from the batch's restraints."""
+    # An unreadable alignment or bad preset fails in the build, where the task is failed properly
+    try:
+        features = build_features(params['alnfile'], params['knowns'])
+        budget = JobBudget('build', features)
+        timer = StageTimer('build', dict(features, models=1, cores=available_cores(),
+                                         effort=relative_cost(params.get('preset'))))
+    except Exception as e:
+        log(f"task {task_id}: memory and time estimates unavailable: {e}")
+        budget = timer = None
+    job = JobProcess(BUILD_TARGET, cwd=scratch, budget=budget, timer=timer, **params)
+
+    def done(models):
+        collect_outputs(scratch, output_dir, params['sequence'])
+        queue.complete(task_id, worker, models)
+        reports = "".join(f"; {r.report()}" for r in (budget, timer) if r)
+        log(f"task {task_id}: model {params['start_model']} done{reports}")
+
+    run_claimed(queue, task_id, job, scratch, worker, done, log, active)
+
+
+def run_restraints_task(queue, task_id, params, output_dir, scratch, worker, log=print, active=None):
+    """Derive a batch's restraints and initial model once, into `output_dir`, for its model tasks."""
+    job = JobProcess(RESTRAINTS_TARGET, cwd=scratch, **params)
+
+    def done(result):
+        collect_outputs(scratch, output_dir, params['sequence'])
+        queue.complete(task_id, worker, result)
+        log(f"task {task_id}: restraints done")
+
+    run_claimed(queue, task_id, job, scratch, worker, done, log, active)
+
+
+def export_batch(queue, batch, log=print):
+    """Append a finished batch to the result tables (run_export) as one run, like a GUI build."""
+    # Runs in a worker loop thread, which must survive any export problem
+    try:
+        params, created, failed = queue.batch_info(batch)
+        settings = {k: params.get(k) for k in ('assess_methods', 'preset')}
+        export_run(params['sequence'], params['output_dir'], queue.results(batch), params['alnfile'],
+                   params['knowns'], dict(settings, source='work_queue', batch=batch, failed_tasks=failed),
+                   status='failed' if failed else 'done', started=created)
+        log(f"batch {batch}: results exported")
+    except Exception as e:
+        log(f"batch {batch}: result export failed ({e})")
+
+
+def run_claimed(queue, task_id, job, scratch, worker, done, log=print, active=None):
+    """Run a claimed task's job while heartbeating the claim; `done(result)` records success."""
+    if active is not None:
+        active[task_id] = (job, worker)
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(queue.lease / 3):
+            if not queue.heartbeat(task_id, worker):
+                log(f"task {task_id}: claim lost, cancelling")
+                job.cancel()
+                return
+
+    beater = threading.Thread(target=beat, daemon=True)
+    beater.start()
+    try:
+        done(job.run())
+    except Exception as e:
+        if not job.cancelled or job.memory_error:
+            queue.fail(task_id, worker, str(e))
+            log(f"task {task_id}: failed ({str(e).splitlines()[0] if str(e) else e})")
+        shutil.rmtree(scratch, ignore_errors=True)
+    finally:
+        stop.set()
+        beater.join()
+        if active is not None:
+            active.pop(task_id, None)
+
+
+def run_worker(root, slots=1, exit_when_idle=False, log=print):
+    """Claim and build tasks until idle or interrupted; `slots` builds run at once in this process.
+
+    On Ctrl-C / SIGTERM the running builds are cancelled and their claims
+    released, so other workers pick them up without waiting for the lease.
+    """
+    queue = WorkQueue(root)
+    active = {}
+    stopping = threading.Event()
+
+    def loop():
+        worker = worker_name()
+        while not stopping.is_set():
+            claimed = queue.claim(worker)
+            if claimed is None:
+                # Model tasks may still be waiting for their batch's restraints
+                waiting = queue.waiting()
+                if exit_when_idle and not waiting:
+                    return
+                stopping.wait(PREREQUISITE_POLL_SECONDS if waiting else IDLE_POLL_SECONDS)
+                continue
+            run_task(queue, claimed[0], claimed[1], worker, log, active)
+
+    threads = [threading.Thread(target=loop, daemon=True) for _ in range(max(1, slots))]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(1)
+    except KeyboardInterrupt:
+        stopping.set()
+        for task_id, (job, worker) in list(active.items()):
+            job.cancel(wait=True)
+            queue.release(task_id, worker)
+            log(f"task {task_id}: released")
+        raise
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distribute model builds across nodes through a shared directory.")
+    parser.add_argument("root", help="queue directory on the shared filesystem")
+    sub = parser.add_subparsers(dest="command", required=True)
+    submit = sub.add_parser("submit", help="queue one task per model")
+    submit.add_argument("alnfile")
+    submit.add_argument("--knowns", required=True, help="comma-separated template codes")
+    submit.add_argument("--sequence", required=True, help="target code")
+    submit.add_argument("--models", type=int, default=10)
+    submit.add_argument("--assess", default="DOPE,GA341")
+    submit.add_argument("--preset", choices=list(PRESETS), default=DEFAULT_PRESET, help="build speed preset")
+    submit.add_argument("--output", default=None, help="shared output directory (default: the batch directory)")
+    worker = sub.add_parser("worker", help="claim and build tasks")
+    worker.add_argument("--slots", type=int, default=1, help="concurrent builds in this process")
+    worker.add_argument("--exit-when-idle", action="store_true")
+    status = sub.add_parser("status", help="task counts per batch")
+    status.add_argument("batch", nargs="?")
+    results = sub.add_parser("results", help="scores of a batch's finished models")
+    results.add_argument("batch")
+    args = parser.parse_args()
+
+    if args.command == "submit":
+        batch = WorkQueue(args.root).submit_build(
+            args.alnfile, [k.strip() for k in args.knowns.split(',') if k.strip()], args.sequence,
+            args.models, [m.strip() for m in args.assess.split(',') if m.strip()], output_dir=args.output,
+            preset=args.preset)
+        print(batch)
+    elif args.command == "worker":
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        try:
+            run_worker(args.root, args.slots, args.exit_when_idle)
+        except KeyboardInterrupt:
+            pass
+    elif args.command == "status":
+        for batch, counts in sorted(WorkQueue(args.root).status(args.batch).items()):
+            print(batch, " ".join(f"{state}={n}" for state, n in sorted(counts.items())))
+    elif args.command == "results":
+        from assistant_context import format_models
+        print(format_models(WorkQueue(args.root).results(args.batch)), end="")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())